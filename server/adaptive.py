@@ -0,0 +1,289 @@
+"""
+Smart Quiz App - Adaptive Question Selection
+Questions pre-bucketed by calibrated difficulty, picked near the user's ability
+"""
+
+import hashlib
+import logging
+import math
+import os
+import random
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from models import db, Question
+from calibration import ABILITY_RANGE, prior_difficulty
+
+logger = logging.getLogger(__name__)
+
+BUCKET_WIDTH = 0.5
+# Aim slightly below the user's ability so about 70% of answers are correct
+TARGET_SUCCESS = 0.7
+TARGET_OFFSET = math.log(TARGET_SUCCESS / (1 - TARGET_SUCCESS))
+
+# Per-user Bloom filter of recently served questions
+SEEN_BITS = 1 << 16  # 8KB per user
+SEEN_HASHES = 4
+SEEN_CAPACITY = 5000  # filter is reset past this many insertions (~0.5% false positives)
+SEEN_TTL = 14 * 24 * 3600
+LOCAL_SEEN_USERS = 10000
+
+
+def bucket_of(difficulty: float) -> int:
+    low, high = ABILITY_RANGE
+    return int((min(max(difficulty, low), high - 1e-9) - low) // BUCKET_WIDTH)
+
+
+def _bloom_positions(question_id: str) -> List[int]:
+    digest = hashlib.blake2b(question_id.encode(), digest_size=4 * SEEN_HASHES).digest()
+    return [int.from_bytes(digest[i * 4:i * 4 + 4], 'little') % SEEN_BITS
+            for i in range(SEEN_HASHES)]
+
+
+class AdaptiveSelector:
+    """Constant-time ability-matched picks from difficulty buckets.
+
+    Buckets live in Redis sets (one per subject and difficulty band) so all
+    workers share them, or in process memory without Redis. `rebuild` is the
+    only operation that scans the bank; serving only touches the few buckets
+    nearest the target difficulty.
+    """
+
+    def __init__(self, prefix: str = 'smartquiz:adaptive'):
+        self.prefix = prefix
+        self.redis = None
+        self.app = None
+        self._buckets: Dict[str, Dict[int, List[str]]] = {}
+        self._seen: 'OrderedDict[str, bytearray]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._built = False
+        self._building_pid = None
+        self._listening = False
+
+    def init_app(self, app, redis_client=None) -> None:
+        self.app = app
+        self.redis = redis_client
+        if not self._listening:
+            event.listen(Question, 'after_update', _after_update)
+            event.listen(Question, 'after_delete', _after_delete)
+            event.listen(Session, 'after_commit', _after_commit)
+            event.listen(Session, 'after_rollback', _after_rollback)
+            self._listening = True
+
+    def _key(self, subject: str, bucket: int) -> str:
+        return f'{self.prefix}:bucket:{subject}:{bucket}'
+
+    # Bucket maintenance
+    def rebuild(self) -> int:
+        """Re-bucket the active bank from calibrated (or prior) difficulty"""
+        buckets = defaultdict(lambda: defaultdict(list))
+        total = 0
+        rows = db.session.execute(
+            db.select(Question.id, Question.subject, Question.irt_difficulty,
+                      Question.difficulty, Question.difficulty_score)
+            .where(Question.is_active.is_(True))
+            .execution_options(yield_per=50_000)
+        )
+        for qid, subject, b, label, score in rows:
+            b = b if b is not None else prior_difficulty(label, score)
+            buckets[subject][bucket_of(b)].append(qid)
+            total += 1
+
+        if self.redis:
+            # Fill staging keys, then RENAME them over the live ones so readers
+            # never see a half-built bucket
+            stale = set(self.redis.scan_iter(f'{self.prefix}:bucket:*'))
+            pipe = self.redis.pipeline(transaction=False)
+            for subject, by_bucket in buckets.items():
+                for bucket, ids in by_bucket.items():
+                    staging = self._key(subject, bucket) + ':staging'
+                    pipe.delete(staging)
+                    for start in range(0, len(ids), 10_000):
+                        pipe.sadd(staging, *ids[start:start + 10_000])
+                    pipe.rename(staging, self._key(subject, bucket))
+                    stale.discard(self._key(subject, bucket))
+            if stale:
+                pipe.delete(*stale)
+            pipe.execute()
+        else:
+            with self._lock:
+                self._buckets = {s: dict(b) for s, b in buckets.items()}
+        self._built = True
+
+        logger.info("Adaptive buckets rebuilt with %s questions", total)
+        return total
+
+    def add_questions(self, questions: Iterable[Question]) -> None:
+        """Place newly created questions without waiting for the next rebuild"""
+        for q in questions:
+            b = q.irt_difficulty if q.irt_difficulty is not None else \
+                prior_difficulty(q.difficulty, q.difficulty_score)
+            if self.redis:
+                try:
+                    self.redis.sadd(self._key(q.subject, bucket_of(b)), q.id)
+                except Exception as e:
+                    logger.warning("Adaptive bucket insert failed: %s", e)
+            else:
+                with self._lock:
+                    by_bucket = self._buckets.setdefault(q.subject, {})
+                    by_bucket.setdefault(bucket_of(b), []).append(q.id)
+
+    def remove_questions(self, questions: Iterable[Tuple[str, str]]) -> None:
+        """Take deactivated or deleted (id, subject) questions out of every bucket"""
+        by_subject = defaultdict(set)
+        for qid, subject in questions:
+            by_subject[subject].add(qid)
+        n_buckets = bucket_of(ABILITY_RANGE[1]) + 1
+        if self.redis:
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                for subject, ids in by_subject.items():
+                    for bucket in range(n_buckets):
+                        pipe.srem(self._key(subject, bucket), *ids)
+                pipe.execute()
+            except Exception as e:
+                logger.warning("Adaptive bucket removal failed: %s", e)
+            return
+        with self._lock:
+            for subject, ids in by_subject.items():
+                for bucket, members in self._buckets.get(subject, {}).items():
+                    self._buckets[subject][bucket] = [qid for qid in members if qid not in ids]
+
+    def warm(self) -> None:
+        """Build the in-process buckets (at worker startup, before serving)"""
+        if self.redis or self._built:
+            return
+        with self._build_lock:
+            if not self._built:
+                self.rebuild()  # in-process buckets are built once per worker
+
+    def _build_in_background(self) -> None:
+        # Fallback for processes that skipped the startup build; picks are short until it lands
+        if self._building_pid == os.getpid() or not self.app:
+            return
+        self._building_pid = os.getpid()
+        app = self.app
+
+        def build():
+            try:
+                with app.app_context():
+                    self.warm()
+            except Exception as e:
+                logger.error("Adaptive bucket build failed: %s", e)
+        threading.Thread(target=build, name='adaptive-buckets', daemon=True).start()
+
+    def _sample(self, subject: str, bucket: int, count: int) -> List[str]:
+        if self.redis:
+            return self.redis.srandmember(self._key(subject, bucket), count) or []
+        ids = self._buckets.get(subject, {}).get(bucket, [])
+        return random.sample(ids, min(count, len(ids)))
+
+    # Seen filter
+    def _seen_key(self, user_id: str) -> str:
+        return f'{self.prefix}:seen:{user_id}'
+
+    def filter_unseen(self, user_id: str, question_ids: List[str]) -> List[str]:
+        if not question_ids:
+            return []
+        positions = [_bloom_positions(qid) for qid in question_ids]
+        if self.redis:
+            pipe = self.redis.pipeline(transaction=False)
+            for bits in positions:
+                for bit in bits:
+                    pipe.getbit(self._seen_key(user_id), bit)
+            flags = pipe.execute()
+            return [qid for i, qid in enumerate(question_ids)
+                    if not all(flags[i * SEEN_HASHES:(i + 1) * SEEN_HASHES])]
+
+        with self._lock:
+            seen = self._seen.get(user_id)
+        if seen is None:
+            return list(question_ids)
+        return [qid for qid, bits in zip(question_ids, positions)
+                if not all(seen[bit >> 3] & (1 << (bit & 7)) for bit in bits)]
+
+    def mark_seen(self, user_id: str, question_ids: Iterable[str]) -> None:
+        question_ids = [qid for qid in question_ids if qid]
+        if not question_ids:
+            return
+        if self.redis:
+            try:
+                key = self._seen_key(user_id)
+                pipe = self.redis.pipeline(transaction=False)
+                pipe.incrby(key + ':n', len(question_ids))
+                for qid in question_ids:
+                    for bit in _bloom_positions(qid):
+                        pipe.setbit(key, bit, 1)
+                pipe.expire(key, SEEN_TTL)
+                pipe.expire(key + ':n', SEEN_TTL)
+                inserted = pipe.execute()[0]
+                if inserted > SEEN_CAPACITY:
+                    self.redis.delete(key, key + ':n')
+            except Exception as e:
+                logger.warning("Seen filter update failed: %s", e)
+            return
+
+        with self._lock:
+            seen = self._seen.pop(user_id, None) or bytearray(SEEN_BITS // 8 + 4)
+            count = int.from_bytes(seen[-4:], 'little') + len(question_ids)
+            if count > SEEN_CAPACITY:
+                seen, count = bytearray(SEEN_BITS // 8 + 4), len(question_ids)
+            for qid in question_ids:
+                for bit in _bloom_positions(qid):
+                    seen[bit >> 3] |= 1 << (bit & 7)
+            seen[-4:] = count.to_bytes(4, 'little')
+            self._seen[user_id] = seen
+            while len(self._seen) > LOCAL_SEEN_USERS:
+                self._seen.popitem(last=False)
+
+    # Serving
+    def pick(self, user_id: str, subject: str, ability: Optional[float], count: int) -> List[str]:
+        """Question ids around the target difficulty, nearest buckets first"""
+        if not self.redis and not self._built:
+            self._build_in_background()  # never scan the bank on the request path
+
+        target = bucket_of((ability or 0.0) - TARGET_OFFSET)
+        n_buckets = bucket_of(ABILITY_RANGE[1])
+        order = sorted(range(n_buckets + 1), key=lambda b: (abs(b - target), b))
+
+        picked: List[str] = []
+        for bucket in order[:6]:
+            candidates = [qid for qid in self._sample(subject, bucket, count * 2)
+                          if qid not in picked]
+            picked.extend(self.filter_unseen(user_id, candidates)[:count - len(picked)])
+            if len(picked) >= count:
+                break
+        return picked
+
+
+adaptive_selector = AdaptiveSelector()
+
+
+# ORM hooks: deactivated/deleted questions leave the buckets once their transaction commits
+def _pending(target) -> list:
+    return object_session(target).info.setdefault('adaptive_removed', [])
+
+
+def _after_update(mapper, connection, target) -> None:
+    history = inspect(target).attrs['is_active'].history
+    if history.has_changes() and target.is_active is False:
+        _pending(target).append((target.id, target.subject))
+
+
+def _after_delete(mapper, connection, target) -> None:
+    _pending(target).append((target.id, target.subject))
+
+
+def _after_commit(session) -> None:
+    removed = session.info.pop('adaptive_removed', None)
+    if removed:
+        adaptive_selector.remove_questions(removed)
+
+
+def _after_rollback(session) -> None:
+    session.info.pop('adaptive_removed', None)
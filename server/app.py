@@ -3,228 +3,261 @@ Smart Quiz App - Production-Level Backend Server
 Enterprise-grade Flask application with AI integration
 """
 
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, current_app, g, request, jsonify, send_from_directory
 from flask_cors import CORS
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask_jwt_extended import (JWTManager, create_access_token, create_refresh_token, jwt_required,
+                                get_jwt_identity)
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
 import os
-import openai
-import google.generativeai as genai
-from datetime import datetime, timedelta
+import time
+from datetime import datetime
 import logging
 import redis
 import json
-import uuid
 from typing import List, Dict, Any, Optional
 import re
+import zlib
 from functools import wraps
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+from config import get_config
+from models import db, question_content_hash, User, Quiz, Question, QuizAnswer
+from adaptive import adaptive_selector
+from cache_warmer import cache_warmer
+from catalog import subject_catalog, DIFFICULTIES
+from counters import question_counters
+from health import health_monitor, Check
+from http_cache import content_versions
+from log_pipeline import log_pipeline
+from passwords import password_hasher, HasherBusy
+from profiles import user_profiles
+from query_stats import query_inspector
+from question_bank import question_bank
+from question_pools import question_pools, normalize_topics
+from quiz_sessions import quiz_sessions, SessionError, MAX_SESSION_QUESTIONS
+import calibration
+import grading
+import http_cache
+import ingestion
+import packs
+import providers
+import review
+import rollups
+import serialization
+import sync
+
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-CORS(app, origins=["http://localhost:3000", "https://smartquiz.app"])
-
-# Configuration
-app.config.update({
-    'SECRET_KEY': os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production'),
-    'SQLALCHEMY_DATABASE_URI': os.environ.get('DATABASE_URL', 'postgresql://localhost/smartquiz_db'),
-    'SQLALCHEMY_TRACK_MODIFICATIONS': False,
-    'JWT_SECRET_KEY': os.environ.get('JWT_SECRET_KEY', 'jwt-secret-change-in-production'),
-    'JWT_ACCESS_TOKEN_EXPIRES': timedelta(hours=24),
-    'MAX_CONTENT_LENGTH': 16 * 1024 * 1024  # 16MB max file size
-})
-
-# Initialize extensions
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
-jwt = JWTManager(app)
-
-# Redis for caching and rate limiting
-try:
-    redis_client = redis.Redis(
-        host=os.environ.get('REDIS_HOST', 'localhost'),
-        port=int(os.environ.get('REDIS_PORT', 6379)),
-        db=0,
-        decode_responses=True,
-        socket_connect_timeout=5,
-        socket_timeout=5
-    )
-    redis_client.ping()
-    logger.info("Redis connected successfully")
-except Exception as e:
-    redis_client = None
-    logger.warning(f"Redis not available: {e}")
-
-# AI Configuration
-openai.api_key = os.environ.get('OPENAI_API_KEY')
-if os.environ.get('GEMINI_API_KEY'):
-    genai.configure(api_key=os.environ.get('GEMINI_API_KEY'))
-
-# Database Models
-class User(db.Model):
-    __tablename__ = 'users'
-    
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    username = db.Column(db.String(80), unique=True, nullable=False, index=True)
-    email = db.Column(db.String(120), unique=True, nullable=False, index=True)
-    password_hash = db.Column(db.String(255), nullable=False)
-    display_name = db.Column(db.String(100), nullable=False)
-    avatar_url = db.Column(db.String(255))
-    level = db.Column(db.Integer, default=1)
-    total_xp = db.Column(db.Integer, default=0)
-    current_streak = db.Column(db.Integer, default=0)
-    longest_streak = db.Column(db.Integer, default=0)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
-    last_active_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
-    is_active = db.Column(db.Boolean, default=True)
-    
-    # Relationships
-    quizzes = db.relationship('Quiz', backref='user', lazy='dynamic', cascade='all, delete-orphan')
-
-class Quiz(db.Model):
-    __tablename__ = 'quizzes'
-    
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True)
-    subject = db.Column(db.String(50), nullable=False, index=True)
-    difficulty = db.Column(db.String(20), nullable=False, index=True)
-    total_questions = db.Column(db.Integer, nullable=False)
-    correct_answers = db.Column(db.Integer, default=0)
-    score = db.Column(db.Float, default=0.0)
-    percentage = db.Column(db.Float, default=0.0)
-    time_spent = db.Column(db.Integer, default=0)  # milliseconds
-    time_limit = db.Column(db.Integer, default=900)  # seconds
-    ai_feedback = db.Column(db.Text)
-    suggestions = db.Column(db.JSON)
-    started_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
-    completed_at = db.Column(db.DateTime, index=True)
-    is_completed = db.Column(db.Boolean, default=False, index=True)
-    metadata = db.Column(db.JSON)
-
-class Question(db.Model):
-    __tablename__ = 'questions'
-    
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    subject = db.Column(db.String(50), nullable=False, index=True)
-    difficulty = db.Column(db.String(20), nullable=False, index=True)
-    question_type = db.Column(db.String(30), default='multiple_choice')
-    question_text = db.Column(db.Text, nullable=False)
-    options = db.Column(db.JSON, nullable=False)  # List of options
-    correct_answer_index = db.Column(db.Integer, nullable=False)
-    explanation = db.Column(db.Text)
-    hints = db.Column(db.JSON, default=list)  # List of hints
-    tags = db.Column(db.JSON, default=list)  # List of tags
-    points = db.Column(db.Integer, default=1)
-    time_limit = db.Column(db.Integer)  # seconds
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
-    created_by = db.Column(db.String(20), default='ai')  # 'ai' or 'human'
-    source = db.Column(db.String(50), default='ai_generated')
-    is_active = db.Column(db.Boolean, default=True, index=True)
-    usage_count = db.Column(db.Integer, default=0)
-    success_rate = db.Column(db.Float, default=0.0)
+api = Blueprint('api', __name__)
+
+# Upper bound for gzip request bodies once inflated (zip bomb guard)
+MAX_INFLATED_BODY = 64 * 1024 * 1024
+# Questions per generate request
+MAX_GENERATE_COUNT = 20
+
+
+def app_state(name: str) -> Any:
+    """Per-app resource set up by create_app: 'redis' and 'redis_bytes' (None when
+    Redis is unreachable) and 'analytics_queue' (drained by `manage.py drain-analytics`)"""
+    return current_app.extensions['smartquiz'][name]
+
 
 # Utility Functions
 def cache_key(prefix: str, *args) -> str:
     """Generate standardized cache key"""
     return f"smartquiz:{prefix}:{':'.join(map(str, args))}"
 
+
 def get_from_cache(key: str) -> Optional[Any]:
     """Safely get value from Redis cache"""
+    redis_client = app_state('redis')
     if not redis_client:
         return None
     try:
         value = redis_client.get(key)
         return json.loads(value) if value else None
     except Exception as e:
-        logger.warning(f"Cache get failed for key {key}: {e}")
+        logger.warning("Cache get failed for key %s: %s", key, e)
         return None
 
+
 def set_cache(key: str, value: Any, ttl: int = 3600) -> None:
     """Safely set value in Redis cache"""
+    redis_client = app_state('redis')
     if not redis_client:
         return
     try:
         redis_client.setex(key, ttl, json.dumps(value, default=str))
     except Exception as e:
-        logger.warning(f"Cache set failed for key {key}: {e}")
+        logger.warning("Cache set failed for key %s: %s", key, e)
+
+
+def get_cached_blobs(*keys: str) -> List[Optional[bytes]]:
+    """Raw cached bytes for several keys in one round trip, without decoding"""
+    redis_bytes_client = app_state('redis_bytes')
+    if not redis_bytes_client:
+        return [None] * len(keys)
+    try:
+        return redis_bytes_client.mget(keys)
+    except Exception as e:
+        logger.warning("Cache get failed for keys %s: %s", keys, e)
+        return [None] * len(keys)
+
+
+def set_cached_blobs(values: Dict[str, bytes], ttl: int = 3600) -> None:
+    """Store pre-serialized values as-is"""
+    redis_bytes_client = app_state('redis_bytes')
+    if not redis_bytes_client:
+        return
+    try:
+        pipe = redis_bytes_client.pipeline(transaction=False)
+        for key, blob in values.items():
+            pipe.setex(key, ttl, blob)
+        pipe.execute()
+    except Exception as e:
+        logger.warning("Cache set failed for keys %s: %s", list(values), e)
+
+
+def get_question_payloads(question_ids: List[str]) -> Dict[str, bytes]:
+    """Client payload JSON by id: payload cache, then the mapped bank, then one DB query"""
+    keys = [cache_key('qpayload', qid) for qid in question_ids]
+    payloads = {qid: blob for qid, blob in zip(question_ids, get_cached_blobs(*keys)) if blob}
+    for qid in question_ids:
+        if qid not in payloads:
+            blob = question_bank.get(qid)
+            if blob is not None:
+                payloads[qid] = blob
+    missing = [qid for qid in question_ids if qid not in payloads]
+    if missing:
+        rows = Question.query.filter(Question.id.in_(missing), Question.is_active.is_(True))
+        loaded = {q.id: serialization.dumps_bytes(q.to_payload()) for q in rows}
+        cache_question_payloads(loaded)
+        payloads.update(loaded)
+    return payloads
+
+
+def cache_question_payloads(payloads: Dict[str, bytes]) -> None:
+    if payloads:
+        set_cached_blobs({cache_key('qpayload', qid): blob for qid, blob in payloads.items()},
+                         ttl=current_app.config['QUESTION_POOL_TTL'])
+
+
+def get_json_body() -> Optional[Any]:
+    """Request body as JSON or MessagePack (by Content-Type), optionally gzip-encoded"""
+    msgpack_body = serialization.is_msgpack_request()
+    gzipped = request.headers.get('Content-Encoding', '').lower() == 'gzip'
+    if not gzipped and not msgpack_body:
+        return request.get_json(silent=True)
+
+    try:
+        body = request.get_data()
+        if gzipped:
+            inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            body = inflater.decompress(body, MAX_INFLATED_BODY)
+            if inflater.unconsumed_tail:
+                logger.warning("Rejected gzip body above inflated size limit")
+                return None
+        return serialization.unpack(body) if msgpack_body else json.loads(body)
+    except (zlib.error, ValueError) as e:
+        logger.warning("Invalid request body: %s", e)
+        return None
+
+
+def respond(payload: Any, status: int = 200):
+    """Success response in the client's preferred wire format (JSON or MessagePack)"""
+    return serialization.response(current_app, payload, status)
+
 
 def rate_limit(max_requests: int = 100, window: int = 3600):
     """Advanced rate limiting decorator with Redis"""
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
+            redis_client = app_state('redis')
             if not redis_client:
                 return f(*args, **kwargs)
-            
+
             client_ip = request.headers.get('X-Forwarded-For', request.remote_addr)
             key = f"rate_limit:{client_ip}:{f.__name__}"
-            
+
             try:
                 pipe = redis_client.pipeline()
                 pipe.incr(key)
                 pipe.expire(key, window)
                 results = pipe.execute()
-                
+
                 if results[0] > max_requests:
                     return jsonify({
                         'error': 'Rate limit exceeded',
                         'retry_after': window
                     }), 429
-                    
+
             except Exception as e:
-                logger.warning(f"Rate limiting failed: {e}")
-            
+                logger.warning("Rate limiting failed: %s", e)
+
             return f(*args, **kwargs)
         return decorated_function
     return decorator
 
+
 def validate_request_data(required_fields: List[str]):
     """Decorator to validate required fields in request JSON"""
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            data = request.get_json()
+            data = get_json_body()
             if not data:
                 return jsonify({'error': 'JSON data required'}), 400
-            
+
             missing_fields = [field for field in required_fields if not data.get(field)]
             if missing_fields:
                 return jsonify({
                     'error': f'Missing required fields: {", ".join(missing_fields)}'
                 }), 400
-            
+
             return f(*args, **kwargs)
         return decorated_function
     return decorator
 
+
+def release_db_connection():
+    """End the current transaction so its pooled connection is not held across a slow AI call"""
+    db.session.commit()
+
+
 # AI Service Classes
 class AIQuestionGenerator:
     """Advanced AI question generation with multiple providers"""
-    
+
+    _model = os.environ.get('OPENAI_MODEL')
+
+    @classmethod
+    def chat_model(cls) -> str:
+        """Chat model, resolved from the account's model list once per worker"""
+        if cls._model is None:
+            available = str(providers.get_openai().Model.list(request_timeout=10))
+            cls._model = "gpt-4" if "gpt-4" in available else "gpt-3.5-turbo"
+        return cls._model
+
     @staticmethod
-    def generate_with_openai(subject: str, difficulty: str, count: int, 
-                           topics: List[str] = None, user_level: int = 1) -> List[Dict]:
+    def generate_with_openai(subject: str, difficulty: str, count: int,
+                             topics: List[str] = None, user_level: int = 1) -> List[Dict]:
         """Generate questions using OpenAI GPT-4"""
-        if not openai.api_key:
+        if not providers.openai_configured():
             raise ValueError("OpenAI API key not configured")
-        
+
         topics_context = f" focusing on {', '.join(topics)}" if topics else ""
+        level_context = f", phù hợp với học sinh cấp độ {user_level}" if user_level > 1 else ""
         difficulty_mapping = {
             'easy': 'cơ bản, phù hợp cho người mới bắt đầu',
             'medium': 'trung bình, yêu cầu hiểu biết vững chắc',
             'hard': 'nâng cao, thử thách tư duy phản biện'
         }
-        
+        scope = f"{difficulty_mapping.get(difficulty, difficulty)}{topics_context}{level_context}"
+
         prompt = f"""
-        Tạo {count} câu hỏi trắc nghiệm chất lượng cao cho môn {subject} ở mức độ {difficulty_mapping.get(difficulty, difficulty)}{topics_context}.
-        
+        Tạo {count} câu hỏi trắc nghiệm chất lượng cao cho môn {subject} ở mức độ {scope}.
+
         Yêu cầu chuyên nghiệp:
         - Mỗi câu hỏi có đúng 4 lựa chọn (A, B, C, D)
         - Đáp án phải chính xác 100% và có cơ sở khoa học
@@ -233,7 +266,7 @@ class AIQuestionGenerator:
         - Câu hỏi phải có tính ứng dụng thực tế
         - Sử dụng tiếng Việt chuẩn, thuật ngữ chính xác
         - Tránh câu hỏi mơ hồ hoặc có nhiều đáp án đúng
-        
+
         Trả về JSON array chính xác:
         [
             {{
@@ -247,68 +280,71 @@ class AIQuestionGenerator:
             }}
         ]
         """
-        
+
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-4" if "gpt-4" in str(openai.Model.list()) else "gpt-3.5-turbo",
+            response = providers.get_openai().ChatCompletion.create(
+                model=AIQuestionGenerator.chat_model(),
                 messages=[
                     {
-                        "role": "system", 
-                        "content": "Bạn là chuyên gia giáo dục với 20 năm kinh nghiệm, chuyên tạo câu hỏi chất lượng cao cho học sinh Việt Nam."
+                        "role": "system",
+                        "content": ("Bạn là chuyên gia giáo dục với 20 năm kinh nghiệm, "
+                                    "chuyên tạo câu hỏi chất lượng cao cho học sinh Việt Nam.")
                     },
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.7,
                 max_tokens=3000,
+                request_timeout=current_app.config['AI_REQUEST_TIMEOUT'],
                 presence_penalty=0.1,
                 frequency_penalty=0.1
             )
-            
+
             content = response.choices[0].message.content.strip()
-            
+
             # Extract and validate JSON
             json_match = re.search(r'\[.*\]', content, re.DOTALL)
             if not json_match:
                 raise ValueError("No valid JSON array found in response")
-            
+
             questions = json.loads(json_match.group())
-            
+
             # Validate question structure
             for i, q in enumerate(questions):
-                required_fields = ['question_text', 'options', 'correct_answer_index', 'explanation']
+                required_fields = ['question_text', 'options', 'correct_answer_index',
+                                   'explanation']
                 for field in required_fields:
                     if field not in q:
                         raise ValueError(f"Question {i+1} missing required field: {field}")
-                
+
                 if len(q['options']) != 4:
                     raise ValueError(f"Question {i+1} must have exactly 4 options")
-                
+
                 if not (0 <= q['correct_answer_index'] <= 3):
                     raise ValueError(f"Question {i+1} has invalid correct_answer_index")
-            
+
             return questions
-            
+
         except json.JSONDecodeError as e:
-            logger.error(f"JSON parsing failed: {e}")
+            logger.error("JSON parsing failed: %s", e)
             raise ValueError("Invalid JSON response from AI")
         except Exception as e:
-            logger.error(f"OpenAI question generation failed: {e}")
+            logger.error("OpenAI question generation failed: %s", e)
             raise
 
     @staticmethod
     def generate_feedback(quiz_data: Dict, answers: List[Dict], user_profile: Dict = None) -> Dict:
         """Generate comprehensive AI feedback"""
-        if not openai.api_key:
+        if not providers.openai_configured():
             raise ValueError("OpenAI API key not configured")
-        
+
         correct_count = sum(1 for answer in answers if answer.get('is_correct', False))
         total_questions = len(answers)
         accuracy = (correct_count / total_questions) * 100 if total_questions > 0 else 0
-        
+
         # Analyze answer patterns
         wrong_answers = [a for a in answers if not a.get('is_correct', False)]
         avg_time = sum(a.get('time_spent', 0) for a in answers) / len(answers) if answers else 0
-        
+
         user_context = ""
         if user_profile:
             user_context = f"""
@@ -317,22 +353,22 @@ class AIQuestionGenerator:
             - Tổng XP: {user_profile.get('total_xp', 0)}
             - Chuỗi ngày học: {user_profile.get('current_streak', 0)}
             """
-        
+
         prompt = f"""
         Phân tích chi tiết kết quả bài quiz và đưa ra phản hồi cá nhân hóa:
-        
+
         {user_context}
-        
+
         Kết quả bài quiz:
         - Môn học: {quiz_data.get('subject')}
         - Độ khó: {quiz_data.get('difficulty')}
         - Điểm số: {correct_count}/{total_questions} ({accuracy:.1f}%)
         - Thời gian trung bình/câu: {avg_time/1000:.1f} giây
         - Số câu sai: {len(wrong_answers)}
-        
+
         Chi tiết từng câu trả lời:
         {json.dumps(answers, indent=2, ensure_ascii=False)}
-        
+
         Yêu cầu phân tích chuyên nghiệp:
         1. Đánh giá tổng quan về năng lực hiện tại
         2. Xác định 3 điểm mạnh cụ thể
@@ -341,7 +377,7 @@ class AIQuestionGenerator:
         5. Gợi ý độ khó phù hợp cho lần học tiếp theo
         6. Ước tính thời gian ôn tập cần thiết
         7. Đánh giá mức độ tin cậy của phân tích
-        
+
         Trả về JSON:
         {{
             "overall_assessment": "Đánh giá tổng quan chi tiết",
@@ -350,7 +386,7 @@ class AIQuestionGenerator:
             "weaknesses": ["điểm yếu 1", "điểm yếu 2", "điểm yếu 3"],
             "recommendations": [
                 "khuyến nghị cụ thể 1",
-                "khuyến nghị cụ thể 2", 
+                "khuyến nghị cụ thể 2",
                 "khuyến nghị cụ thể 3",
                 "khuyến nghị cụ thể 4",
                 "khuyến nghị cụ thể 5"
@@ -362,223 +398,388 @@ class AIQuestionGenerator:
             "motivational_message": "Lời động viên tích cực"
         }}
         """
-        
+
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-4" if "gpt-4" in str(openai.Model.list()) else "gpt-3.5-turbo",
+            response = providers.get_openai().ChatCompletion.create(
+                model=AIQuestionGenerator.chat_model(),
                 messages=[
                     {
                         "role": "system",
-                        "content": "Bạn là chuyên gia tâm lý giáo dục và phân tích học tập, có khả năng đưa ra phản hồi cá nhân hóa giúp học sinh cải thiện hiệu quả học tập."
+                        "content": ("Bạn là chuyên gia tâm lý giáo dục và phân tích học tập, "
+                                    "có khả năng đưa ra phản hồi cá nhân hóa giúp học sinh "
+                                    "cải thiện hiệu quả học tập.")
                     },
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.6,
-                max_tokens=2000
+                max_tokens=2000,
+                request_timeout=current_app.config['AI_REQUEST_TIMEOUT']
             )
-            
+
             content = response.choices[0].message.content.strip()
             json_match = re.search(r'\{.*\}', content, re.DOTALL)
-            
+
             if not json_match:
                 raise ValueError("No valid JSON found in feedback response")
-            
+
             feedback = json.loads(json_match.group())
-            
+
             # Validate feedback structure
             required_fields = ['overall_assessment', 'strengths', 'weaknesses', 'recommendations']
             for field in required_fields:
                 if field not in feedback:
-                    logger.warning(f"Feedback missing field: {field}")
-            
+                    logger.warning("Feedback missing field: %s", field)
+
             return feedback
-            
+
         except Exception as e:
-            logger.error(f"AI feedback generation failed: {e}")
+            logger.error("AI feedback generation failed: %s", e)
             raise
 
+
+# Health checks
+def _probe_openai():
+    providers.get_openai().Model.list(request_timeout=10)
+
+
+def _probe_gemini():
+    next(iter(providers.get_genai().list_models()), None)
+
+
+def register_health_checks(app: Flask):
+    """Dependencies sampled by the health refresher (see health.py)"""
+    config = app.config
+    state = app.extensions['smartquiz']
+
+    def probe_database():
+        with app.app_context():
+            try:
+                db.session.execute(text('SELECT 1'))
+            finally:
+                db.session.remove()
+
+    health_monitor.init_app(app, {
+        'version': '2.0.0',
+        'environment': os.environ.get('FLASK_ENV', 'production')
+    })
+    health_monitor.register(Check('database', probe_database, critical=True,
+                                  warn=config['HEALTH_DB_WARN_MS'],
+                                  fail=config['HEALTH_DB_FAIL_MS']))
+    if state['redis']:
+        health_monitor.register(Check('redis', state['redis'].ping, critical=True,
+                                      warn=20, fail=500))
+    if providers.openai_configured():
+        health_monitor.register(Check('openai', _probe_openai, warn=3000,
+                                      interval=config['HEALTH_AI_INTERVAL']))
+    if providers.gemini_configured():
+        health_monitor.register(Check('gemini', _probe_gemini, warn=3000,
+                                      interval=config['HEALTH_AI_INTERVAL']))
+    if config['CELERY_BROKER_URL']:
+        broker = redis.Redis.from_url(config['CELERY_BROKER_URL'], socket_timeout=5,
+                                      socket_connect_timeout=5)
+        health_monitor.register(Check('celery_queue', lambda: broker.llen(config['CELERY_QUEUE']),
+                                      warn=config['HEALTH_QUEUE_WARN'],
+                                      fail=config['HEALTH_QUEUE_FAIL'], unit='tasks'))
+    health_monitor.register(Check('analytics_queue', state['analytics_queue'].depth,
+                                  warn=config['HEALTH_QUEUE_WARN'],
+                                  fail=config['HEALTH_QUEUE_FAIL'], unit='events'))
+    health_monitor.register(Check('log_queue', log_pipeline.depth,
+                                  warn=config['LOG_QUEUE_SIZE'] // 2, unit='records'))
+
+
+def probe_response(body: bytes, status: int):
+    response = current_app.response_class(body, status=status, mimetype='application/json')
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
 # API Routes
-@app.route('/api/v1/health', methods=['GET'])
+@api.route('/livez', methods=['GET'])
+def livez():
+    """Process liveness; never touches a dependency"""
+    return probe_response(*health_monitor.live())
+
+
+@api.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness from the last health snapshot: 503 while a critical dependency is failing"""
+    return probe_response(*health_monitor.ready())
+
+
+@api.route('/api/v1/health', methods=['GET'])
 def health_check():
-    """Comprehensive health check"""
-    services = {}
-    
-    # Database check
-    try:
-        db.session.execute('SELECT 1')
-        services['database'] = {'status': 'healthy', 'response_time': 0}
-    except Exception as e:
-        services['database'] = {'status': 'unhealthy', 'error': str(e)}
-    
-    # Redis check
-    if redis_client:
-        try:
-            start_time = time.time()
-            redis_client.ping()
-            response_time = (time.time() - start_time) * 1000
-            services['redis'] = {'status': 'healthy', 'response_time': f'{response_time:.2f}ms'}
-        except Exception as e:
-            services['redis'] = {'status': 'unhealthy', 'error': str(e)}
-    else:
-        services['redis'] = {'status': 'not_configured'}
-    
-    # AI services check
-    services['openai'] = {
-        'status': 'configured' if openai.api_key else 'not_configured'
+    """Detailed health snapshot (latency percentiles per dependency, sampled in the background)"""
+    check = request.args.get('history')
+    if check:
+        return jsonify({'service': check, 'history': health_monitor.history_of(check)})
+    return probe_response(*health_monitor.health())
+
+
+def serialize_user(user: User) -> Dict[str, Any]:
+    return {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'display_name': user.display_name,
+        'level': user.level,
+        'total_xp': user.total_xp,
+        'created_at': user.created_at.isoformat()
     }
-    services['gemini'] = {
-        'status': 'configured' if os.environ.get('GEMINI_API_KEY') else 'not_configured'
+
+
+def auth_tokens(user: User) -> Dict[str, Any]:
+    return {
+        'access_token': create_access_token(
+            identity=user.id,
+            additional_claims={'username': user.username}
+        ),
+        'refresh_token': create_refresh_token(identity=user.id),
+        'expires_in': int(current_app.config['JWT_ACCESS_TOKEN_EXPIRES'].total_seconds())
     }
-    
-    overall_status = 'healthy' if all(
-        s.get('status') in ['healthy', 'configured'] for s in services.values()
-    ) else 'degraded'
-    
-    return jsonify({
-        'status': overall_status,
-        'timestamp': datetime.utcnow().isoformat(),
-        'version': '2.0.0',
-        'environment': os.environ.get('FLASK_ENV', 'production'),
-        'services': services
-    })
 
-@app.route('/api/v1/auth/register', methods=['POST'])
+
+@api.route('/api/v1/auth/register', methods=['POST'])
+@api.route('/api/v1/users/register', methods=['POST'])
 @rate_limit(max_requests=10, window=3600)
 @validate_request_data(['username', 'email', 'password', 'display_name'])
 def register():
     """Enhanced user registration with validation"""
     try:
-        data = request.get_json()
-        
+        data = get_json_body()
+
         # Enhanced validation
         username = data['username'].strip().lower()
         email = data['email'].strip().lower()
         password = data['password']
         display_name = data['display_name'].strip()
-        
+
         # Validation rules
         if len(username) < 3 or len(username) > 30:
             return jsonify({'error': 'Username must be 3-30 characters'}), 400
-        
+
         if not re.match(r'^[a-zA-Z0-9_]+$', username):
-            return jsonify({'error': 'Username can only contain letters, numbers, and underscores'}), 400
-        
+            return jsonify({
+                'error': 'Username can only contain letters, numbers, and underscores'}), 400
+
         if not re.match(r'^[^\s@]+@[^\s@]+\.[^\s@]+$', email):
             return jsonify({'error': 'Invalid email format'}), 400
-        
+
         if len(password) < 8:
             return jsonify({'error': 'Password must be at least 8 characters'}), 400
-        
+
         if len(display_name) < 2 or len(display_name) > 50:
             return jsonify({'error': 'Display name must be 2-50 characters'}), 400
-        
-        # Check existing users
-        if User.query.filter_by(username=username).first():
+
+        # One indexed lookup for both unique fields, before paying for the KDF
+        taken = db.session.execute(
+            db.select(User.username, User.email)
+            .where(db.or_(User.username == username, User.email == email))
+            .limit(2)
+        ).all()
+        if any(row.username == username for row in taken):
             return jsonify({'error': 'Username already exists'}), 409
-        
-        if User.query.filter_by(email=email).first():
+        if taken:
             return jsonify({'error': 'Email already registered'}), 409
-        
+
         # Create user
         user = User(
             username=username,
             email=email,
-            password_hash=generate_password_hash(password),
+            password_hash=password_hasher.hash(password),
             display_name=display_name
         )
-        
+
         db.session.add(user)
-        db.session.commit()
-        
-        # Generate JWT token
-        access_token = create_access_token(
-            identity=user.id,
-            additional_claims={'username': user.username}
-        )
-        
-        logger.info(f"New user registered: {username}")
-        
-        return jsonify({
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            # A concurrent signup won the race; the unique constraints decide
+            db.session.rollback()
+            if 'username' in str(e.orig).lower():
+                return jsonify({'error': 'Username already exists'}), 409
+            return jsonify({'error': 'Email already registered'}), 409
+
+        logger.info("New user registered: %s", username)
+
+        return jsonify(dict({
             'message': 'Registration successful',
-            'user': {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'display_name': user.display_name,
-                'level': user.level,
-                'total_xp': user.total_xp,
-                'created_at': user.created_at.isoformat()
-            },
-            'access_token': access_token
-        }), 201
-        
+            'user': serialize_user(user)
+        }, **auth_tokens(user))), 201
+
+    except HasherBusy:
+        return jsonify({'error': 'Server busy, please retry'}), 503, {'Retry-After': '2'}
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Registration failed: {e}")
+        logger.error("Registration failed: %s", e)
         return jsonify({'error': 'Registration failed'}), 500
 
-@app.route('/api/v1/questions/generate', methods=['POST'])
+
+@api.route('/api/v1/auth/login', methods=['POST'])
+@api.route('/api/v1/users/login', methods=['POST'])
+@rate_limit(max_requests=30, window=900)
+@validate_request_data(['username', 'password'])
+def login():
+    """Password login by username or email"""
+    try:
+        data = get_json_body()
+        login_name = str(data['username']).strip().lower()
+        password = str(data['password'])
+
+        user = User.query.filter(
+            db.or_(User.username == login_name, User.email == login_name)
+        ).first()
+
+        verified = password_hasher.verify(user.password_hash if user else None, password)
+        if not verified or not user.is_active:
+            return jsonify({'error': 'Invalid username or password'}), 401
+
+        user.last_active_at = datetime.utcnow()
+        if password_hasher.needs_rehash(user.password_hash):
+            user.password_hash = password_hasher.hash(password)
+        db.session.commit()
+
+        return jsonify(dict({
+            'message': 'Login successful',
+            'user': serialize_user(user)
+        }, **auth_tokens(user)))
+
+    except HasherBusy:
+        return jsonify({'error': 'Server busy, please retry'}), 503, {'Retry-After': '2'}
+    except Exception as e:
+        db.session.rollback()
+        logger.error("Login failed: %s", e)
+        return jsonify({'error': 'Login failed'}), 500
+
+
+@api.route('/api/v1/questions/generate', methods=['POST'])
 @jwt_required()
 @rate_limit(max_requests=20, window=3600)
 @validate_request_data(['subject', 'difficulty'])
 def generate_questions():
     """Advanced AI question generation with caching and validation"""
     try:
-        data = request.get_json()
+        data = get_json_body()
         user_id = get_jwt_identity()
-        
+
         subject = data['subject']
         difficulty = data['difficulty']
-        count = min(data.get('count', 10), 20)  # Max 20 questions
+        count = data.get('count', 10)
         topics = data.get('topics', [])
-        
+        mode = data.get('mode', 'generate')
+
         # Validate inputs
-        valid_subjects = ['math', 'physics', 'chemistry', 'biology', 'history', 'geography', 'literature', 'english']
-        valid_difficulties = ['easy', 'medium', 'hard']
-        
-        if subject not in valid_subjects:
-            return jsonify({'error': f'Invalid subject. Must be one of: {valid_subjects}'}), 400
-        
-        if difficulty not in valid_difficulties:
-            return jsonify({'error': f'Invalid difficulty. Must be one of: {valid_difficulties}'}), 400
-        
-        # Check cache first
-        cache_key_str = cache_key('questions', subject, difficulty, count, hash(tuple(sorted(topics))))
-        cached_result = get_from_cache(cache_key_str)
-        
-        if cached_result:
-            logger.info(f"Serving cached questions for {subject}/{difficulty}")
+        if not subject_catalog.has_subject(subject):
+            return jsonify({
+                'error': f'Invalid subject. Must be one of: {subject_catalog.subjects()}'}), 400
+
+        if difficulty not in DIFFICULTIES:
+            return jsonify({
+                'error': f'Invalid difficulty. Must be one of: {list(DIFFICULTIES)}'}), 400
+
+        if (isinstance(count, bool) or not isinstance(count, int)
+                or not 1 <= count <= MAX_GENERATE_COUNT):
             return jsonify({
-                'questions': cached_result,
-                'cached': True,
-                'generated_at': datetime.utcnow().isoformat()
-            })
-        
+                'error': f'Invalid count. Must be an integer from 1 to {MAX_GENERATE_COUNT}'}), 400
+
+        if mode not in ('generate', 'adaptive'):
+            return jsonify({'error': "Invalid mode. Must be 'generate' or 'adaptive'"}), 400
+
+        # Adaptive mode serves calibrated bank questions near the user's ability
+        if mode == 'adaptive':
+            profile = user_profiles.get(user_id)
+            ability = profile['ability'] if profile else None
+            question_ids = adaptive_selector.pick(user_id, subject, ability, count)
+
+            if len(question_ids) >= count:
+                adaptive_selector.mark_seen(user_id, question_ids)
+                question_counters.record_served(question_ids)
+                metadata = {'subject': subject, 'mode': 'adaptive', 'count': len(question_ids),
+                            'ability': ability}
+
+                # Payloads straight from the mapped bank when it holds them all: no DB round trip
+                payloads = question_bank.get_many(question_ids)
+                if payloads is not None:
+                    return serialization.raw_json_response(
+                        current_app, {'questions': question_bank.join(payloads)}, {
+                            'cached': True,
+                            'generated_at': datetime.utcnow().isoformat(),
+                            'metadata': metadata
+                        })
+
+                rows = Question.query.filter(Question.id.in_(question_ids),
+                                             Question.is_active.is_(True))
+                by_id = {q.id: q for q in rows}
+                questions = [by_id[qid].to_payload() for qid in question_ids if qid in by_id]
+                return respond({
+                    'questions': questions,
+                    'cached': True,
+                    'generated_at': datetime.utcnow().isoformat(),
+                    'metadata': dict(metadata, count=len(questions))
+                })
+
+            logger.info("Adaptive bank short for %s (%s/%s), generating",
+                        subject, len(question_ids), count)
+
+        # Generated questions are pooled per subject/difficulty/topic, whatever count asked for them
+        topics = normalize_topics(topics)
+        cache_warmer.record(subject, difficulty, topics, count)
+        candidates = question_pools.sample(subject, difficulty, topics, count * 3)
+        try:
+            candidates = adaptive_selector.filter_unseen(user_id, candidates)
+        except Exception as e:
+            logger.warning("Seen filter failed: %s", e)
+        pooled_ids, pooled = [], []
+        if candidates:
+            payloads = get_question_payloads(candidates[:count * 2])
+            for qid in candidates[:count * 2]:
+                if qid in payloads and len(pooled) < count:
+                    pooled_ids.append(qid)
+                    pooled.append(payloads[qid])
+        shortfall = count - len(pooled)
+
+        if not shortfall:
+            logger.info("Serving pooled questions for %s/%s", subject, difficulty)
+            question_pools.record(count, count)
+            question_counters.record_served(pooled_ids)
+            adaptive_selector.mark_seen(user_id, pooled_ids)
+            # Pooled payloads are spliced into the envelope as stored, never parsed
+            return serialization.raw_json_response(
+                current_app, {'questions': question_bank.join(pooled)}, {
+                    'cached': True,
+                    'generated_at': datetime.utcnow().isoformat(),
+                    'metadata': {'subject': subject, 'difficulty': difficulty, 'count': count,
+                                 'from_pool': count, 'generated': 0}
+                })
+
         # Get user profile for personalization
-        user = User.query.get(user_id)
-        user_level = user.level if user else 1
-        
+        profile = user_profiles.get(user_id)
+        user_level = (profile['level'] or 1) if profile else 1
+
         # Generate questions with AI
         questions = []
         generation_start = time.time()
-        
+        release_db_connection()
+
         try:
-            if openai.api_key:
+            if providers.openai_configured():
                 questions = AIQuestionGenerator.generate_with_openai(
-                    subject, difficulty, count, topics, user_level
+                    subject, difficulty, shortfall, topics, user_level
                 )
             else:
                 return jsonify({'error': 'AI service not available'}), 503
-                
+
         except Exception as ai_error:
-            logger.error(f"AI generation failed: {ai_error}")
+            logger.error("AI generation failed: %s", ai_error)
             return jsonify({'error': 'Failed to generate questions'}), 500
-        
+
         generation_time = time.time() - generation_start
-        
+
         # Save questions to database for analytics
         saved_questions = []
         for q_data in questions:
+            difficulty_score = q_data.get('difficulty_score')
+            if not isinstance(difficulty_score, (int, float)):
+                difficulty_score = None
             question = Question(
                 subject=subject,
                 difficulty=difficulty,
@@ -588,49 +789,552 @@ def generate_questions():
                 explanation=q_data.get('explanation', ''),
                 hints=q_data.get('hints', []),
                 tags=q_data.get('tags', []),
-                points=q_data.get('points', 1)
+                points=q_data.get('points', 1),
+                difficulty_score=difficulty_score,
+                irt_difficulty=calibration.prior_difficulty(difficulty, difficulty_score),
+                content_hash=question_content_hash(subject, q_data['question_text'],
+                                                   q_data['options'])
             )
             db.session.add(question)
             saved_questions.append(question)
-        
-        db.session.commit()
-        
-        # Add database IDs to questions
-        for i, question in enumerate(saved_questions):
-            questions[i]['id'] = question.id
-        
-        # Cache the results
-        set_cache(cache_key_str, questions, ttl=1800)  # 30 minutes
-        
-        logger.info(f"Generated {len(questions)} questions for {subject}/{difficulty} in {generation_time:.2f}s")
-        
-        return jsonify({
-            'questions': questions,
+
+        db.session.flush()
+        # Payloads and adaptive buckets are filled before commit expires the rows
+        # (no reload per question)
+        fresh = {q.id: serialization.dumps_bytes(q.to_payload()) for q in saved_questions}
+        adaptive_selector.add_questions(saved_questions)
+        db.session.commit()  # the catalog picks the new questions up on commit
+
+        # New questions join the pools and payload cache; the response splices pooled
+        # and new payloads
+        cache_question_payloads(fresh)
+        question_pools.add(subject, difficulty, topics, fresh)
+        question_pools.record(count, len(pooled))
+        served_ids = pooled_ids + list(fresh)
+        question_counters.record_served(served_ids)
+        adaptive_selector.mark_seen(user_id, served_ids)
+
+        logger.info("Generated %s questions for %s/%s in %.2fs (%s from pool)",
+                    len(fresh), subject, difficulty, generation_time, len(pooled))
+
+        return serialization.raw_json_response(current_app, {
+            'questions': question_bank.join(pooled + list(fresh.values()))
+        }, {
             'cached': False,
             'generated_at': datetime.utcnow().isoformat(),
             'generation_time': f'{generation_time:.2f}s',
             'metadata': {
                 'subject': subject,
                 'difficulty': difficulty,
-                'count': len(questions),
+                'count': len(pooled) + len(fresh),
+                'from_pool': len(pooled),
+                'generated': len(fresh),
                 'user_level': user_level
             }
         })
-        
+
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Question generation failed: {e}")
+        logger.error("Question generation failed: %s", e)
         return jsonify({'error': 'Question generation failed'}), 500
 
+
+def question_etag(question_id: str) -> str:
+    """Digest of the active question's payload (bank or DB), kept in g for the view"""
+    payload = question_bank.get(question_id)
+    if payload is None:
+        question = db.session.get(Question, question_id)
+        if question and question.is_active:
+            payload = serialization.dumps_bytes(question.to_payload())
+    g.question_payload = (question_id, payload)
+    return http_cache.make_etag('question', question_id, http_cache.content_digest(payload))
+
+
+@api.route('/api/v1/questions/<question_id>', methods=['GET'])
+@jwt_required()
+@http_cache.conditional(question_etag)
+def get_question(question_id):
+    """Single bank question; the ETag is a digest of its payload, so any edit changes it"""
+    loaded_id, payload = g.pop('question_payload', (None, None))
+    if loaded_id != question_id:
+        question_etag(question_id)
+        loaded_id, payload = g.pop('question_payload')
+    if payload is None:
+        return jsonify({'error': 'Question not found'}), 404
+    return serialization.loads(payload)
+
+
+@api.route('/api/v1/subjects', methods=['GET'])
+@http_cache.conditional(lambda: http_cache.make_etag('subjects', subject_catalog.version()))
+def list_subjects():
+    """Subjects with active question counts per difficulty, from the in-memory catalog"""
+    try:
+        return subject_catalog.subjects_payload()
+    except Exception as e:
+        logger.error("Loading subjects failed: %s", e)
+        return jsonify({'error': 'Failed to load subjects'}), 500
+
+
+@api.route('/api/v1/subjects/<subject>/topics', methods=['GET'])
+@http_cache.conditional(
+    lambda subject: http_cache.make_etag('topics', subject, subject_catalog.version()))
+def list_topics(subject):
+    """Topics (question tags) of a subject with counts per difficulty, most common first"""
+    try:
+        topics = subject_catalog.topics_payload(subject)
+    except Exception as e:
+        logger.error("Loading topics for %s failed: %s", subject, e)
+        return jsonify({'error': 'Failed to load topics'}), 500
+    if topics is None:
+        return jsonify({'error': 'Subject not found'}), 404
+    return topics
+
+
+@api.route('/api/v1/packs/manifest', methods=['GET'])
+@jwt_required()
+def pack_manifest():
+    """Latest offline pack per subject/difficulty and the deltas leading to it"""
+    return send_from_directory(os.path.abspath(current_app.config['CONTENT_PACKS_DIR']),
+                               packs.MANIFEST_NAME, mimetype='application/json', max_age=0)
+
+
+@api.route('/api/v1/packs/<path:filename>', methods=['GET'])
+@jwt_required()
+def pack_file(filename):
+    """Pack or delta file; names are content-hashed so they are cached forever.
+
+    Served straight from disk (sendfile through the WSGI file wrapper, or
+    X-Sendfile when USE_X_SENDFILE is on) with Range and conditional support.
+    """
+    response = send_from_directory(os.path.abspath(current_app.config['CONTENT_PACKS_DIR']),
+                                   filename, mimetype='application/gzip',
+                                   max_age=365 * 24 * 3600)
+    response.cache_control.immutable = True
+    return response
+
+
+@api.route('/api/v1/analytics/user-stats', methods=['GET'])
+@jwt_required()
+def user_stats():
+    """User statistics served from the daily rollups"""
+    user_id = get_jwt_identity()
+    timeframe = request.args.get('timeframe', 'month')
+
+    days = rollups.TIMEFRAME_DAYS.get(timeframe)
+    if not days:
+        return jsonify({
+            'error': f'Invalid timeframe. Must be one of: {list(rollups.TIMEFRAME_DAYS)}'
+        }), 400
+
+    try:
+        stats = rollups.get_user_stats(user_id, days)
+    except Exception as e:
+        logger.error("User stats failed: %s", e)
+        return jsonify({'error': 'Failed to load statistics'}), 500
+
+    return respond({'stats': stats, 'timeframe': timeframe})
+
+
+@api.route('/api/v1/quizzes/sync', methods=['POST'])
+@jwt_required()
+@rate_limit(max_requests=120, window=3600)
+def sync_quizzes():
+    """Batch upload of offline quizzes with delta download since the client watermark"""
+    data = get_json_body()
+    if not isinstance(data, dict):
+        return jsonify({'error': 'JSON data required'}), 400
+
+    try:
+        result = sync.sync_quizzes(get_jwt_identity(), data)
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error("Quiz sync failed: %s", e)
+        return jsonify({'error': 'Quiz sync failed'}), 500
+
+    logger.info("Synced %s quizzes (%s replayed)",
+                result['synced_count'], len(result['duplicates']))
+    return respond(result)
+
+
+@api.route('/api/v1/quizzes/start', methods=['POST'])
+@jwt_required()
+@rate_limit(max_requests=200, window=3600)
+def start_quiz():
+    """Start a server-graded quiz; answers stay on the server until each is submitted"""
+    data = get_json_body()
+    if not isinstance(data, dict):
+        return jsonify({'error': 'JSON data required'}), 400
+    if not quiz_sessions.available:
+        # Checked before the adaptive pick so no questions are marked seen for nothing
+        return jsonify({'error': 'Quiz sessions are unavailable, try again later'}), 503
+    user_id = get_jwt_identity()
+
+    subject = data.get('subject')
+    difficulty = data.get('difficulty', 'medium')
+    if not subject_catalog.has_subject(subject):
+        return jsonify({
+            'error': f'Invalid subject. Must be one of: {subject_catalog.subjects()}'}), 400
+    if difficulty not in DIFFICULTIES:
+        return jsonify({'error': f'Invalid difficulty. Must be one of: {list(DIFFICULTIES)}'}), 400
+
+    try:
+        count = max(1, min(int(data.get('count', 10)), 20))
+        time_limit = max(60, min(int(data.get('time_limit', 900)), 7200))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'count and time_limit must be integers'}), 400
+
+    # Questions the client already holds (generated, packs), else an ability-matched pick
+    question_ids = data.get('question_ids')
+    if not question_ids:
+        profile = user_profiles.get(user_id)
+        ability = profile['ability'] if profile else None
+        question_ids = adaptive_selector.pick(user_id, subject, ability, count)
+        adaptive_selector.mark_seen(user_id, question_ids)
+    elif not isinstance(question_ids, list):
+        return jsonify({'error': 'question_ids must be a list'}), 400
+
+    # Client ids are deduplicated and must match the quiz's subject and difficulty
+    client_supplied = bool(data.get('question_ids'))
+    question_ids = list(dict.fromkeys(str(qid) for qid in question_ids))[:MAX_SESSION_QUESTIONS]
+    query = Question.query.filter(Question.id.in_(question_ids), Question.is_active.is_(True),
+                                  Question.subject == subject)
+    if client_supplied:
+        query = query.filter(Question.difficulty == difficulty)
+    by_id = {q.id: q for q in query}
+    ordered = [by_id[qid] for qid in question_ids if qid in by_id]
+
+    try:
+        session = quiz_sessions.start(user_id, subject, difficulty, ordered, time_limit)
+    except SessionError as e:
+        return jsonify({'error': str(e)}), e.status
+    except Exception as e:
+        db.session.rollback()
+        logger.error("Quiz start failed: %s", e)
+        return jsonify({'error': 'Failed to start quiz'}), 500
+
+    return respond(session, 201)
+
+
+@api.route('/api/v1/quizzes/<quiz_id>/answer', methods=['POST'])
+@jwt_required()
+def answer_quiz_question(quiz_id):
+    """Grade one answer of a running quiz session"""
+    data = get_json_body()
+    if not isinstance(data, dict) or not data.get('question_id'):
+        return jsonify({'error': 'question_id required'}), 400
+
+    try:
+        selected = data.get('selected_answer_index')
+        result = quiz_sessions.answer(
+            get_jwt_identity(), quiz_id, str(data['question_id']),
+            int(selected) if selected is not None else None,
+            int(data.get('time_spent', 0))
+        )
+    except (TypeError, ValueError):
+        return jsonify({'error': 'selected_answer_index and time_spent must be integers'}), 400
+    except SessionError as e:
+        return jsonify({'error': str(e)}), e.status
+    except Exception as e:
+        logger.error("Answer grading failed: %s", e)
+        return jsonify({'error': 'Failed to record answer'}), 500
+
+    return respond(result)
+
+
+@api.route('/api/v1/quizzes/<quiz_id>/finish', methods=['POST'])
+@jwt_required()
+def finish_quiz(quiz_id):
+    """Close a quiz session and store its server-graded result"""
+    try:
+        result = quiz_sessions.finish(get_jwt_identity(), quiz_id)
+    except SessionError as e:
+        return jsonify({'error': str(e)}), e.status
+    except Exception as e:
+        db.session.rollback()
+        logger.error("Quiz finish failed: %s", e)
+        return jsonify({'error': 'Failed to finish quiz'}), 500
+
+    return respond(result)
+
+
+@api.route('/api/v1/grading/batch', methods=['POST'])
+@jwt_required()
+@rate_limit(max_requests=60, window=3600)
+def grade_batch():
+    """Grade a class-wide assessment against one question set and store the quizzes"""
+    if get_jwt_identity() not in current_app.config['GRADING_USER_IDS']:
+        return jsonify({'error': 'Batch grading not allowed for this account'}), 403
+
+    data = get_json_body()
+    if not isinstance(data, dict):
+        return jsonify({'error': 'JSON data required'}), 400
+
+    try:
+        result = grading.grade_batch(
+            [str(qid) for qid in data.get('question_ids') or []],
+            data.get('submissions') or [],
+            subject=data.get('subject'),
+            difficulty=data.get('difficulty'),
+            store_answers=bool(data.get('store_answers', True))
+        )
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error("Batch grading failed: %s", e)
+        return jsonify({'error': 'Batch grading failed'}), 500
+
+    return respond(result)
+
+
+@api.route('/api/v1/feedback/generate', methods=['POST'])
+@jwt_required()
+@rate_limit(max_requests=30, window=3600)
+def generate_feedback():
+    """AI feedback for a completed quiz, from answers re-graded against the question bank"""
+    data = get_json_body()
+    quiz_id = data.get('quiz_id') if isinstance(data, dict) else None
+    if not quiz_id:
+        return jsonify({'error': 'quiz_id required'}), 400
+    user_id = get_jwt_identity()
+
+    quiz = Quiz.query.filter_by(id=str(quiz_id), user_id=user_id).first()
+    if not quiz:
+        return jsonify({'error': 'Quiz not found'}), 404
+    if not quiz.is_completed:
+        return jsonify({'error': 'Quiz is not finished yet'}), 409
+    if not providers.openai_configured():
+        return jsonify({'error': 'AI service not available'}), 503
+
+    # Correctness comes from the bank, never from what the client reported
+    answers = [
+        {
+            'question': question_text,
+            'selected_answer_index': selected,
+            'correct_answer_index': correct,
+            'is_correct': selected is not None and selected == correct,
+            'time_spent': time_spent or 0
+        }
+        for question_text, selected, correct, time_spent in db.session.execute(
+            db.select(Question.question_text, QuizAnswer.selected_answer_index,
+                      Question.correct_answer_index, QuizAnswer.time_spent)
+            .join(Question, Question.id == QuizAnswer.question_id)
+            .where(QuizAnswer.quiz_id == quiz.id)
+            .order_by(QuizAnswer.answered_at)
+        )
+    ]
+    if not answers:
+        return jsonify({'error': 'Quiz has no gradable answers'}), 400
+
+    profile = user_profiles.get(user_id)
+    quiz_id, quiz_data = quiz.id, {'subject': quiz.subject, 'difficulty': quiz.difficulty}
+    release_db_connection()
+
+    try:
+        feedback = AIQuestionGenerator.generate_feedback(quiz_data, answers, profile)
+        db.session.execute(
+            db.update(Quiz).where(Quiz.id == quiz_id)
+            .values(ai_feedback=json.dumps(feedback, ensure_ascii=False))
+        )
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error("Feedback generation failed: %s", e)
+        return jsonify({'error': 'Failed to generate feedback'}), 500
+
+    return respond({
+        'quiz_id': quiz_id,
+        'feedback': feedback,
+        'correct_answers': sum(a['is_correct'] for a in answers),
+        'total_answers': len(answers)
+    })
+
+
+@api.route('/api/v1/analytics/quiz-completed', methods=['POST'])
+@jwt_required()
+def quiz_completed():
+    """Record a quiz-completed event; persisted asynchronously by the analytics drain"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'JSON data required'}), 400
+
+    try:
+        event = ingestion.validate_quiz_completed(get_jwt_identity(), data)
+        app_state('analytics_queue').push(event)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error("Analytics enqueue failed: %s", e)
+        return jsonify({'recorded': False, 'message': 'Event could not be queued'}), 503
+
+    return jsonify({'recorded': True, 'message': None}), 202
+
+
+@api.route('/api/v1/reviews/due', methods=['GET'])
+@jwt_required()
+def due_reviews():
+    """Next spaced-repetition reviews that are due for the current user"""
+    user_id = get_jwt_identity()
+    limit = request.args.get('limit', 20, type=int)
+
+    try:
+        items = review.due_reviews(user_id, max(1, limit))
+        return respond({
+            'reviews': items,
+            'due_total': review.due_count(user_id)
+        })
+    except Exception as e:
+        logger.error("Loading due reviews failed: %s", e)
+        return jsonify({'error': 'Failed to load reviews'}), 500
+
+
+@api.route('/api/v1/reviews/submit', methods=['POST'])
+@jwt_required()
+def submit_reviews():
+    """Record review answers done outside a synced quiz"""
+    data = request.get_json(silent=True)
+    answers = data.get('answers') if isinstance(data, dict) else None
+    if not isinstance(answers, list) or not answers:
+        return jsonify({'error': 'answers list required'}), 400
+
+    try:
+        rows = [
+            {
+                'question_id': str(a['question_id']),
+                'is_correct': bool(a.get('is_correct', False)),
+                'time_spent': int(a.get('time_spent', 0)),
+                'answered_at': sync.parse_timestamp(a.get('answered_at'))
+            }
+            for a in answers[:review.MAX_DUE_BATCH]
+        ]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Malformed review answers'}), 400
+
+    try:
+        updated = review.apply_answers(get_jwt_identity(), rows)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error("Review submit failed: %s", e)
+        return jsonify({'error': 'Failed to record reviews'}), 500
+
+    return jsonify({'updated': updated})
+
+
+# Application factory
+def connect_redis(config):
+    """(decoding client, raw bytes client) for the configured Redis, or (None, None)"""
+    options = dict(
+        host=config['REDIS_HOST'],
+        port=config['REDIS_PORT'],
+        password=config['REDIS_PASSWORD'],
+        db=config['REDIS_DB'],
+        socket_connect_timeout=5,
+        socket_timeout=5
+    )
+    try:
+        client = redis.Redis(decode_responses=True, **options)
+        client.ping()
+        logger.info("Redis connected successfully")
+        # Same server without response decoding, for pre-serialized payloads
+        return client, redis.Redis(**options)
+    except Exception as e:
+        logger.warning("Redis not available: %s", e)
+        return None, None
+
+
+def create_app(config_name: Optional[str] = None) -> Flask:
+    """Build the API app for a config name from config.py (default: $FLASK_ENV).
+
+    Redis clients and the analytics queue live in app.extensions['smartquiz'].
+    The shared helpers (counters, pools, sessions, ...) are process-wide and
+    bound to the last app built, so a process builds one: wsgi.py for the
+    servers, manage.py for the maintenance commands.
+    """
+    timings = {}
+    started = mark = time.perf_counter()
+
+    def step(name):
+        nonlocal mark
+        now = time.perf_counter()
+        timings[name] = round((now - mark) * 1000, 1)
+        mark = now
+
+    config_class = get_config(config_name)
+    app = Flask(__name__)
+    app.config.from_object(config_class)
+    config_class.init_app(app)
+    log_pipeline.init_app(app)
+    CORS(app, origins=app.config['CORS_ORIGINS'])
+    step('config')
+
+    db.init_app(app)
+    query_inspector.init_app(app)
+    subject_catalog.init_app(app)
+    serialization.init_app(app)
+    password_hasher.init_app(app)
+    providers.init_app(app)
+    JWTManager(app)
+    if app.config['DB_MIGRATIONS_CLI']:
+        # Alembic costs ~0.5s to import and only the `flask db` commands need it
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    step('extensions')
+
+    redis_client, redis_bytes_client = connect_redis(app.config)
+    step('redis')
+
+    app.extensions['smartquiz'] = {
+        'redis': redis_client,
+        'redis_bytes': redis_bytes_client,
+        'analytics_queue': ingestion.create_queue(redis_client, app.config['ANALYTICS_QUEUE_DIR'])
+    }
+    # Mapped here so a preloading master shares the pages with every worker it forks
+    question_bank.init_app(app, redis_client)
+    # Question usage counters are flushed to the DB in bulk (see counters.py)
+    question_counters.init_app(app, redis_client)
+    adaptive_selector.init_app(app, redis_client)
+    question_pools.init_app(app, redis_client)
+    cache_warmer.init_app(app, redis_client)
+    content_versions.init_app(app, redis_client)
+    quiz_sessions.init_app(app, redis_client)
+    user_profiles.init_app(app, redis_client)
+    register_health_checks(app)
+    app.register_blueprint(api)
+    step('wiring')
+
+    timings['total'] = round((time.perf_counter() - started) * 1000, 1)
+    app.extensions['startup_timings'] = timings
+    logger.info("App created with %s in %sms %s", config_class.__name__, timings['total'], timings)
+    return app
+
+
+def reconnect_after_fork(app: Flask) -> None:
+    """Called in each worker when the app was loaded before forking (gunicorn --preload).
+
+    Pooled DB connections opened in the parent must not be shared with it; the
+    children open their own. Redis pools reset themselves on a pid change and
+    background threads/pools start lazily per worker.
+    """
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
 if __name__ == '__main__':
+    app = create_app()
+
     # Create tables
     with app.app_context():
         db.create_all()
         logger.info("Database tables created")
-    
+
     # Run application
     port = int(os.environ.get('PORT', 5000))
     debug = os.environ.get('FLASK_ENV') == 'development'
-    
-    logger.info(f"Starting Smart Quiz API server on port {port}")
-    app.run(host='0.0.0.0', port=port, debug=debug, threaded=True)
\ No newline at end of file
+
+    logger.info("Starting Smart Quiz API server on port %s", port)
+    app.run(host='0.0.0.0', port=port, debug=debug, threaded=True)
@@ -0,0 +1,318 @@
+"""
+Smart Quiz App - Question Bank Import/Export
+Streaming JSONL/CSV transfer of the questions table with bounded memory
+"""
+
+import csv
+import gzip
+import io
+import json
+import logging
+import multiprocessing
+import os
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from catalog import subject_catalog, DIFFICULTIES
+from models import db, dialect_insert, question_content_hash, Question
+from packs import file_slug
+
+logger = logging.getLogger(__name__)
+
+IMPORT_CHUNK = 5000
+EXPORT_CHUNK = 10_000
+PROGRESS_EVERY = 100_000
+
+# Column order of the CSV format; list-valued fields are JSON-encoded cells
+CSV_FIELDS = ['id', 'subject', 'difficulty', 'question_type', 'question_text', 'options',
+              'correct_answer_index', 'explanation', 'hints', 'tags', 'points', 'time_limit']
+CSV_JSON_FIELDS = {'options', 'hints', 'tags'}
+
+
+def detect_format(path: str) -> str:
+    name = path[:-3] if path.endswith('.gz') else path
+    return 'csv' if name.endswith('.csv') else 'jsonl'
+
+
+def _open(path: str, mode: str):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+
+def _atomic_write_json(path: str, value: Dict[str, Any]) -> None:
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as fh:
+        json.dump(value, fh)
+    os.replace(tmp, path)
+
+
+# Import
+def _question_row(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Validated `questions` row from an import record (ValueError if unusable)"""
+    if not isinstance(record, dict):
+        raise ValueError('not a JSON object')
+    for field in CSV_JSON_FIELDS:
+        if isinstance(record.get(field), str):
+            record[field] = json.loads(record[field]) if record[field] else []
+
+    subject, text = record.get('subject'), record.get('question_text')
+    options = record.get('options')
+    if not subject or not text:
+        raise ValueError('subject and question_text are required')
+    difficulty = record.get('difficulty') or 'medium'
+    if not subject_catalog.has_subject(subject):
+        raise ValueError(f'unknown subject {subject!r}')
+    if difficulty not in DIFFICULTIES:
+        raise ValueError(f'difficulty must be one of {list(DIFFICULTIES)}')
+    question_id = str(record['id']) if record.get('id') else str(uuid.uuid4())
+    if len(question_id) > 36:
+        raise ValueError('id longer than 36 characters')
+    if not isinstance(options, list) or len(options) < 2:
+        raise ValueError('options must be a list of at least two choices')
+    correct = int(record['correct_answer_index'])
+    if not 0 <= correct < len(options):
+        raise ValueError('correct_answer_index out of range')
+
+    # Every row carries an id: one executemany needs the same keys in each row
+    return {
+        'id': question_id,
+        'subject': subject,
+        'difficulty': difficulty,
+        'question_type': record.get('question_type') or 'multiple_choice',
+        'question_text': text,
+        'options': options,
+        'correct_answer_index': correct,
+        'explanation': record.get('explanation') or '',
+        'hints': record.get('hints') or [],
+        'tags': record.get('tags') or [],
+        'points': int(record.get('points') or 1),
+        'time_limit': (int(record['time_limit'])
+                       if record.get('time_limit') not in (None, '') else None),
+        'created_by': 'human',
+        'source': 'import',
+        'content_hash': question_content_hash(subject, text, options)
+    }
+
+
+def _read_records(path: str, fmt: str,
+                  checkpoint: Dict[str, Any]) -> Iterator[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """Yield (record, position) pairs, starting after the checkpointed position.
+
+    JSONL resumes by seeking to the stored byte offset. CSV rows may span
+    lines, so CSV resumes by skipping the stored number of rows.
+    """
+    rows = checkpoint.get('rows', 0)
+    if fmt == 'jsonl':
+        with _open(path, 'rb') as fh:
+            fh.seek(checkpoint.get('offset', 0))
+            offset = fh.tell()
+            for line in fh:
+                offset += len(line)
+                rows += 1
+                if line.strip():
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        record = None  # counted as invalid by the caller
+                    yield record, {'offset': offset, 'rows': rows}
+        return
+
+    with _open(path, 'rb') as raw:
+        reader = csv.DictReader(io.TextIOWrapper(raw, encoding='utf-8', newline=''))
+        for row_number, record in enumerate(reader, 1):
+            if row_number > rows:
+                yield record, {'rows': row_number}
+
+
+def _insert_chunk(rows: List[Dict[str, Any]]) -> int:
+    """Insert rows whose content hash is not in the bank yet; returns rows inserted"""
+    existing = set(db.session.execute(
+        db.select(Question.content_hash)
+        .where(Question.content_hash.in_({r['content_hash'] for r in rows}))
+    ).scalars())
+    fresh, seen = [], set()
+    for row in rows:
+        if row['content_hash'] in existing or row['content_hash'] in seen:
+            continue
+        seen.add(row['content_hash'])
+        fresh.append(row)
+    if fresh:
+        db.session.execute(dialect_insert(Question).on_conflict_do_nothing(), fresh)
+    return len(fresh)
+
+
+def backfill_content_hashes(chunk: int = IMPORT_CHUNK) -> int:
+    """Hash rows that predate the content_hash column so imports can dedup against them"""
+    table = Question.__table__
+    stmt = table.update().where(table.c.id == db.bindparam('k_id')).values(
+        content_hash=db.bindparam('k_hash'))
+    updated = 0
+    while True:
+        batch = db.session.execute(
+            db.select(Question.id, Question.subject, Question.question_text, Question.options)
+            .where(Question.content_hash.is_(None))
+            .limit(chunk)
+        ).all()
+        if not batch:
+            return updated
+        db.session.execute(stmt, [
+            {'k_id': qid, 'k_hash': question_content_hash(subject, text, options or [])}
+            for qid, subject, text, options in batch
+        ])
+        db.session.commit()
+        updated += len(batch)
+
+
+def import_questions(path: str, fmt: Optional[str] = None, chunk: int = IMPORT_CHUNK,
+                     resume: bool = True,
+                     progress: Callable[[str], None] = logger.info) -> Dict[str, Any]:
+    """Stream a JSONL/CSV file into the bank in chunked, deduplicated bulk inserts.
+
+    After each committed chunk the read position is written to
+    `<path>.checkpoint`; an interrupted import rerun with the same file picks
+    up from there. Re-importing from scratch is still safe thanks to dedup.
+    """
+    fmt = fmt or detect_format(path)
+    subject_catalog.snapshot()  # subjects already in the bank are accepted, not just configured
+    checkpoint_path = f'{path}.checkpoint'
+    stat = os.stat(path)
+    source = {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    checkpoint = {}
+    if resume and os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as fh:
+            saved = json.load(fh)
+        if saved.get('source') == source:
+            checkpoint = saved
+            progress(f"Resuming {path} after row {checkpoint['rows']}")
+
+    report = {'read': checkpoint.get('rows', 0), 'inserted': 0, 'duplicates': 0, 'invalid': 0}
+    started = time.perf_counter()
+    next_progress = report['read'] + PROGRESS_EVERY
+    buffer: List[Dict[str, Any]] = []
+    position = None
+
+    def flush():
+        inserted = _insert_chunk(buffer)
+        db.session.commit()
+        report['inserted'] += inserted
+        report['duplicates'] += len(buffer) - inserted
+        _atomic_write_json(checkpoint_path, dict(position, source=source))
+        buffer.clear()
+
+    for record, position in _read_records(path, fmt, checkpoint):
+        report['read'] = position['rows']
+        try:
+            buffer.append(_question_row(record))
+        except (KeyError, TypeError, ValueError) as e:
+            report['invalid'] += 1
+            if report['invalid'] <= 10:
+                logger.warning("Skipping row %s: %s", position['rows'], e)
+        if len(buffer) >= chunk:
+            flush()
+        if report['read'] >= next_progress:
+            elapsed = time.perf_counter() - started
+            progress(f"{report['read']} rows, {report['inserted']} inserted, "
+                     f"{report['duplicates']} duplicates ({report['read'] / elapsed:,.0f} rows/s)")
+            next_progress += PROGRESS_EVERY
+    if buffer:
+        flush()
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    report['seconds'] = round(time.perf_counter() - started, 2)
+    return report
+
+
+# Export
+_export_app = None
+_export_progress: Callable[[str], None] = logger.info
+
+
+def _init_export_worker() -> None:
+    # Connections inherited from the parent must not be shared with it
+    with _export_app.app_context():
+        db.engine.dispose(close=False)
+
+
+def _export_subject(task: Tuple[str, str, str, Optional[str]]) -> Tuple[str, int, float]:
+    subject, path, fmt, difficulty = task
+    started = time.perf_counter()
+    written = 0
+    with _export_app.app_context(), _open(path, 'wt') as out:
+        writer = None
+        if fmt == 'csv':
+            writer = csv.DictWriter(out, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+
+        query = db.select(Question).where(Question.subject == subject, Question.is_active.is_(True))
+        if difficulty:
+            query = query.where(Question.difficulty == difficulty)
+        # Server-side cursor: rows arrive in EXPORT_CHUNK batches instead of all at once
+        result = db.session.execute(
+            query.order_by(Question.id)
+            .execution_options(stream_results=True, yield_per=EXPORT_CHUNK)
+        ).scalars()
+        for batch in result.partitions(EXPORT_CHUNK):
+            for question in batch:
+                payload = question.to_payload()
+                if writer:
+                    writer.writerow({
+                        k: json.dumps(v, ensure_ascii=False) if k in CSV_JSON_FIELDS else v
+                        for k, v in payload.items() if k in CSV_FIELDS
+                    })
+                else:
+                    out.write(json.dumps(payload, ensure_ascii=False))
+                    out.write('\n')
+            written += len(batch)
+            if written % PROGRESS_EVERY < EXPORT_CHUNK:
+                rate = written / (time.perf_counter() - started)
+                _export_progress(f'[{subject}] {written} rows ({rate:,.0f} rows/s)')
+        db.session.remove()
+    return subject, written, time.perf_counter() - started
+
+
+def export_questions(app, output_dir: str, fmt: str = 'jsonl', subjects: Optional[List[str]] = None,
+                     difficulty: Optional[str] = None, processes: Optional[int] = None,
+                     compress: bool = False,
+                     progress: Callable[[str], None] = logger.info) -> Dict[str, Any]:
+    """Export active questions to one file per subject, one worker process per subject"""
+    global _export_app, _export_progress
+    # Forked workers inherit both
+    _export_app, _export_progress = app, progress
+    started = time.perf_counter()
+
+    with app.app_context():
+        if not subjects:
+            subjects = list(db.session.execute(
+                db.select(Question.subject).where(Question.is_active.is_(True)).distinct()
+            ).scalars())
+        db.session.remove()
+    os.makedirs(output_dir, exist_ok=True)
+
+    suffix = f".{fmt}{'.gz' if compress else ''}"
+    tasks = [(subject, os.path.join(output_dir, file_slug(subject) + suffix), fmt, difficulty)
+             for subject in subjects]
+    processes = max(1, min(processes or os.cpu_count() or 1, len(tasks) or 1))
+
+    files = {}
+    if processes == 1:
+        results = map(_export_subject, tasks)
+    else:
+        pool = multiprocessing.get_context('fork').Pool(processes, initializer=_init_export_worker)
+        results = pool.imap_unordered(_export_subject, tasks)
+    try:
+        for subject, written, seconds in results:
+            files[subject] = written
+            logger.info("Exported %s %s questions in %.2fs", written, subject, seconds)
+    finally:
+        if processes > 1:
+            pool.close()
+            pool.join()
+
+    seconds = time.perf_counter() - started
+    total = sum(files.values())
+    return {'files': files, 'rows': total, 'seconds': round(seconds, 2),
+            'rows_per_second': round(total / seconds) if seconds else 0}
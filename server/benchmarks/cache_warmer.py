@@ -0,0 +1,115 @@
+"""
+Cache warmer benchmark: AI calls in the first minutes after a deploy.
+
+Records a synthetic request stream (the mix from benchmarks.question_pools)
+into the warmer's sketch, "deploys" by emptying the question pools, then
+replays the traffic that follows twice: once cold, once after
+cache_warmer.warm() filled the pools from a synthetic question bank. For
+each run it reports the requests that needed an AI call, and how long
+after the deploy the miss ratio over a sliding window stays under the
+threshold, at the given request rate.
+
+Run from the server directory:
+    python -m benchmarks.cache_warmer [--rate 20] [--questions 200000]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+
+def replay(stream, pools) -> list:
+    """Pool misses per request, as generate_questions serves them"""
+    seen, misses, fresh = {}, [], 0
+    for user, subject, difficulty, count, topics in stream:
+        user_seen = seen.setdefault(user, set())
+        sampled = pools.sample(subject, difficulty, topics, count * 3)
+        served = [qid for qid in sampled if qid not in user_seen][:count]
+        new = [f'new{fresh + i}' for i in range(count - len(served))]
+        fresh += len(new)
+        pools.add(subject, difficulty, topics, new)
+        user_seen.update(served + new)
+        misses.append(bool(new))
+    return misses
+
+
+def settled_after(misses: list, window: int, threshold: float) -> int:
+    """Requests until every later window of `window` requests misses under `threshold`"""
+    totals = [0]
+    for miss in misses:
+        totals.append(totals[-1] + miss)
+    for begin in range(len(misses) - window, -1, -1):
+        if (totals[begin + window] - totals[begin]) / window >= threshold:
+            return begin + window
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--recorded', type=int, default=20_000,
+                        help='requests seen before the deploy')
+    parser.add_argument('--after', type=int, default=6_000,
+                        help='requests replayed after the deploy')
+    parser.add_argument('--users', type=int, default=2_000)
+    parser.add_argument('--rate', type=float, default=20.0, help='generate requests per second')
+    parser.add_argument('--questions', type=int, default=200_000,
+                        help='questions in the synthetic bank')
+    parser.add_argument('--budget', type=float, default=10.0)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--window', type=int, default=200)
+    parser.add_argument('--threshold', type=float, default=0.1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ.update(
+            DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'warm.db')}",
+            REDIS_HOST='127.0.0.1', REDIS_PORT='1',  # in-process pools
+            QUESTION_BANK_PATH=os.path.join(workdir, 'questions.bank'),
+            CACHE_WARM_SNAPSHOT=os.path.join(workdir, 'warm_keys.json'),
+            ANALYTICS_QUEUE_DIR=os.path.join(workdir, 'queue'), DB_MIGRATIONS_CLI='false',
+            JWT_SECRET_KEY='cache-warmer-benchmark-secret-key', LOG_LEVEL='WARNING')
+        from app import create_app
+        from benchmarks.question_bank import synthetic_rows
+        from benchmarks.question_pools import request_stream
+        from cache_warmer import cache_warmer
+        from question_bank import question_bank, write_bank
+        from models import db
+        from question_pools import question_pools
+
+        random.seed(7)
+        write_bank(os.environ['QUESTION_BANK_PATH'], synthetic_rows(args.questions))
+        question_bank.load(os.environ['QUESTION_BANK_PATH'])
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+
+        stream = list(request_stream(args.recorded + args.after, args.users, seed=11))
+        for _, subject, difficulty, count, topics in stream[:args.recorded]:
+            cache_warmer.record(subject, difficulty, topics, count)
+        cache_warmer.flush()
+        after = stream[args.recorded:]
+
+        print(f"{args.recorded:,} requests recorded, {args.after:,} replayed after the deploy "
+              f"at {args.rate:g} req/s, bank of {args.questions:,} questions")
+        print(f"{'run':8} {'warm s':>7} {'keys':>5} {'AI calls':>9} {'first 1k':>9} "
+              f"{'cold period':>12}")
+        for name in ('cold', 'warmed'):
+            question_pools._local.clear()  # a deploy starts with empty in-process pools
+            warm_s, keys = 0.0, '-'
+            if name == 'warmed':
+                started = time.perf_counter()
+                with app.app_context():
+                    report = cache_warmer.warm(budget=args.budget, concurrency=args.concurrency)
+                warm_s, keys = time.perf_counter() - started, report['warmed']
+            misses = replay(after, question_pools)
+            settled = settled_after(misses, args.window, args.threshold)
+            cold_s = warm_s + settled / args.rate
+            print(f'{name:8} {warm_s:7.2f} {keys:>5} {sum(misses):9,} {sum(misses[:1000]):9,} '
+                  f'{cold_s:11.1f}s')
+
+
+if __name__ == '__main__':
+    main()
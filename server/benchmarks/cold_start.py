@@ -0,0 +1,85 @@
+"""
+Cold start report: where worker boot time goes.
+
+Imports the app in a fresh interpreter under `python -X importtime` and
+prints the slowest top-level imports plus create_app's own phases. The
+`eager` row imports the AI SDKs up front, the way app.py used to, to show
+what deferring them saves.
+
+Run from the server directory:
+    python -m benchmarks.cold_start [--top 15] [--repeat 3]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BOOT = (
+    "import json, time\n"
+    "started = time.perf_counter()\n"
+    "{preload}"
+    "import app\n"
+    "application = app.create_app()\n"
+    "print(json.dumps({{'boot_ms': (time.perf_counter() - started) * 1000,\n"
+    "                  'create_app': application.extensions['startup_timings']}}))\n"
+)
+EAGER = "import openai, google.generativeai\n"
+
+
+def _env(workdir: str) -> dict:
+    return dict(os.environ,
+                DATABASE_URL=os.environ.get('DATABASE_URL',
+                                            f"sqlite:///{os.path.join(workdir, 'boot.db')}"),
+                ANALYTICS_QUEUE_DIR=os.path.join(workdir, 'queue'),
+                DB_MIGRATIONS_CLI=os.environ.get('DB_MIGRATIONS_CLI', 'false'))
+
+
+def boot(env: dict, eager: bool = False, importtime: bool = False):
+    args = [sys.executable] + (['-X', 'importtime'] if importtime else [])
+    code = BOOT.format(preload=EAGER if eager else '')
+    out = subprocess.run(args + ['-c', code], env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1]), out.stderr
+
+
+def top_imports(stderr: str, top: int):
+    """Cumulative microseconds of modules imported directly by app.py"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if name.startswith('   ') and not name.startswith('    '):
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = _env(workdir)
+        boot(env)  # warm the bytecode cache
+
+        print(f"{'mode':8} {'boot ms':>9} (median of {args.repeat})")
+        for label, eager in (('lazy', False), ('eager', True)):
+            runs = [boot(env, eager)[0]['boot_ms'] for _ in range(args.repeat)]
+            print(f'{label:8} {statistics.median(runs):9.0f}')
+
+        report, stderr = boot(env, importtime=True)
+        phases = ', '.join(f'{k} {v}' for k, v in report['create_app'].items())
+        print('\ncreate_app phases (ms):', phases)
+        print('\nSlowest imports of app.py (cumulative ms, -X importtime):')
+        for micros, name in top_imports(stderr, args.top):
+            print(f'{micros / 1000:9.1f}  {name}')
+
+
+if __name__ == '__main__':
+    main()
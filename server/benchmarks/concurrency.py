@@ -0,0 +1,185 @@
+"""
+Concurrency benchmark: sync vs gevent gunicorn workers on AI-bound requests.
+
+A stub OpenAI endpoint answers every chat completion after a fixed delay,
+so each /questions/generate request spends most of its time waiting on the
+network. The same load runs against one worker of each class.
+
+Run from the server directory (needs gunicorn and gevent):
+    python -m benchmarks.concurrency [--requests 400] [--concurrency 200] [--latency 1.0]
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+JWT_SECRET = 'benchmark-secret'
+
+
+def _completion(count: int) -> bytes:
+    questions = [
+        {
+            'question_text': f'Benchmark question {i}?',
+            'options': ['A', 'B', 'C', 'D'],
+            'correct_answer_index': i % 4,
+            'explanation': 'Stub answer',
+            'hints': [],
+            'tags': ['benchmark'],
+            'difficulty_score': 0.5
+        }
+        for i in range(count)
+    ]
+    return json.dumps({
+        'id': 'chatcmpl-bench', 'object': 'chat.completion', 'created': int(time.time()),
+        'model': 'gpt-3.5-turbo',
+        'choices': [{'index': 0, 'finish_reason': 'stop',
+                     'message': {'role': 'assistant', 'content': json.dumps(questions)}}],
+        'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2}
+    }).encode()
+
+
+class StubProvider(BaseHTTPRequestHandler):
+    latency = 1.0
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body: bytes):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        models = [{'id': 'gpt-3.5-turbo', 'object': 'model'}]
+        self._send(json.dumps({'object': 'list', 'data': models}).encode())
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        time.sleep(self.latency)
+        self._send(_completion(5))
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # the default backlog of 5 resets connections under load
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _token(env: dict) -> str:
+    code = (
+        "from app import create_app, db\n"
+        "app = create_app()\n"
+        "from flask_jwt_extended import create_access_token\n"
+        "with app.app_context():\n"
+        "    db.create_all()\n"
+        "    print(create_access_token(identity='benchmark-user'))\n"
+    )
+    out = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True,
+                         check=True)
+    return out.stdout.strip().splitlines()[-1]
+
+
+def _wait_for(url: str, timeout: float = 30.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError(f'{url} did not come up')
+
+
+def _post(url: str, token: str, index: int) -> float:
+    body = json.dumps({'subject': 'math', 'difficulty': 'easy', 'count': 5,
+                       'topics': [f't{index}']}).encode()
+    req = urllib.request.Request(url, data=body, method='POST', headers={
+        'Content-Type': 'application/json', 'Authorization': f'Bearer {token}'
+    })
+    started = time.perf_counter()
+    with urllib.request.urlopen(req, timeout=600) as resp:
+        resp.read()
+        if resp.status != 200:
+            raise RuntimeError(f'HTTP {resp.status}')
+    return time.perf_counter() - started
+
+
+def run(worker_class: str, requests: int, concurrency: int, stub_url: str, workdir: str) -> dict:
+    port = _free_port()
+    env = dict(os.environ,
+               GUNICORN_WORKER_CLASS=worker_class, GUNICORN_WORKERS='1', PORT=str(port),
+               GUNICORN_WORKER_CONNECTIONS=str(max(concurrency, 100)),
+               DATABASE_URL=f"sqlite:///{os.path.join(workdir, worker_class + '.db')}",
+               REDIS_HOST='127.0.0.1', REDIS_PORT=str(_free_port()),  # no Redis: no cache hits
+               OPENAI_API_KEY='benchmark', OPENAI_API_BASE=stub_url, OPENAI_MODEL='gpt-3.5-turbo',
+               JWT_SECRET_KEY=JWT_SECRET, ANALYTICS_QUEUE_DIR=os.path.join(workdir, 'queue'),
+               HEALTH_INTERVAL='60')
+    token = _token(env)
+    command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app']
+    server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL)
+    try:
+        _wait_for(f'http://127.0.0.1:{port}/livez')
+        url = f'http://127.0.0.1:{port}/api/v1/questions/generate'
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            latencies = sorted(pool.map(lambda i: _post(url, token, i), range(requests)))
+        elapsed = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait()
+    return {
+        'worker': worker_class,
+        'seconds': elapsed,
+        'throughput': requests / elapsed,
+        'p50': statistics.median(latencies),
+        'p95': latencies[int(len(latencies) * 0.95) - 1]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=1.0,
+                        help='stub provider delay per call (s)')
+    parser.add_argument('--workers', nargs='+', default=['sync', 'gevent'])
+    args = parser.parse_args()
+
+    StubProvider.latency = args.latency
+    stub = StubServer(('127.0.0.1', 0), StubProvider)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    stub_url = f'http://127.0.0.1:{stub.server_address[1]}/v1'
+
+    print(f'{args.requests} generate requests, {args.concurrency} concurrent, '
+          f'provider latency {args.latency:.2f}s, 1 worker')
+    print(f"{'worker':8} {'total s':>9} {'req/s':>8} {'p50 s':>8} {'p95 s':>8}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for worker_class in args.workers:
+            r = run(worker_class, args.requests, args.concurrency, stub_url, workdir)
+            print(f"{r['worker']:8} {r['seconds']:9.2f} {r['throughput']:8.1f} "
+                  f"{r['p50']:8.2f} {r['p95']:8.2f}")
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+Query budget check: how many statements each API route issues.
+
+Seeds a throwaway SQLite database, drives the main routes through the test
+client inside assert_query_budget and fails (exit status 1) when a route
+runs more queries than its budget or repeats one statement shape more than
+allowed, which is how an N+1 shows up. Budgets are per request and do not
+grow with the amount of data in the request (20 synced quizzes, 10 quiz
+questions), so a loop that queries per item fails here.
+
+Run from the server directory:
+    python -m benchmarks.query_budget [--verbose]
+"""
+
+import argparse
+import os
+import socket
+import sys
+import tempfile
+import time
+import uuid
+
+QUESTIONS = 60
+SYNC_QUIZZES = 20
+QUIZ_QUESTIONS = 10
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _seed_questions(app) -> list:
+    from models import db, Question
+    questions = [
+        Question(subject='math', difficulty=('easy', 'medium', 'hard')[i % 3],
+                 question_text=f'Budget question {i}?', options=['A', 'B', 'C', 'D'],
+                 correct_answer_index=i % 4, explanation='Because', tags=[f'topic{i % 5}'])
+        for i in range(QUESTIONS)
+    ]
+    with app.app_context():
+        db.create_all()
+        db.session.add_all(questions)
+        db.session.commit()
+        return [q.id for q in questions]
+
+
+def _sync_body(question_ids: list) -> dict:
+    now = int(time.time() * 1000)
+    return {
+        'quizzes': [
+            {
+                'id': str(uuid.uuid4()), 'subject': 'math', 'difficulty': 'easy',
+                'total_questions': 5, 'correct_answers': 3, 'time_spent': 120,
+                'completed_at': now - i * 60_000,
+                'answers': [{'question_id': qid, 'selected_answer_index': 0,
+                             'is_correct': j % 2 == 0, 'time_spent': 20}
+                            for j, qid in enumerate(question_ids[i:i + 5])]
+            }
+            for i in range(SYNC_QUIZZES)
+        ]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--verbose', action='store_true',
+                        help='print the statements of every route')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.environ.update(
+            DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'budget.db')}",
+            # No Redis: every lookup reaches the DB
+            REDIS_HOST='127.0.0.1', REDIS_PORT=str(_free_port()),
+            ANALYTICS_QUEUE_DIR=os.path.join(workdir, 'queue'), DB_MIGRATIONS_CLI='false',
+            PASSWORD_HASH_METHOD='pbkdf2:sha256:1000', PASSWORD_HASH_WORKERS='0',
+            QUIZ_SESSIONS_IN_PROCESS='true',  # one process, so sessions can stay in memory
+            JWT_SECRET_KEY='query-budget-benchmark-secret-key', LOG_LEVEL='WARNING')
+        from app import create_app
+        from query_stats import QueryBudgetExceeded, assert_query_budget
+
+        app = create_app()
+        question_ids = _seed_questions(app)
+        client = app.test_client()
+        auth = {}
+        state = {}
+
+        def register():
+            r = client.post('/api/v1/users/register', json={
+                'username': 'budget', 'email': 'budget@example.com',
+                'password': 'budget-password-1', 'display_name': 'Budget'})
+            auth['Authorization'] = f"Bearer {r.get_json()['access_token']}"
+            return r
+
+        def start_quiz():
+            r = client.post('/api/v1/quizzes/start', headers=auth, json={
+                'subject': 'math', 'difficulty': 'easy',
+                'question_ids': question_ids[:QUIZ_QUESTIONS]})
+            state['quiz_id'] = r.get_json()['quiz_id']
+            return r
+
+        def answer_all():
+            for qid in question_ids[:QUIZ_QUESTIONS]:
+                r = client.post(f"/api/v1/quizzes/{state['quiz_id']}/answer", headers=auth,
+                                json={'question_id': qid, 'selected_answer_index': 1,
+                                      'time_spent': 5})
+            return r
+
+        # (route, call, max queries, max repeats of one statement)
+        cases = [
+            ('register', register, 3, 1),
+            ('login', lambda: client.post('/api/v1/users/login', json={
+                'username': 'budget', 'password': 'budget-password-1'}), 3, 1),
+            # The first catalog read scans the bank once per worker; later reads are memory only
+            ('subjects', lambda: client.get('/api/v1/subjects'), 1, 1),
+            ('topics', lambda: client.get('/api/v1/subjects/math/topics'), 0, 0),
+            ('question',
+             lambda: client.get(f'/api/v1/questions/{question_ids[0]}', headers=auth), 1, 1),
+            ('sync x%d' % SYNC_QUIZZES,
+             lambda: client.post('/api/v1/quizzes/sync', headers=auth,
+                                 json=_sync_body(question_ids)), 12, 1),
+            ('user-stats', lambda: client.get('/api/v1/analytics/user-stats', headers=auth), 2, 1),
+            ('reviews/due', lambda: client.get('/api/v1/reviews/due', headers=auth), 2, 1),
+            ('quiz start', start_quiz, 3, 1),
+            ('quiz answer x%d' % QUIZ_QUESTIONS, answer_all, 0, 0),
+            ('quiz finish',
+             lambda: client.post(f"/api/v1/quizzes/{state['quiz_id']}/finish", headers=auth),
+             10, 1),
+        ]
+
+        failed = 0
+        print(f"{'route':18} {'status':>6} {'queries':>8} {'budget':>7} {'db ms':>8}")
+        for name, call, max_queries, max_repeats in cases:
+            try:
+                with assert_query_budget(max_queries, max_repeats=max_repeats) as log:
+                    response = call()
+                verdict = 'ok'
+            except QueryBudgetExceeded as e:
+                verdict, failed = 'OVER', failed + 1
+                print(e, file=sys.stderr)
+            if response.status_code >= 400:
+                verdict, failed = f'HTTP {response.status_code}', failed + 1
+            print(f'{name:18} {verdict:>6} {log.count:8d} {max_queries:7d} {log.total_ms:8.1f}')
+            if args.verbose:
+                print(log.report())
+
+        sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""
+Question bank benchmark: memory per million questions and lookup latency.
+
+Builds a synthetic bank file with question_bank.write_bank, maps it and
+reports the file size per question, the memory of forked workers that all
+read every question (pages shared through the page cache), the heap a
+naive dict-of-payloads copy would need per worker, and lookup latency for
+get(), get_many() and sample().
+
+Run from the server directory:
+    python -m benchmarks.question_bank [--questions 1000000] [--workers 4]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+SUBJECTS = ['math', 'physics', 'chemistry', 'biology', 'history', 'geography', 'literature',
+            'english']
+DIFFICULTIES = ['easy', 'medium', 'hard']
+TOPICS = [f'topic{i}' for i in range(40)]
+VOCABULARY = ['phương', 'trình', 'nghiệm', 'hàm', 'số', 'đạo', 'the', 'value', 'of',
+              'which', 'energy', 'velocity', 'cell', 'reaction', 'năm', 'chiến', 'tranh']
+
+
+def _text(words: int) -> str:
+    return ' '.join(random.choice(VOCABULARY) for _ in range(words))
+
+
+def synthetic_rows(count: int):
+    for i in range(count):
+        qid = str(uuid.uuid4())
+        subject, difficulty = SUBJECTS[i % len(SUBJECTS)], DIFFICULTIES[i % len(DIFFICULTIES)]
+        tags = random.sample(TOPICS, 2)
+        correct = random.randrange(4)
+        yield {
+            'id': qid, 'subject': subject, 'difficulty': difficulty, 'tags': tags,
+            'correct_answer_index': correct, 'points': 1, 'irt_difficulty': random.uniform(-3, 3),
+            'payload': {
+                'id': qid, 'subject': subject, 'difficulty': difficulty,
+                'question_type': 'multiple_choice',
+                'question_text': _text(25), 'options': [_text(5) for _ in range(4)],
+                'correct_answer_index': correct, 'explanation': _text(40), 'hints': [_text(8)],
+                'tags': tags, 'points': 1, 'time_limit': 60
+            }
+        }
+
+
+def _smaps() -> dict:
+    """Rss/Pss/Private kB of this process (Linux)"""
+    values = {}
+    with open('/proc/self/smaps_rollup') as fh:
+        for line in fh:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                values[parts[0].rstrip(':')] = int(parts[1])
+    return values
+
+
+def worker_memory(bank, ids, workers: int) -> list:
+    """Fork workers that each read every payload, then measure them all at once.
+
+    Measured together, the bank's pages show up as shared (Pss splits them
+    between the workers); Private_Dirty is what each worker really owns.
+    """
+    ready_r, ready_w = os.pipe()
+    go_r, go_w = os.pipe()
+    reports = []
+    for _ in range(workers):
+        report_r, report_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(go_w)
+            before = _smaps()
+            for qid in ids:
+                bank.get(qid)
+            os.write(ready_w, b'.')
+            os.read(go_r, 1)  # EOF once every worker is done reading
+            after = _smaps()
+            dirty = (after['Private_Dirty'] - before['Private_Dirty']) / 1024
+            line = f"{dirty:.1f} {after['Rss'] / 1024:.1f} {after['Pss'] / 1024:.1f}"
+            os.write(report_w, line.encode())
+            os._exit(0)
+        os.close(report_w)
+        reports.append((pid, report_r))
+    for _ in range(workers):
+        os.read(ready_r, 1)
+    os.close(go_w)
+    results = []
+    for pid, report_r in reports:
+        with os.fdopen(report_r) as fh:
+            results.append(tuple(float(v) for v in fh.read().split()))
+        os.waitpid(pid, 0)
+    return results
+
+
+def naive_mb_per_million(sample: int) -> float:
+    """Heap of a dict-of-payload-dicts copy, as each worker would hold it"""
+    tracemalloc.start()
+    snapshot = {row['id']: row['payload'] for row in synthetic_rows(sample)}
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del snapshot
+    return size / sample
+
+
+def latency_us(fn, args, repeat: int) -> tuple:
+    samples = []
+    for i in range(repeat):
+        started = time.perf_counter_ns()
+        fn(*args[i % len(args)])
+        samples.append((time.perf_counter_ns() - started) / 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--questions', type=int, default=1_000_000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--lookups', type=int, default=50_000)
+    parser.add_argument('--naive-sample', type=int, default=50_000,
+                        help='questions measured for the dict copy')
+    args = parser.parse_args()
+
+    from question_bank import QuestionBank, write_bank
+
+    random.seed(7)
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'questions.bank')
+        ids = []
+
+        def rows():
+            for row in synthetic_rows(args.questions):
+                ids.append(row['id'])
+                yield row
+
+        started = time.perf_counter()
+        report = write_bank(path, rows())
+        build_s = time.perf_counter() - started
+
+        bank = QuestionBank()
+        bank.load(path)
+        per_million = 1e6 / args.questions
+        print(f"{args.questions:,} questions, {report['groups']} groups, built in {build_s:.1f}s")
+        print(f"bank file            {report['bytes'] / 1e6:9.1f} MB  "
+              f"({report['bytes'] / 1e6 * per_million:.1f} MB "
+              f"per million, shared by all workers)")
+
+        if os.path.exists('/proc/self/smaps_rollup'):
+            for i, (dirty, rss, pss) in enumerate(worker_memory(bank, ids, args.workers)):
+                print(f"worker {i} after reading all: private dirty {dirty:6.1f} MB, "
+                      f"rss {rss:7.1f} MB, pss {pss:7.1f} MB")
+
+        naive = naive_mb_per_million(min(args.naive_sample, args.questions))
+        print(f"dict copy            {naive:9.1f} MB per million per worker "
+              f"({naive * args.workers:.0f} MB for {args.workers} workers)")
+
+        lookups = [(random.choice(ids),) for _ in range(min(args.lookups, len(ids)))]
+        batches = [([random.choice(ids) for _ in range(10)],) for _ in range(1000)]
+        groups = [(random.choice(SUBJECTS), random.choice(DIFFICULTIES), 10) for _ in range(1000)]
+        topical = [(s, d, n, random.sample(TOPICS, 3)) for s, d, n in groups]
+        print(f"\n{'lookup':26} {'p50 us':>8} {'p99 us':>8}")
+        for name, fn, calls in (('get(id)', bank.get, lookups),
+                                ('get_many(10 ids)', bank.get_many, batches),
+                                ('sample(10)', bank.sample, groups),
+                                ('sample(10, 3 topics)', bank.sample, topical)):
+            p50, p99 = latency_us(fn, calls, args.lookups)
+            print(f'{name:26} {p50:8.1f} {p99:8.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Question pool benchmark: cache hit ratio and LLM questions over a request mix.
+
+Replays a synthetic stream of generate requests (Zipf-distributed topic
+lists drawn from overlapping topics, counts 5/10/15/20) against two
+strategies and reports the share of requests served without an LLM call
+and the number of questions the LLM had to write:
+
+  exact   the previous cache, one batch per (subject, difficulty, count,
+          topic list); any other count or topic list is a miss
+  pools   question_pools: per-topic pools sampled for any count, unseen
+          questions only, shortfall topped up
+
+Run from the server directory:
+    python -m benchmarks.question_pools [--requests 20000] [--users 500]
+"""
+
+import argparse
+import itertools
+import random
+
+SUBJECTS = ['math', 'physics', 'chemistry', 'biology']
+DIFFICULTIES = ['easy', 'medium', 'hard']
+TOPICS = [f'topic{i}' for i in range(30)]
+COUNTS = [5, 10, 15, 20]
+COUNT_WEIGHTS = [3, 5, 2, 1]
+
+
+def request_stream(requests: int, users: int, seed: int):
+    rng = random.Random(seed)
+    topic_lists = [[]] + [list(c) for n in (1, 2, 3) for c in itertools.combinations(TOPICS, n)]
+    weights = [1 / (rank + 1) for rank in range(len(topic_lists))]
+    rng.shuffle(topic_lists)
+    for _ in range(requests):
+        yield (f'user{rng.randrange(users)}', rng.choice(SUBJECTS), rng.choice(DIFFICULTIES),
+               rng.choices(COUNTS, COUNT_WEIGHTS)[0], rng.choices(topic_lists, weights)[0])
+
+
+def exact_cache(stream) -> tuple:
+    batches, hits, generated = set(), 0, 0
+    for _, subject, difficulty, count, topics in stream:
+        key = (subject, difficulty, count, tuple(sorted(topics)))
+        if key in batches:
+            hits += 1
+        else:
+            batches.add(key)
+            generated += count
+    return hits, generated
+
+
+def pooled_cache(stream, pool_size: int) -> tuple:
+    from question_pools import QuestionPools
+
+    class App:
+        config = {'QUESTION_POOL_TTL': 10 ** 9, 'QUESTION_POOL_MAX_SIZE': pool_size}
+
+    pools = QuestionPools()
+    pools.init_app(App())
+    seen, next_id = {}, itertools.count()
+    for user, subject, difficulty, count, topics in stream:
+        user_seen = seen.setdefault(user, set())
+        sampled = pools.sample(subject, difficulty, topics, count * 3)
+        served = [qid for qid in sampled if qid not in user_seen][:count]
+        fresh = [f'q{next(next_id)}' for _ in range(count - len(served))]
+        pools.add(subject, difficulty, topics, fresh)
+        pools.record(count, len(served))
+        user_seen.update(served + fresh)
+    return pools.stats['hits'], pools.stats['generated'], pools.stats['partial']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=20_000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--pool-size', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    stream = list(request_stream(args.requests, args.users, args.seed))
+    asked = sum(r[3] for r in stream)
+    exact_hits, exact_generated = exact_cache(stream)
+    pool_hits, pool_generated, partial = pooled_cache(stream, args.pool_size)
+
+    print(f"{args.requests:,} requests from {args.users} users, {asked:,} questions asked for")
+    print(f"{'strategy':10} {'hit ratio':>10} {'LLM questions':>14} {'topped up':>10}")
+    print(f"{'exact':10} {exact_hits / len(stream):10.1%} {exact_generated:14,} {'-':>10}")
+    print(f"{'pools':10} {pool_hits / len(stream):10.1%} {pool_generated:14,} {partial:10,}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Wire format benchmark: JSON (stdlib / orjson) vs MessagePack on realistic payloads.
+
+Run from the server directory:
+    python -m benchmarks.wire_format [--repeat 2000]
+"""
+
+import argparse
+import gzip
+import json
+import random
+import time
+import uuid
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def _text(words: int) -> str:
+    vocabulary = ['phương', 'trình', 'nghiệm', 'hàm', 'số', 'đạo', 'the', 'value', 'of',
+                  'which', 'energy', 'velocity', 'cell', 'reaction', 'năm', 'chiến', 'tranh']
+    return ' '.join(random.choice(vocabulary) for _ in range(words))
+
+
+def question_batch(count: int = 20) -> dict:
+    return {
+        'questions': [
+            {
+                'id': str(uuid.uuid4()),
+                'subject': 'math',
+                'difficulty': 'medium',
+                'question_type': 'multiple_choice',
+                'question_text': _text(25),
+                'options': [_text(5) for _ in range(4)],
+                'correct_answer_index': random.randrange(4),
+                'explanation': _text(40),
+                'hints': [_text(8), _text(8)],
+                'tags': ['algebra', 'equations'],
+                'points': 1,
+                'time_limit': 60
+            }
+            for _ in range(count)
+        ],
+        'cached': True,
+        'generated_at': '2026-01-01T00:00:00'
+    }
+
+
+def sync_result(quizzes: int = 100) -> dict:
+    now = int(time.time() * 1000)
+    return {
+        'synced_count': quizzes,
+        'duplicates': [],
+        'conflicts': [],
+        'server_quizzes': [
+            {
+                'id': str(uuid.uuid4()),
+                'subject': random.choice(['math', 'physics', 'history']),
+                'difficulty': 'easy',
+                'total_questions': 10,
+                'correct_answers': random.randrange(11),
+                'score': random.random() * 10,
+                'percentage': random.random() * 100,
+                'time_spent': random.randrange(600_000),
+                'completed_at': now - random.randrange(10 ** 9),
+                'synced_at': now
+            }
+            for _ in range(quizzes)
+        ],
+        'last_sync_timestamp': now
+    }
+
+
+def user_stats(days: int = 365) -> dict:
+    return {
+        'stats': {
+            'total_quizzes': 412,
+            'average_score': 71.3,
+            'favorite_subject': 'math',
+            'subject_stats': {
+                s: {'quizzes': random.randrange(100), 'average_score': random.random() * 100}
+                for s in ['math', 'physics', 'chemistry', 'biology', 'history']
+            },
+            'weekly_progress': [
+                {'date': f'2026-01-{d % 28 + 1:02d}', 'quizzes': random.randrange(5),
+                 'accuracy': random.random()}
+                for d in range(days)
+            ]
+        },
+        'timeframe': 'year'
+    }
+
+
+def _formats():
+    formats = [('json', lambda v: json.dumps(v, separators=(',', ':'), ensure_ascii=False).encode(),
+                json.loads)]
+    if orjson is not None:
+        formats.append(('orjson', orjson.dumps, orjson.loads))
+    if msgpack is not None:
+        formats.append(('msgpack', lambda v: msgpack.packb(v, use_bin_type=True),
+                        lambda b: msgpack.unpackb(b, raw=False)))
+    return formats
+
+
+def _time(fn, arg, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(arg)
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    payloads = [('questions x20', question_batch()), ('sync x100', sync_result()),
+                ('stats year', user_stats())]
+    print(f"{'payload':<15}{'format':<9}{'bytes':>9}{'gzip':>8}{'encode us':>11}{'decode us':>11}")
+    for name, payload in payloads:
+        for fmt, encode, decode in _formats():
+            body = encode(payload)
+            print(f"{name:<15}{fmt:<9}{len(body):>9}{len(gzip.compress(body)):>8}"
+                  f"{_time(encode, payload, args.repeat):>11.1f}"
+                  f"{_time(decode, body, args.repeat):>11.1f}")
+    if msgpack is None:
+        print("msgpack is not installed; install requirements.txt to compare it")
+
+
+if __name__ == '__main__':
+    main()
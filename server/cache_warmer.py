@@ -0,0 +1,367 @@
+"""
+Smart Quiz App - Cache Warmer
+Heavy hitters of recent generate requests, replayed from the question bank after a deploy
+or a Redis flush
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Tuple
+
+from adaptive import adaptive_selector
+from catalog import subject_catalog, DIFFICULTIES
+from models import db, Question
+from question_bank import question_bank
+from question_pools import question_pools, normalize_topics
+
+logger = logging.getLogger(__name__)
+
+# (subject, difficulty, topics, largest count requested)
+RequestKey = Tuple[str, str, List[str], int]
+DB_FALLBACK_ROWS = 500
+DEFAULT_COUNT = 10  # generate's default, for keys whose count was not recorded
+
+
+def encode_key(subject: str, difficulty: str, topics: List[str]) -> str:
+    return json.dumps([subject, difficulty, topics], separators=(',', ':'), ensure_ascii=False)
+
+
+def decode_key(key: str) -> Optional[Tuple[str, str, List[str]]]:
+    try:
+        subject, difficulty, topics = json.loads(key)
+        return subject, difficulty, normalize_topics(topics)
+    except (ValueError, TypeError):
+        return None
+
+
+class HeavyHitters:
+    """Space-Saving sketch: the `capacity` most frequent keys in bounded memory.
+
+    A new key arriving when the sketch is full takes over the slot of the
+    least counted key and inherits its count, so counts are overestimates
+    but every key more frequent than total/capacity is kept.
+    """
+
+    def __init__(self, capacity: int = 512):
+        self.capacity = capacity
+        self.counts: Dict[str, float] = {}
+
+    def add(self, key: str, weight: float = 1.0) -> None:
+        counts = self.counts
+        if key in counts:
+            counts[key] += weight
+        elif len(counts) < self.capacity:
+            counts[key] = weight
+        else:
+            victim = min(counts, key=counts.get)
+            counts[key] = counts.pop(victim) + weight
+
+    def decay(self, factor: float) -> None:
+        self.counts = {key: count * factor for key, count in self.counts.items()
+                       if count * factor >= 0.01}
+
+    def top(self, limit: Optional[int] = None) -> List[Tuple[str, float]]:
+        return sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+
+class CacheWarmer:
+    """Records which generate requests are hot and pre-fills their caches.
+
+    Each worker counts request keys (subject, difficulty, topics) in a
+    small sketch, remembering the largest count asked for each, and merges
+    it every `flush_interval` seconds into a shared Redis sorted set,
+    decayed once per interval so the ranking follows recent traffic, and
+    into a snapshot file that outlives a Redis flush. Without Redis the
+    snapshot file is the shared copy. Pools are shared across counts, so
+    a key is warmed once, for the largest count.
+
+    `warm` takes the hottest keys in order and fills their question pools
+    from the mapped bank (the database when the bank lacks the group), so
+    the first requests after a rollout are served without an AI call. It
+    warms at most `concurrency` keys at a time; after `budget` seconds
+    queued keys are dropped and running ones stop at their next step.
+    With Redis one worker warms the shared pools; every worker builds its
+    own in-process caches (catalog, adaptive buckets, bank pages).
+    """
+
+    def __init__(self, prefix: str = 'smartquiz:warm'):
+        self.prefix = prefix
+        self.redis = None
+        self.app = None
+        self.sketch_size = 512
+        self.flush_interval = 30.0
+        self.decay = 0.98
+        self.top = 200
+        self.budget = 10.0
+        self.concurrency = 4
+        self.snapshot_path: Optional[str] = None
+        self.last_report: Optional[Dict[str, Any]] = None
+        self._sketch = HeavyHitters(self.sketch_size)
+        self._targets: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._flusher_pid = None
+        self._warming = False
+
+    def init_app(self, app, redis_client=None) -> None:
+        self.app = app
+        self.redis = redis_client
+        self.sketch_size = app.config.get('CACHE_WARM_SKETCH_SIZE', self.sketch_size)
+        self.flush_interval = app.config.get('CACHE_WARM_FLUSH_INTERVAL', self.flush_interval)
+        self.decay = app.config.get('CACHE_WARM_DECAY', self.decay)
+        self.top = app.config.get('CACHE_WARM_TOP', self.top)
+        self.budget = app.config.get('CACHE_WARM_BUDGET', self.budget)
+        self.concurrency = app.config.get('CACHE_WARM_CONCURRENCY', self.concurrency)
+        self.snapshot_path = app.config.get('CACHE_WARM_SNAPSHOT')
+        self._sketch = HeavyHitters(self.sketch_size)
+        self._targets = {}
+
+    # Recording
+    def record(self, subject: str, difficulty: str, topics: List[str], count: int) -> None:
+        key = encode_key(subject, difficulty, topics)
+        self._ensure_flusher()
+        with self._lock:
+            self._sketch.add(key)
+            self._targets[key] = max(count, self._targets.get(key, 0))
+
+    def flush(self) -> int:
+        """Merge this worker's sketch into the shared ranking; returns keys merged"""
+        with self._lock:
+            local, self._sketch = self._sketch, HeavyHitters(self.sketch_size)
+            targets = {key: self._targets[key] for key in local.counts}
+            self._targets = {}
+        if self.redis:
+            key, targets_key = f'{self.prefix}:keys', f'{self.prefix}:targets'
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                # Decay once per interval across all workers, not once per worker flush
+                decay_ttl = max(1, int(self.flush_interval))
+                if self.redis.set(f'{self.prefix}:decayed', 1, nx=True, ex=decay_ttl):
+                    pipe.zunionstore(key, {key: self.decay})
+                    pipe.zremrangebyscore(key, '-inf', 0.01)
+                for request_key, count in local.counts.items():
+                    pipe.zincrby(key, count, request_key)
+                if targets:
+                    # Keeps the largest count any worker saw
+                    pipe.zadd(targets_key, targets, gt=True)
+                pipe.zremrangebyrank(key, 0, -self.sketch_size - 1)
+                # Targets of keys that dropped out of the ranking go with them
+                pipe.zinterstore(targets_key, {targets_key: 1, key: 0})
+                pipe.zrevrange(key, 0, -1, withscores=True)
+                pipe.zrange(targets_key, 0, -1, withscores=True)
+                *_, ranked, shared_targets = pipe.execute()
+                self._write_snapshot(ranked, {request_key: int(count)
+                                              for request_key, count in shared_targets})
+            except Exception as e:
+                logger.warning("Cache warmer flush failed: %s", e)
+            return len(local)
+
+        # No Redis: the snapshot file is the shared sketch (last writer wins)
+        saved, saved_targets = self._read_snapshot()
+        merged = HeavyHitters(self.sketch_size)
+        for request_key, count in saved:
+            merged.add(request_key, count)
+        merged.decay(self.decay)
+        for request_key, count in local.top():
+            merged.add(request_key, count)
+        for request_key, count in targets.items():
+            saved_targets[request_key] = max(count, saved_targets.get(request_key, 0))
+        self._write_snapshot(merged.top(), {key: saved_targets[key] for key in merged.counts
+                                            if key in saved_targets})
+        return len(local)
+
+    def hot_keys(self, limit: Optional[int] = None) -> List[Tuple[RequestKey, float]]:
+        """Recorded request keys, hottest first"""
+        limit = self.top if limit is None else limit
+        ranked, targets = [], {}
+        if self.redis:
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                pipe.zrevrange(f'{self.prefix}:keys', 0, limit - 1, withscores=True)
+                pipe.zrange(f'{self.prefix}:targets', 0, -1, withscores=True)
+                ranked, targets = pipe.execute()
+                targets = dict(targets)
+            except Exception as e:
+                logger.warning("Cache warmer ranking unavailable: %s", e)
+        if not ranked:
+            ranked, targets = self._read_snapshot()
+            ranked = ranked[:limit]
+        if not ranked:
+            with self._lock:
+                ranked, targets = self._sketch.top(limit), dict(self._targets)
+        hot = []
+        for key, score in ranked:
+            decoded = decode_key(key)
+            if decoded is not None:
+                hot.append(((*decoded, int(targets.get(key, DEFAULT_COUNT))), score))
+        return hot
+
+    def _read_snapshot(self) -> Tuple[List[Tuple[str, float]], Dict[str, int]]:
+        """(ranked keys, largest count per key) from the snapshot file"""
+        if not self.snapshot_path:
+            return [], {}
+        try:
+            with open(self.snapshot_path, encoding='utf-8') as fh:
+                snapshot = json.load(fh)
+            return ([(key, float(score)) for key, score in snapshot['keys']],
+                    {key: int(count) for key, count in snapshot.get('targets', {}).items()})
+        except FileNotFoundError:
+            return [], {}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            logger.warning("Cache warmer snapshot unreadable: %s", e)
+            return [], {}
+
+    def _write_snapshot(self, ranked, targets: Dict[str, int]) -> None:
+        if not self.snapshot_path:
+            return
+        try:
+            directory = os.path.dirname(self.snapshot_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f'{self.snapshot_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as fh:
+                json.dump({'saved_at': time.time(), 'keys': [[key, score] for key, score in ranked],
+                           'targets': targets}, fh, ensure_ascii=False)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            logger.warning("Cache warmer snapshot not written: %s", e)
+
+    # Warming
+    def warm(self, budget: Optional[float] = None, concurrency: Optional[int] = None,
+             limit: Optional[int] = None) -> Dict[str, Any]:
+        """Fill caches for the hottest recorded keys (needs an app context)"""
+        budget = self.budget if budget is None else budget
+        concurrency = max(1, self.concurrency if concurrency is None else concurrency)
+        started = time.monotonic()
+        deadline = started + budget
+        report = {'keys': 0, 'warmed': 0, 'questions': 0, 'skipped': 0, 'failed': 0,
+                  'shared': False}
+
+        subject_catalog.snapshot()
+        adaptive_selector.warm()
+
+        keys = self.hot_keys(limit)
+        report['keys'] = len(keys)
+        # Shared pools are warmed by one worker; the lock lapses with the budget
+        if keys and (not self.redis or self.redis.set(f'{self.prefix}:lock', os.getpid(),
+                                                      nx=True, ex=max(1, int(budget) + 1))):
+            report['shared'] = True
+            app = self.app
+
+            def warm_one(key: RequestKey) -> Optional[int]:
+                with app.app_context():
+                    return self._warm_key(*key, deadline=deadline)
+
+            executor = ThreadPoolExecutor(max_workers=concurrency,
+                                          thread_name_prefix='cache-warmer')
+            futures = [executor.submit(warm_one, key) for key, _ in keys]
+            wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+            # Queued keys are dropped; running ones give up at their next deadline check,
+            # so every key is counted as what it ended up doing
+            executor.shutdown(wait=True, cancel_futures=True)
+            for future in futures:
+                if future.cancelled():
+                    report['skipped'] += 1
+                elif future.exception() is not None:
+                    report['failed'] += 1
+                    logger.warning("Cache warming failed: %s", future.exception())
+                elif future.result() is None:
+                    report['skipped'] += 1
+                else:
+                    report['warmed'] += 1
+                    report['questions'] += future.result()
+
+        report['seconds'] = round(time.monotonic() - started, 3)
+        self.last_report = report
+        logger.info("Cache warmed: %s", report)
+        return report
+
+    def _warm_key(self, subject: str, difficulty: str, topics: List[str], count: int,
+                  deadline: Optional[float] = None) -> Optional[int]:
+        """Top the key's pools up to what a request samples; returns questions added,
+        None when skipped (unknown group, or `deadline` passed before the pools were filled)"""
+        def expired() -> bool:
+            return deadline is not None and time.monotonic() >= deadline
+
+        if expired() or not subject_catalog.has_subject(subject) or difficulty not in DIFFICULTIES:
+            return None
+        target = min(count * 3, question_pools.max_size)
+        pooled = set(question_pools.candidates(subject, difficulty, topics))
+        if len(pooled) >= target:
+            return 0
+
+        ids = [qid for qid in question_bank.sample(subject, difficulty, target, topics)
+               if qid not in pooled]
+        for qid in ids:
+            question_bank.get(qid)  # fault the payload pages in for this worker
+        if expired():
+            return None
+        if len(pooled) + len(ids) < target:
+            wanted = set(topics)
+            rows = db.session.execute(
+                db.select(Question.id, Question.tags)
+                .where(Question.subject == subject, Question.difficulty == difficulty,
+                       Question.is_active.is_(True))
+                .order_by(Question.usage_count.desc())
+                .limit(DB_FALLBACK_ROWS)
+            )
+            taken = pooled.union(ids)
+            for qid, tags in rows:
+                if len(pooled) + len(ids) >= target:
+                    break
+                if qid in taken or (wanted and not wanted.intersection(normalize_topics(tags))):
+                    continue
+                ids.append(qid)
+                taken.add(qid)
+            if expired():
+                return None
+        question_pools.add(subject, difficulty, topics, ids)
+        return len(ids)
+
+    def start(self, app) -> None:
+        """Warm in the background (called in each worker after startup)"""
+        self.app = app
+        self._spawn_warm()
+
+    def _spawn_warm(self) -> None:
+        with self._lock:
+            if self._warming:
+                return
+            self._warming = True
+        threading.Thread(target=self._background_warm, name='cache-warmer', daemon=True).start()
+
+    def _background_warm(self) -> None:
+        try:
+            with self.app.app_context():
+                self.warm()
+        except Exception as e:
+            logger.error("Cache warming failed: %s", e)
+        finally:
+            self._warming = False
+
+    def _ensure_flusher(self) -> None:
+        """Each worker merges its own sketch, so each runs its own flush loop"""
+        if self._flusher_pid == os.getpid() or not self.app:
+            return
+        self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_loop, name='cache-warmer-flush', daemon=True).start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+                # Pools went with a Redis flush; the sentinel going missing is the signal to refill
+                if self.redis and self.redis.set(f'{self.prefix}:sentinel', 1, nx=True):
+                    self._spawn_warm()
+            except Exception as e:
+                logger.error("Cache warmer flush loop error: %s", e)
+
+
+cache_warmer = CacheWarmer()
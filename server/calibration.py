@@ -0,0 +1,204 @@
+"""
+Smart Quiz App - Difficulty and Ability Calibration
+Two-parameter IRT fitted in batch with NumPy, plus an online ability update per quiz
+"""
+
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from models import db, Question, QuizAnswer, User
+from profiles import user_profiles
+
+logger = logging.getLogger(__name__)
+
+# Prior centre of the difficulty (b) scale for each label
+DIFFICULTY_PRIOR = {
+    'easy': -1.0,
+    'medium': 0.0,
+    'hard': 1.0
+}
+
+PRIOR_PRECISION = 0.1  # Gaussian prior keeps sparse items and users near their prior
+DISCRIMINATION_RANGE = (0.2, 3.0)
+ABILITY_RANGE = (-4.0, 4.0)
+ONLINE_STEP = 0.5  # largest ability change a single quiz can cause
+LOAD_CHUNK = 200_000
+WRITE_BATCH = 2000
+
+
+def prior_difficulty(label: Optional[str], difficulty_score: Optional[float] = None) -> float:
+    """Starting difficulty from the model's self-reported score, else from the label"""
+    if difficulty_score is not None and 0.0 <= difficulty_score <= 1.0:
+        return (difficulty_score - 0.5) * 4.0
+    return DIFFICULTY_PRIOR.get(label, 0.0)
+
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30.0, 30.0)))
+
+
+def fit_2pl(users: np.ndarray, items: np.ndarray, correct: np.ndarray,
+            n_users: int, n_items: int, b_prior: Optional[np.ndarray] = None,
+            iterations: int = 10,
+            tolerance: float = 1e-2) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Joint maximum a-posteriori fit of a 2PL model over a flat response log.
+
+    `users`/`items` are dense integer indexes and `correct` is 0/1, one entry
+    per response. Each iteration is a damped diagonal Newton step on ability,
+    difficulty and discrimination, computed with bincount over the whole log,
+    so cost is a handful of O(responses) vector passes.
+    Returns (ability, difficulty, discrimination).
+    """
+    y = correct.astype(np.float64)
+    theta = np.zeros(n_users)
+    b = np.zeros(n_items) if b_prior is None else b_prior.astype(np.float64).copy()
+    b0 = b.copy()
+    a = np.ones(n_items)
+
+    for iteration in range(iterations):
+        a_r, dist = a[items], theta[users] - b[items]
+        p = _sigmoid(a_r * dist)
+        residual = y - p
+        info = p * (1.0 - p)
+
+        g_theta = np.bincount(users, a_r * residual, n_users) - PRIOR_PRECISION * theta
+        h_theta = np.bincount(users, a_r * a_r * info, n_users) + PRIOR_PRECISION
+        g_b = -np.bincount(items, a_r * residual, n_items) - PRIOR_PRECISION * (b - b0)
+        h_b = np.bincount(items, a_r * a_r * info, n_items) + PRIOR_PRECISION
+        g_a = np.bincount(items, dist * residual, n_items) - PRIOR_PRECISION * (a - 1.0)
+        h_a = np.bincount(items, dist * dist * info, n_items) + PRIOR_PRECISION
+
+        step_theta, step_b, step_a = g_theta / h_theta, g_b / h_b, g_a / h_a
+        theta = np.clip(theta + step_theta, *ABILITY_RANGE)
+        b = np.clip(b + step_b, *ABILITY_RANGE)
+        a = np.clip(a + 0.5 * step_a, *DISCRIMINATION_RANGE)
+
+        # Stop once the average parameter movement is negligible
+        if max(np.sqrt(np.mean(step_theta ** 2)), np.sqrt(np.mean(step_b ** 2))) < tolerance:
+            break
+
+    logger.info("2PL fit stopped after %s iterations", iteration + 1)
+    return theta, b, a
+
+
+def _load_responses():
+    """Stream the answer log into dense index arrays"""
+    user_index: Dict[str, int] = {}
+    item_index: Dict[str, int] = {}
+    users, items, correct = [], [], []
+
+    result = db.session.execute(
+        db.select(QuizAnswer.user_id, QuizAnswer.question_id, QuizAnswer.is_correct)
+        .join(Question, Question.id == QuizAnswer.question_id)
+        .execution_options(yield_per=LOAD_CHUNK)
+    )
+    for chunk in result.partitions(LOAD_CHUNK):
+        user_ids, question_ids, flags = zip(*chunk)
+        users.append(np.fromiter((user_index.setdefault(u, len(user_index)) for u in user_ids),
+                                 np.int64, len(user_ids)))
+        items.append(np.fromiter((item_index.setdefault(q, len(item_index)) for q in question_ids),
+                                 np.int64, len(question_ids)))
+        correct.append(np.fromiter(flags, np.int8, len(flags)))
+
+    if not users:
+        return user_index, item_index, None
+    log = (np.concatenate(users), np.concatenate(items), np.concatenate(correct))
+    return user_index, item_index, log
+
+
+def _write(model, column_values: List[Dict], key: str = 'id') -> None:
+    table = model.__table__
+    fields = [name for name in column_values[0] if name != key]
+    stmt = table.update().where(table.c[key] == db.bindparam(f'k_{key}')).values(
+        {name: db.bindparam(f'k_{name}') for name in fields}
+    )
+    for start in range(0, len(column_values), WRITE_BATCH):
+        batch = column_values[start:start + WRITE_BATCH]
+        db.session.execute(stmt, [{f'k_{k}': v for k, v in row.items()} for row in batch])
+
+
+def calibrate(iterations: int = 10) -> Dict[str, float]:
+    """Refit every answered question and user from quiz_answers and store the results"""
+    started = time.perf_counter()
+    user_index, item_index, log = _load_responses()
+    if log is None:
+        return {'responses': 0, 'questions': 0, 'users': 0, 'seconds': 0.0}
+    loaded = time.perf_counter()
+
+    b_prior = np.zeros(len(item_index))
+    for qid, label, score in db.session.execute(
+        db.select(Question.id, Question.difficulty, Question.difficulty_score)
+        .execution_options(yield_per=LOAD_CHUNK)
+    ):
+        if qid in item_index:
+            b_prior[item_index[qid]] = prior_difficulty(label, score)
+
+    users, items, correct = log
+    theta, b, a = fit_2pl(users, items, correct, len(user_index), len(item_index),
+                          b_prior=b_prior, iterations=iterations)
+    fitted = time.perf_counter()
+
+    _write(Question, [
+        {'id': qid, 'irt_difficulty': float(b[i]), 'irt_discrimination': float(a[i])}
+        for qid, i in item_index.items()
+    ])
+    _write(User, [{'id': uid, 'ability': float(theta[i])} for uid, i in user_index.items()])
+    db.session.commit()
+    user_profiles.invalidate_all()
+
+    report = {
+        'responses': int(len(correct)),
+        'questions': len(item_index),
+        'users': len(user_index),
+        'load_seconds': round(loaded - started, 2),
+        'fit_seconds': round(fitted - loaded, 2),
+        'seconds': round(time.perf_counter() - started, 2)
+    }
+    logger.info("Calibration finished: %s", report)
+    return report
+
+
+def update_ability(user_id: str, quizzes: Iterable[List[Tuple[str, bool]]]) -> Optional[float]:
+    """Online Elo-style ability update, one step per completed quiz (caller commits).
+
+    `quizzes` holds the (question_id, is_correct) answers of each quiz in
+    completion order. Item parameters are left to the batch job: nudging them
+    per answer would put every popular question back on the hot write path.
+    """
+    quizzes = [answers for answers in quizzes if answers]
+    question_ids = list({qid for answers in quizzes for qid, _ in answers})
+    if not question_ids:
+        return None
+
+    params = {
+        qid: (b if b is not None else prior_difficulty(label, score), a or 1.0)
+        for qid, b, a, label, score in db.session.execute(
+            db.select(Question.id, Question.irt_difficulty, Question.irt_discrimination,
+                      Question.difficulty, Question.difficulty_score)
+            .where(Question.id.in_(question_ids))
+        )
+    }
+    if not params:
+        return None
+
+    theta = db.session.execute(
+        db.select(User.ability).where(User.id == user_id)
+    ).scalar() or 0.0
+
+    for answers in quizzes:
+        answered = [(params[qid], is_correct) for qid, is_correct in answers if qid in params]
+        if not answered:
+            continue
+        b = np.array([p[0] for p, _ in answered])
+        a = np.array([p[1] for p, _ in answered])
+        y = np.array([c for _, c in answered], dtype=np.float64)
+        expected = _sigmoid(a * (theta - b))
+        # One capped Newton step behaves like Elo with an information-scaled K
+        step = np.sum(a * (y - expected)) / (np.sum(a * a * expected * (1 - expected)) + 1.0)
+        theta = float(np.clip(theta + np.clip(step, -ONLINE_STEP, ONLINE_STEP), *ABILITY_RANGE))
+
+    db.session.execute(db.update(User).where(User.id == user_id).values(ability=theta))
+    return theta
@@ -0,0 +1,295 @@
+"""
+Smart Quiz App - Subject and Topic Catalog
+Per-worker snapshot of subjects, topics (question tags) and question counts per difficulty
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from http_cache import content_versions
+from models import db, Question
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SUBJECTS = ('math', 'physics', 'chemistry', 'biology', 'history', 'geography',
+                    'literature', 'english')
+DIFFICULTIES = ('easy', 'medium', 'hard')
+# Columns that show up in a question's client payload (or decide whether it is served)
+PAYLOAD_FIELDS = ('subject', 'difficulty', 'question_type', 'question_text', 'options',
+                  'correct_answer_index', 'explanation', 'hints', 'tags', 'points', 'time_limit',
+                  'is_active')
+# Columns that place a question in the catalog
+ENTRY_FIELDS = ('subject', 'difficulty', 'tags', 'is_active')
+
+# (subject, difficulty, tags) of an active question; None when inactive
+Entry = Optional[Tuple[str, str, Tuple[str, ...]]]
+
+
+def _entry(subject, difficulty, tags, is_active) -> Entry:
+    if is_active is False or not subject:
+        return None
+    return subject, difficulty, tuple(sorted({tag for tag in tags or [] if isinstance(tag, str)}))
+
+
+class CatalogSnapshot:
+    """Immutable view served to readers, payloads built once per change"""
+
+    def __init__(self, subjects: List[str], counts: Dict[str, Dict[str, int]],
+                 topics: Dict[str, Dict[str, Dict[str, int]]]):
+        self.subjects = subjects
+        self.subject_set = frozenset(subjects)
+        self.subjects_payload = {
+            'subjects': [
+                {
+                    'subject': subject,
+                    'question_counts': dict(counts.get(subject, {})),
+                    'total_questions': sum(counts.get(subject, {}).values()),
+                    'topic_count': len(topics.get(subject, {}))
+                }
+                for subject in subjects
+            ]
+        }
+        self.topics_payload = {}
+        for subject in subjects:
+            by_topic = topics.get(subject, {})
+            ranked = sorted(by_topic.items(), key=lambda item: (-sum(item[1].values()), item[0]))
+            self.topics_payload[subject] = {
+                'subject': subject,
+                'topics': [{'topic': topic, 'question_count': sum(per.values()),
+                            'question_counts': dict(per)}
+                           for topic, per in ranked]
+            }
+        canonical = json.dumps([self.subjects_payload, self.topics_payload],
+                               sort_keys=True).encode()
+        # Derived from the content, so every worker holding the same catalog gives the same ETag
+        self.version = hashlib.blake2b(canonical, digest_size=8).hexdigest()
+
+
+class SubjectCatalog:
+    """Subjects and topics served from memory; the bank is scanned once per worker.
+
+    ORM inserts, deletes and updates of a question's subject, difficulty,
+    tags or is_active are applied to the counts when their transaction
+    commits, and bump the shared 'catalog' content version; any change to
+    a question's payload bumps 'questions' as well. Other workers
+    notice the bump within `sync_interval` seconds and rescan in the
+    background, as they do after `max_age` regardless (bulk imports bypass
+    the ORM). Readers keep the previous snapshot meanwhile.
+    """
+
+    def __init__(self):
+        self.base_subjects: Tuple[str, ...] = DEFAULT_SUBJECTS
+        self.sync_interval = 5.0
+        self.max_age = 300.0
+        self._app = None
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._topics: Dict[str, Dict[str, Dict[str, int]]] = {}
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._generation = 0
+        self._built_at = 0.0
+        self._checked_at = 0.0
+        self._shared_version: Optional[str] = None
+        self._rebuilding = False
+        self._listening = False
+
+    def init_app(self, app) -> None:
+        self._app = app
+        self.base_subjects = tuple(app.config.get('CATALOG_SUBJECTS') or DEFAULT_SUBJECTS)
+        self.sync_interval = app.config.get('CATALOG_SYNC_INTERVAL', self.sync_interval)
+        self.max_age = app.config.get('CATALOG_MAX_AGE', self.max_age)
+        with self._lock:
+            self._snapshot = None
+            if not self._listening:
+                event.listen(Question, 'after_insert', _after_insert)
+                event.listen(Question, 'after_update', _after_update)
+                event.listen(Question, 'after_delete', _after_delete)
+                event.listen(Session, 'after_commit', _after_commit)
+                event.listen(Session, 'after_rollback', _after_rollback)
+                self._listening = True
+
+    # Reads
+    def snapshot(self) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._build_lock:
+                if self._snapshot is None:
+                    self.rebuild()
+            return self._snapshot
+        self._maybe_refresh()
+        return snapshot
+
+    def version(self) -> str:
+        try:
+            return self.snapshot().version
+        except Exception as e:
+            logger.error("Catalog unavailable: %s", e)
+            return 'unavailable'
+
+    def subjects(self) -> List[str]:
+        """Configured subjects plus any other subject found in the bank"""
+        snapshot = self._snapshot
+        return snapshot.subjects if snapshot is not None else list(self.base_subjects)
+
+    def has_subject(self, subject: str) -> bool:
+        snapshot = self._snapshot
+        if snapshot is None:
+            return subject in self.base_subjects
+        return subject in snapshot.subject_set
+
+    def subjects_payload(self) -> Dict[str, Any]:
+        return self.snapshot().subjects_payload
+
+    def topics_payload(self, subject: str) -> Optional[Dict[str, Any]]:
+        return self.snapshot().topics_payload.get(subject)
+
+    # Maintenance
+    def rebuild(self) -> int:
+        """Rescan the active bank (needs an app context)"""
+        generation = self._generation
+        shared = self._read_shared_version()
+        counts: Dict[str, Dict[str, int]] = {}
+        topics: Dict[str, Dict[str, Dict[str, int]]] = {}
+        total = 0
+        rows = db.session.execute(
+            db.select(Question.subject, Question.difficulty, Question.tags)
+            .where(Question.is_active.is_(True))
+            .execution_options(yield_per=50_000)
+        )
+        for subject, difficulty, tags in rows:
+            self._add(counts, topics, _entry(subject, difficulty, tags, True), 1)
+            total += 1
+
+        with self._lock:
+            self._counts, self._topics = counts, topics
+            self._install()
+            self._shared_version = shared
+            # Commits applied while scanning may or may not be in the scan; look again soon
+            self._built_at = time.monotonic() if generation == self._generation else 0.0
+        logger.info("Catalog built from %s questions (version %s)", total, self._snapshot.version)
+        return total
+
+    def apply(self, changes: Iterable[Tuple[int, Entry]]) -> None:
+        """Fold committed (+1/-1, entry) changes into the counts"""
+        with self._lock:
+            self._generation += 1
+            if self._snapshot is None:
+                return  # the first read scans the bank, committed rows included
+            for sign, entry in changes:
+                self._add(self._counts, self._topics, entry, sign)
+            self._install()
+        content_versions.bump('catalog')
+        self._shared_version = self._read_shared_version()
+
+    @staticmethod
+    def _add(counts, topics, entry: Entry, sign: int) -> None:
+        if entry is None:
+            return
+        subject, difficulty, tags = entry
+        per_topic = [topics.setdefault(subject, {}).setdefault(t, {}) for t in tags]
+        for per in [counts.setdefault(subject, {})] + per_topic:
+            per[difficulty] = per.get(difficulty, 0) + sign
+            if per[difficulty] <= 0:
+                del per[difficulty]
+        for tag in tags:
+            if not topics[subject][tag]:
+                del topics[subject][tag]
+        if not counts[subject]:
+            del counts[subject]
+            topics.pop(subject, None)
+
+    def _install(self) -> None:
+        extra = sorted(s for s in self._counts if s not in self.base_subjects)
+        self._snapshot = CatalogSnapshot(list(self.base_subjects) + extra,
+                                         self._counts, self._topics)
+
+    def _read_shared_version(self) -> Optional[str]:
+        return content_versions.get('catalog') if content_versions.redis else None
+
+    def _maybe_refresh(self) -> None:
+        now = time.monotonic()
+        if now - self._checked_at < self.sync_interval or self._rebuilding:
+            return
+        self._checked_at = now
+        shared = self._read_shared_version()
+        unchanged = shared is None or shared == self._shared_version
+        if unchanged and now - self._built_at < self.max_age:
+            return
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._background_rebuild, name='catalog-rebuild',
+                         daemon=True).start()
+
+    def _background_rebuild(self) -> None:
+        try:
+            with self._app.app_context():
+                self.rebuild()
+        except Exception as e:
+            logger.error("Catalog rebuild failed: %s", e)
+        finally:
+            self._rebuilding = False
+
+
+subject_catalog = SubjectCatalog()
+
+
+# ORM hooks: changes wait in session.info until the transaction commits
+def _committed(target, attr: str):
+    history = inspect(target).attrs[attr].history
+    return history.deleted[0] if history.deleted else getattr(target, attr)
+
+
+def _pending(target) -> list:
+    return object_session(target).info.setdefault('catalog_changes', [])
+
+
+def _content_changed(target) -> None:
+    # Question ETags derive from the 'questions' version, bumped once per commit
+    object_session(target).info['questions_changed'] = True
+
+
+def _after_insert(mapper, connection, target) -> None:
+    _content_changed(target)
+    new = _entry(target.subject, target.difficulty, target.tags, target.is_active)
+    _pending(target).append((1, new))
+
+
+def _after_update(mapper, connection, target) -> None:
+    state = inspect(target)
+    if any(state.attrs[attr].history.has_changes() for attr in PAYLOAD_FIELDS):
+        _content_changed(target)
+    if not any(state.attrs[attr].history.has_changes() for attr in ENTRY_FIELDS):
+        return
+    old = _entry(*(_committed(target, attr) for attr in ENTRY_FIELDS))
+    new = _entry(target.subject, target.difficulty, target.tags, target.is_active)
+    if old != new:
+        _pending(target).extend([(-1, old), (1, new)])
+
+
+def _after_delete(mapper, connection, target) -> None:
+    _content_changed(target)
+    old = _entry(*(_committed(target, attr) for attr in ENTRY_FIELDS))
+    _pending(target).append((-1, old))
+
+
+def _after_commit(session) -> None:
+    changes = session.info.pop('catalog_changes', None)
+    if changes:
+        subject_catalog.apply(changes)
+    if session.info.pop('questions_changed', False):
+        content_versions.bump('questions')
+
+
+def _after_rollback(session) -> None:
+    session.info.pop('catalog_changes', None)
+    session.info.pop('questions_changed', None)
@@ -10,69 +10,163 @@ from typing import Type
 
 class Config:
     """Base configuration class with common settings"""
-    
+
     # Application Settings
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-change-in-production'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
-    
+
+    # Password hashing (werkzeug method string, process pool size, queued hash cap)
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 64))
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+
+    # User profile cache (per-worker LRU entries/seconds, Redis copy seconds)
+    PROFILE_CACHE_SIZE = int(os.environ.get('PROFILE_CACHE_SIZE', 4096))
+    PROFILE_CACHE_LOCAL_TTL = float(os.environ.get('PROFILE_CACHE_LOCAL_TTL', 30))
+    PROFILE_CACHE_TTL = int(os.environ.get('PROFILE_CACHE_TTL', 600))
+
+    # Quiz sessions live in Redis; process memory is only safe with a single server process
+    QUIZ_SESSIONS_IN_PROCESS = os.environ.get('QUIZ_SESSIONS_IN_PROCESS', 'false').lower() == 'true'
+
     # Database Configuration
-    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'postgresql://localhost/smartquiz_db'
+    SQLALCHEMY_DATABASE_URI = (os.environ.get('DATABASE_URL')
+                               or 'postgresql://localhost/smartquiz_db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Connections are held only around DB work (released before AI calls), so a small
+    # pool serves many concurrent requests; workers x (size + overflow) must fit max_connections
     SQLALCHEMY_ENGINE_OPTIONS = {
         'pool_pre_ping': True,
         'pool_recycle': 300,
-        'pool_timeout': 20,
-        'max_overflow': 0
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10))
     }
-    
+
+    # Query instrumentation (see query_stats.py): slow statements are logged, with their
+    # plan when QUERY_EXPLAIN is on; a statement repeated N_PLUS_ONE_THRESHOLD times in
+    # one request is logged as a likely N+1; QUERY_STATS_HEADER adds Server-Timing
+    QUERY_STATS_ENABLED = os.environ.get('QUERY_STATS_ENABLED', 'true').lower() == 'true'
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 200))
+    N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 5))
+    QUERY_EXPLAIN = os.environ.get('QUERY_EXPLAIN', 'false').lower() == 'true'
+    QUERY_STATS_HEADER = os.environ.get('QUERY_STATS_HEADER', 'false').lower() == 'true'
+
+    # Subject/topic catalog (see catalog.py): subjects offered even before the bank has
+    # questions for them, and how often workers look for changes made by other workers
+    CATALOG_SUBJECTS = [s for s in os.environ.get('CATALOG_SUBJECTS', '').split(',') if s] or None
+    CATALOG_SYNC_INTERVAL = float(os.environ.get('CATALOG_SYNC_INTERVAL', 5))
+    CATALOG_MAX_AGE = float(os.environ.get('CATALOG_MAX_AGE', 300))
+
+    # `flask db` migration commands; serving processes skip importing Alembic
+    DB_MIGRATIONS_CLI = os.environ.get('DB_MIGRATIONS_CLI', 'true').lower() == 'true'
+
     # Redis Configuration
     REDIS_HOST = os.environ.get('REDIS_HOST', 'localhost')
     REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
     REDIS_PASSWORD = os.environ.get('REDIS_PASSWORD')
     REDIS_DB = int(os.environ.get('REDIS_DB', 0))
-    
+
     # AI Service Configuration
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
     GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
-    AI_REQUEST_TIMEOUT = 30
+    # Seconds per provider call
+    AI_REQUEST_TIMEOUT = float(os.environ.get('AI_REQUEST_TIMEOUT', 60))
     AI_MAX_RETRIES = 3
-    
+    # Keep-alive connections per worker
+    AI_HTTP_POOL_SIZE = int(os.environ.get('AI_HTTP_POOL_SIZE', 100))
+
     # File Upload Configuration
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'uploads')
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf', 'mp3', 'mp4'}
-    
+
     # Rate Limiting
     RATELIMIT_STORAGE_URL = os.environ.get('RATE_LIMIT_STORAGE_URL', 'redis://localhost:6379/1')
     RATELIMIT_DEFAULT = "100 per hour"
-    
+
     # Celery Configuration
     CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
     CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
-    
+    CELERY_QUEUE = os.environ.get('CELERY_QUEUE', 'celery')
+
+    # Health refresher (sampling interval, thresholds that degrade/fail readiness)
+    HEALTH_INTERVAL = float(os.environ.get('HEALTH_INTERVAL', 5))
+    HEALTH_AI_INTERVAL = float(os.environ.get('HEALTH_AI_INTERVAL', 60))
+    HEALTH_DB_WARN_MS = float(os.environ.get('HEALTH_DB_WARN_MS', 100))
+    HEALTH_DB_FAIL_MS = float(os.environ.get('HEALTH_DB_FAIL_MS', 1000))
+    HEALTH_QUEUE_WARN = int(os.environ.get('HEALTH_QUEUE_WARN', 1000))
+    HEALTH_QUEUE_FAIL = int(os.environ.get('HEALTH_QUEUE_FAIL', 10000))
+
+    # Analytics Ingestion
+    ANALYTICS_QUEUE_DIR = os.environ.get('ANALYTICS_QUEUE_DIR', 'queue/analytics')
+    ANALYTICS_FLUSH_SIZE = int(os.environ.get('ANALYTICS_FLUSH_SIZE', 500))
+    ANALYTICS_FLUSH_INTERVAL = float(os.environ.get('ANALYTICS_FLUSH_INTERVAL', 1.0))  # seconds
+
+    # Question usage counters (in-process mode flushes from every worker)
+    QUESTION_COUNTERS_FLUSH_INTERVAL = float(
+        os.environ.get('QUESTION_COUNTERS_FLUSH_INTERVAL', 30.0))
+
+    # Offline content packs (python manage.py build-packs)
+    CONTENT_PACKS_DIR = os.environ.get('CONTENT_PACKS_DIR', 'packs')
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', 'false').lower() == 'true'
+
+    # Memory-mapped question bank (python manage.py build-bank), remapped when the file is replaced
+    QUESTION_BANK_PATH = os.environ.get('QUESTION_BANK_PATH', 'bank/questions.bank')
+    QUESTION_BANK_CHECK_INTERVAL = float(os.environ.get('QUESTION_BANK_CHECK_INTERVAL', 30))
+    # How often a worker pulls questions other workers edited since the build (Redis only)
+    QUESTION_BANK_SYNC_INTERVAL = float(os.environ.get('QUESTION_BANK_SYNC_INTERVAL', 5))
+
+    # Generated question pools per subject/difficulty/topic, sampled for any requested count
+    QUESTION_POOL_TTL = int(os.environ.get('QUESTION_POOL_TTL', 3600))  # seconds
+    QUESTION_POOL_MAX_SIZE = int(os.environ.get('QUESTION_POOL_MAX_SIZE', 200))  # ids per pool
+    # In-process mode only
+    QUESTION_POOL_MAX_POOLS = int(os.environ.get('QUESTION_POOL_MAX_POOLS', 5000))
+
+    # Cache warmer (see cache_warmer.py): hottest recent generate requests, replayed from the
+    # bank when a worker starts (CACHE_WARM_ON_STARTUP) or by `python manage.py warm-cache`
+    CACHE_WARM_ON_STARTUP = os.environ.get('CACHE_WARM_ON_STARTUP', 'true').lower() == 'true'
+    CACHE_WARM_BUDGET = float(os.environ.get('CACHE_WARM_BUDGET', 10))  # seconds
+    CACHE_WARM_CONCURRENCY = int(os.environ.get('CACHE_WARM_CONCURRENCY', 4))
+    CACHE_WARM_TOP = int(os.environ.get('CACHE_WARM_TOP', 200))  # keys warmed
+    CACHE_WARM_SKETCH_SIZE = int(os.environ.get('CACHE_WARM_SKETCH_SIZE', 512))  # keys tracked
+    CACHE_WARM_FLUSH_INTERVAL = float(os.environ.get('CACHE_WARM_FLUSH_INTERVAL', 30))
+    CACHE_WARM_DECAY = float(os.environ.get('CACHE_WARM_DECAY', 0.98))  # per flush interval
+    CACHE_WARM_SNAPSHOT = os.environ.get('CACHE_WARM_SNAPSHOT', 'bank/warm_keys.json')
+
+    # Accounts allowed to use /api/v1/grading/batch (comma-separated user ids)
+    GRADING_USER_IDS = {u for u in os.environ.get('GRADING_USER_IDS', '').split(',') if u}
+
     # Email Configuration
     MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
     MAIL_PORT = int(os.environ.get('MAIL_PORT', 587))
     MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', 'True').lower() == 'true'
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
-    
+
     # Monitoring and Logging
     SENTRY_DSN = os.environ.get('SENTRY_DSN')
     LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
-    
+    # Records go through a bounded queue to a listener thread (see log_pipeline.py)
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')  # json | text
+    LOG_FILE = os.environ.get('LOG_FILE')
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+    # INFO/DEBUG records per second per message template; 0 keeps them all
+    LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 20))
+
     # Security Settings
     WTF_CSRF_ENABLED = True
     WTF_CSRF_TIME_LIMIT = None
     SESSION_COOKIE_SECURE = True
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
-    
+
     # CORS Settings
-    CORS_ORIGINS = os.environ.get('CORS_ORIGINS', 'http://localhost:3000').split(',')
-    
+    CORS_ORIGINS = os.environ.get('CORS_ORIGINS',
+                                  'http://localhost:3000,https://smartquiz.app').split(',')
+
     @staticmethod
     def init_app(app):
         """Initialize application with configuration"""
@@ -81,48 +175,57 @@ class Config:
 
 class DevelopmentConfig(Config):
     """Development environment configuration"""
-    
+
     DEBUG = True
     TESTING = False
-    
+
     # Relaxed security for development
     SESSION_COOKIE_SECURE = False
     WTF_CSRF_ENABLED = False
-    
+
     # Development database
-    SQLALCHEMY_DATABASE_URI = os.environ.get('DEV_DATABASE_URL') or \
-        'postgresql://localhost/smartquiz_dev'
-    
-    # Verbose logging
-    LOG_LEVEL = 'DEBUG'
-    
+    SQLALCHEMY_DATABASE_URI = (os.environ.get('DEV_DATABASE_URL') or os.environ.get('DATABASE_URL')
+                               or 'postgresql://localhost/smartquiz_dev')
+
+    # Verbose, human-readable logging
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'DEBUG')
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
+    LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 0))
+    QUERY_STATS_HEADER = True
+    QUERY_EXPLAIN = os.environ.get('QUERY_EXPLAIN', 'true').lower() == 'true'
+
+    # `python app.py` is one process, so sessions may stay in memory without Redis
+    QUIZ_SESSIONS_IN_PROCESS = os.environ.get('QUIZ_SESSIONS_IN_PROCESS', 'true').lower() == 'true'
+
     @classmethod
     def init_app(cls, app):
         Config.init_app(app)
-        
-        # Development-specific initialization
-        import logging
-        logging.basicConfig(level=logging.DEBUG)
 
 
 class TestingConfig(Config):
     """Testing environment configuration"""
-    
+
     TESTING = True
     DEBUG = True
-    
+
     # In-memory database for testing
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
-    
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+
     # Disable CSRF for testing
     WTF_CSRF_ENABLED = False
-    
+
     # Fast password hashing for tests
     BCRYPT_LOG_ROUNDS = 4
-    
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+    PASSWORD_HASH_WORKERS = 0
+
     # Disable rate limiting in tests
     RATELIMIT_ENABLED = False
-    
+
+    # Tests run in one process
+    QUIZ_SESSIONS_IN_PROCESS = True
+
     @classmethod
     def init_app(cls, app):
         Config.init_app(app)
@@ -130,75 +233,43 @@ class TestingConfig(Config):
 
 class ProductionConfig(Config):
     """Production environment configuration"""
-    
+
     DEBUG = False
     TESTING = False
-    
+
     # Enhanced security for production
     SESSION_COOKIE_SECURE = True
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Strict'
-    
+
     # Production database with SSL
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'postgresql://localhost/smartquiz_prod'
-    
-    # Enhanced database connection pooling
-    SQLALCHEMY_ENGINE_OPTIONS = {
-        'pool_pre_ping': True,
-        'pool_recycle': 300,
-        'pool_timeout': 20,
-        'max_overflow': 10,
-        'pool_size': 20
-    }
-    
-    # Production logging
-    LOG_LEVEL = 'WARNING'
-    
+    SQLALCHEMY_ENGINE_OPTIONS = dict(
+        Config.SQLALCHEMY_ENGINE_OPTIONS,
+        pool_size=int(os.environ.get('DB_POOL_SIZE', 20)),
+        max_overflow=int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    )
+
+    # Production logging: JSON to stdout and a rotating file, written by the listener thread
+    LOG_FILE = os.environ.get('LOG_FILE', 'logs/smartquiz.log')
+    LOG_FILE_MAX_BYTES = 10240000  # 10MB
+    LOG_FILE_BACKUPS = 10
+
     @classmethod
     def init_app(cls, app):
         Config.init_app(app)
-        
-        # Production-specific initialization
-        import logging
-        from logging.handlers import RotatingFileHandler
-        
-        # File logging
-        if not os.path.exists('logs'):
-            os.mkdir('logs')
-        
-        file_handler = RotatingFileHandler(
-            'logs/smartquiz.log',
-            maxBytes=10240000,  # 10MB
-            backupCount=10
-        )
-        file_handler.setFormatter(logging.Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-        ))
-        file_handler.setLevel(logging.INFO)
-        app.logger.addHandler(file_handler)
-        
-        app.logger.setLevel(logging.INFO)
-        app.logger.info('Smart Quiz App startup')
 
 
 class DockerConfig(ProductionConfig):
     """Docker container configuration"""
-    
+
+    # Containers log to stdout only
+    LOG_FILE = os.environ.get('LOG_FILE')
+
     @classmethod
     def init_app(cls, app):
         ProductionConfig.init_app(app)
-        
-        # Docker-specific logging to stdout
-        import logging
-        import sys
-        
-        handler = logging.StreamHandler(sys.stdout)
-        handler.setFormatter(logging.Formatter(
-            '%(asctime)s %(levelname)s: %(message)s'
-        ))
-        app.logger.addHandler(handler)
-        app.logger.setLevel(logging.INFO)
 
 
 # Configuration mapping
@@ -215,5 +286,5 @@ def get_config(config_name: str = None) -> Type[Config]:
     """Get configuration class by name"""
     if config_name is None:
         config_name = os.environ.get('FLASK_ENV', 'default')
-    
-    return config.get(config_name, config['default'])
\ No newline at end of file
+
+    return config.get(config_name, config['default'])
@@ -0,0 +1,212 @@
+"""
+Smart Quiz App - Write-Behind Question Counters
+Served/answered/correct tallies accumulate outside the database and are flushed in bulk
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+import redis
+from sqlalchemy import Integer, String, column, values
+
+from models import db, Question
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('served', 'answered', 'correct')
+FLUSH_BATCH_SIZE = 1000
+FLUSH_LOCK_TTL = 300  # seconds; a flusher that dies holding the lock blocks others this long
+
+
+class QuestionCounters:
+    """Per-question counters kept in a Redis hash, or in process when Redis is absent.
+
+    Recording is a single HINCRBY pipeline (or a dict update), so hot questions
+    never take a row lock on the request path. `flush` moves the tallies into
+    questions.usage_count / answer_count / success_rate, issuing one UPDATE row
+    per distinct question touched since the previous flush.
+
+    With Redis, workers only record; `manage.py flush-counters --interval N`
+    applies the tallies (its own service in docker-compose). Flushes take a
+    Redis lock, so two flushers never apply the same hash.
+    """
+
+    def __init__(self, key: str = 'smartquiz:question_counters'):
+        self.key = key
+        self.redis = None
+        self._local = defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+        self._lock = threading.Lock()
+        self._flusher_pid = None
+        self.app = None
+        self.flush_interval = 30.0
+
+    def init_app(self, app, redis_client=None) -> None:
+        self.app = app
+        self.redis = redis_client
+        self.flush_interval = app.config.get('QUESTION_COUNTERS_FLUSH_INTERVAL', 30.0)
+
+    def _record(self, increments: Iterable[Tuple[str, str, int]]) -> None:
+        if self.redis:
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                for question_id, field, amount in increments:
+                    pipe.hincrby(self.key, f'{question_id}:{field}', amount)
+                pipe.execute()
+                return
+            except Exception as e:
+                logger.warning("Question counter increment failed: %s", e)
+                return
+
+        self._ensure_local_flusher()
+        with self._lock:
+            for question_id, field, amount in increments:
+                self._local[question_id][field] += amount
+
+    def record_served(self, question_ids: Iterable[str]) -> None:
+        self._record((question_id, 'served', 1) for question_id in question_ids if question_id)
+
+    def record_answers(self, answers: Iterable[Tuple[str, bool]]) -> None:
+        increments = []
+        for question_id, is_correct in answers:
+            increments.append((question_id, 'answered', 1))
+            if is_correct:
+                increments.append((question_id, 'correct', 1))
+        self._record(increments)
+
+    def record_answer_totals(self, totals: Iterable[Tuple[str, int, int]]) -> None:
+        """Pre-aggregated (question_id, answered, correct) tallies, e.g. from batch grading"""
+        increments = []
+        for question_id, answered, correct in totals:
+            increments.append((question_id, 'answered', answered))
+            if correct:
+                increments.append((question_id, 'correct', correct))
+        self._record(increments)
+
+    def _drain_redis(self) -> Tuple[Dict[str, Dict[str, int]], List[str]]:
+        # RENAME is atomic, so increments that land mid-flush go to a fresh hash.
+        # Only the lock holder gets here, so any other flushing key was left
+        # behind by a flush that failed or died, and is applied now.
+        pending = list(self.redis.scan_iter(f'{self.key}:flushing:*'))
+        try:
+            flushing = f'{self.key}:flushing:{uuid.uuid4().hex}'
+            self.redis.rename(self.key, flushing)
+            pending.append(flushing)
+        except redis.ResponseError as e:
+            if 'no such key' not in str(e).lower():
+                raise
+            # nothing recorded since the last flush
+
+        tallies = defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+        for flushing in pending:
+            for field_key, amount in self.redis.hgetall(flushing).items():
+                question_id, _, field = field_key.rpartition(':')
+                if field in FIELDS:
+                    tallies[question_id][field] += int(amount)
+        return tallies, pending
+
+    def _drain_local(self) -> Tuple[Dict[str, Dict[str, int]], List[str]]:
+        with self._lock:
+            tallies, self._local = self._local, defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+        return tallies, []
+
+    def flush(self) -> int:
+        """Apply accumulated tallies to the questions table; returns rows updated"""
+        if not self.redis:
+            return self._flush()
+        lock, token = f'{self.key}:lock', uuid.uuid4().hex
+        if not self.redis.set(lock, token, nx=True, ex=FLUSH_LOCK_TTL):
+            logger.info("Question counters are being flushed by another process")
+            return 0
+        try:
+            return self._flush()
+        finally:
+            self._release(lock, token)
+
+    def _release(self, lock: str, token: str) -> None:
+        with self.redis.pipeline() as pipe:
+            try:
+                pipe.watch(lock)
+                if pipe.get(lock) == token:
+                    pipe.multi()
+                    pipe.delete(lock)
+                    pipe.execute()
+            except redis.WatchError:
+                pass  # expired and taken by another flusher meanwhile
+
+    def _flush(self) -> int:
+        tallies, pending_keys = self._drain_redis() if self.redis else self._drain_local()
+        rows = [{'id': qid, **counts} for qid, counts in tallies.items()]
+
+        try:
+            for start in range(0, len(rows), FLUSH_BATCH_SIZE):
+                _apply_batch(rows[start:start + FLUSH_BATCH_SIZE])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            if not self.redis:
+                self._record((qid, field, counts[field])
+                             for qid, counts in tallies.items() for field in FIELDS)
+            raise
+
+        if pending_keys:
+            self.redis.delete(*pending_keys)
+        return len(rows)
+
+    def _ensure_local_flusher(self) -> None:
+        """Each worker owns its in-process tallies, so each runs its own flush loop"""
+        if self._flusher_pid == os.getpid() or not self.app:
+            return
+        self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_loop, name='question-counters', daemon=True).start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception as e:
+                logger.error("Question counter flush failed: %s", e)
+
+
+def _apply_batch(rows) -> None:
+    table = Question.__table__
+    answered_before = db.func.coalesce(table.c.answer_count, 0)
+
+    if db.engine.dialect.name == 'postgresql':
+        source = values(
+            column('id', String), column('served', Integer),
+            column('answered', Integer), column('correct', Integer),
+            name='deltas'
+        ).data([(r['id'], r['served'], r['answered'], r['correct']) for r in rows])
+        served, answered, correct = source.c.served, source.c.answered, source.c.correct
+        stmt = table.update().where(table.c.id == source.c.id)
+        params = None
+    else:
+        served, answered, correct = (db.bindparam(f'd_{name}') for name in FIELDS)
+        stmt = table.update().where(table.c.id == db.bindparam('d_id'))
+        params = [{f'd_{k}': v for k, v in r.items()} for r in rows]
+
+    # Running success rate: fold this interval's answers into the stored mean
+    stmt = stmt.values(
+        usage_count=db.func.coalesce(table.c.usage_count, 0) + served,
+        answer_count=answered_before + answered,
+        success_rate=db.case(
+            (answered_before + answered > 0,
+             (db.func.coalesce(table.c.success_rate, 0.0) * answered_before + correct)
+             / db.cast(answered_before + answered, db.Float)),
+            else_=table.c.success_rate
+        )
+    )
+    if params is None:
+        db.session.execute(stmt)
+    else:
+        db.session.execute(stmt, params)
+
+
+question_counters = QuestionCounters()
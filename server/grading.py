@@ -0,0 +1,226 @@
+"""
+Smart Quiz App - Batch Grading
+Class-wide submissions graded as one NumPy matrix comparison, with item statistics
+"""
+
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from counters import question_counters
+from models import db, dialect_insert, Question, Quiz, QuizAnswer, User
+import rollups
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_SUBMISSIONS = 20_000
+MAX_BATCH_QUESTIONS = 200
+WRITE_BATCH = 5000
+
+
+def response_matrix(answers: List[List[Optional[int]]], option_counts: np.ndarray) -> np.ndarray:
+    """(submissions x questions) selected indexes, -1 where a question was skipped.
+
+    Raises ValueError for anything but null, -1 or an integer index into
+    the question's options, so no malformed answer can match the key.
+    """
+    n_questions = len(option_counts)
+    if not all(isinstance(row, list) for row in answers):
+        raise ValueError('answers must be a list per submission')
+    kinds = {type(a) for row in answers for a in row[:n_questions]}
+    if not kinds <= {int, type(None)}:
+        raise ValueError('answers must be integer option indexes or null')
+    try:
+        matrix = np.array(answers, dtype=np.float64)  # None becomes NaN
+        if matrix.ndim != 2 or matrix.shape[1] != n_questions:
+            raise ValueError
+    except (TypeError, ValueError):
+        # Ragged or short rows: pad each one to the question count
+        matrix = np.full((len(answers), n_questions), np.nan)
+        for i, row in enumerate(answers):
+            row = [np.nan if a is None else a for a in row[:n_questions]]
+            matrix[i, :len(row)] = row
+    matrix = np.nan_to_num(matrix, nan=-1.0)
+    invalid = (matrix < -1) | (matrix >= option_counts[np.newaxis, :])
+    if invalid.any():
+        row, col = np.argwhere(invalid)[0]
+        raise ValueError(f'answer {answers[row][col]} of submission {row + 1} '
+                         f'is not an option of question {col + 1}')
+    return matrix.astype(np.int16)
+
+
+def item_statistics(correct: np.ndarray) -> Dict[str, np.ndarray]:
+    """Classical item analysis of a 0/1 (submissions x questions) matrix.
+
+    difficulty is the proportion correct (p-value); discrimination is the
+    point-biserial correlation between an item and the rest-of-test score
+    (total minus the item itself), all columns at once.
+    """
+    x = correct.astype(np.float64)
+    rest = x.sum(axis=1, keepdims=True) - x
+    p = x.mean(axis=0)
+    covariance = (x * rest).mean(axis=0) - p * rest.mean(axis=0)
+    spread = np.sqrt(p * (1.0 - p)) * rest.std(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        discrimination = np.where(spread > 0, covariance / spread, 0.0)
+    return {'difficulty': p, 'discrimination': discrimination}
+
+
+def grade_submissions(key: np.ndarray, points: np.ndarray,
+                      responses: np.ndarray) -> Dict[str, np.ndarray]:
+    """Grade every submission against the key in one broadcast comparison"""
+    correct = responses == key[np.newaxis, :]
+    correct_count = correct.sum(axis=1)
+    return dict(
+        item_statistics(correct),
+        correct=correct,
+        correct_count=correct_count,
+        score=correct.astype(np.float64) @ points,
+        percentage=correct_count / key.shape[0] * 100.0
+    )
+
+
+def grade_batch(question_ids: List[str], submissions: List[Dict[str, Any]],
+                subject: Optional[str] = None, difficulty: Optional[str] = None,
+                store_answers: bool = True) -> Dict[str, Any]:
+    """Grade class-wide submissions against one question set and store them as quizzes.
+
+    Each submission is {user_id, answers: [selected index or null per
+    question], quiz_id?, time_spent?}. A quiz_id makes a submission
+    idempotent: ids already stored, or repeated within the batch, are
+    reported as duplicates, not regraded. An answer that is not null, -1 or
+    an index into the question's options rejects the batch (ValueError).
+    """
+    if not question_ids or len(question_ids) > MAX_BATCH_QUESTIONS:
+        raise ValueError(f'Between 1 and {MAX_BATCH_QUESTIONS} questions required')
+    if not submissions or len(submissions) > MAX_BATCH_SUBMISSIONS:
+        raise ValueError(f'Between 1 and {MAX_BATCH_SUBMISSIONS} submissions required')
+
+    started = time.perf_counter()
+    bank = {
+        qid: (correct, points, q_subject, q_difficulty, len(options or []))
+        for qid, correct, points, q_subject, q_difficulty, options in db.session.execute(
+            db.select(Question.id, Question.correct_answer_index, Question.points,
+                      Question.subject, Question.difficulty, Question.options)
+            .where(Question.id.in_(question_ids))
+        )
+    }
+    missing = [qid for qid in question_ids if qid not in bank]
+    if missing:
+        raise ValueError(f'Unknown questions: {missing[:10]}')
+
+    if not all(isinstance(s, dict) for s in submissions):
+        raise ValueError('Malformed submission: each one must be an object')
+    # A quiz_id repeated within the batch is graded and stored once
+    seen_ids, repeated, unique = set(), [], []
+    for s in submissions:
+        quiz_id = str(s['quiz_id']) if s.get('quiz_id') else None
+        if quiz_id in seen_ids:
+            repeated.append(quiz_id)
+            continue
+        if quiz_id:
+            seen_ids.add(quiz_id)
+        unique.append(s)
+    submissions = unique
+
+    option_counts = np.array([bank[qid][4] for qid in question_ids], dtype=np.int64)
+    try:
+        users = [str(s['user_id']) for s in submissions]
+        responses = response_matrix([s.get('answers') or [] for s in submissions], option_counts)
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f'Malformed submission: {e}')
+    known = set(db.session.execute(db.select(User.id).where(User.id.in_(set(users)))).scalars())
+    unknown = sorted(set(users) - known)
+    if unknown:
+        raise ValueError(f'Unknown users: {unknown[:10]}')
+
+    key = np.array([bank[qid][0] for qid in question_ids], dtype=np.int16)
+    points = np.array([bank[qid][1] or 1 for qid in question_ids], dtype=np.float64)
+    result = grade_submissions(key, points, responses)
+    graded = time.perf_counter()
+
+    now = datetime.utcnow()
+    subject = subject or bank[question_ids[0]][2]
+    difficulty = difficulty or bank[question_ids[0]][3]
+    quiz_rows = [
+        {
+            'id': str(s.get('quiz_id') or uuid.uuid4()),
+            'user_id': users[i],
+            'subject': subject,
+            'difficulty': difficulty,
+            'total_questions': len(question_ids),
+            'correct_answers': int(result['correct_count'][i]),
+            'score': float(result['score'][i]),
+            'percentage': float(result['percentage'][i]),
+            'time_spent': int(s.get('time_spent') or 0),
+            'started_at': now,
+            'completed_at': now,
+            'is_completed': True,
+            'synced_at': now
+        }
+        for i, s in enumerate(submissions)
+    ]
+
+    inserted = set()
+    stmt = (dialect_insert(Quiz).on_conflict_do_nothing(index_elements=['id'])
+            .returning(Quiz.__table__.c.id))
+    for start in range(0, len(quiz_rows), WRITE_BATCH):
+        inserted.update(db.session.execute(stmt, [
+            dict(row, metadata={'graded_by': 'batch'})
+            for row in quiz_rows[start:start + WRITE_BATCH]
+        ]).scalars())
+
+    fresh = np.array([row['id'] in inserted for row in quiz_rows])
+    if store_answers and fresh.any():
+        rows, cols = np.nonzero((responses >= 0) & fresh[:, np.newaxis])
+        answer_rows = [
+            {
+                'quiz_id': quiz_rows[r]['id'],
+                'question_id': question_ids[c],
+                'user_id': users[r],
+                'selected_answer_index': int(responses[r, c]),
+                'is_correct': bool(result['correct'][r, c]),
+                'time_spent': 0,
+                'answered_at': now
+            }
+            for r, c in zip(rows.tolist(), cols.tolist())
+        ]
+        answer_stmt = dialect_insert(QuizAnswer).on_conflict_do_nothing(
+            index_elements=['quiz_id', 'question_id'])
+        for start in range(0, len(answer_rows), WRITE_BATCH):
+            db.session.execute(answer_stmt, answer_rows[start:start + WRITE_BATCH])
+
+    rollups.apply_quizzes(Quiz(**row) for row in quiz_rows if row['id'] in inserted)
+    db.session.commit()
+
+    if fresh.any():
+        answered = ((responses >= 0) & fresh[:, np.newaxis]).sum(axis=0)
+        correct = (result['correct'] & fresh[:, np.newaxis]).sum(axis=0)
+        question_counters.record_answer_totals(
+            (qid, int(answered[j]), int(correct[j]))
+            for j, qid in enumerate(question_ids) if answered[j]
+        )
+
+    logger.info("Batch graded %s submissions x %s questions in %.3fs, stored in %.2fs",
+                len(submissions), len(question_ids), graded - started, time.perf_counter() - graded)
+    return {
+        'graded': len(submissions),
+        'stored': len(inserted),
+        'duplicates': [row['id'] for row in quiz_rows if row['id'] not in inserted] + repeated,
+        'results': [
+            {'quiz_id': row['id'], 'user_id': row['user_id'],
+             'correct_answers': row['correct_answers'], 'score': row['score'],
+             'percentage': row['percentage']}
+            for row in quiz_rows
+        ],
+        'items': [
+            {'question_id': qid, 'difficulty': round(float(result['difficulty'][j]), 4),
+             'discrimination': round(float(result['discrimination'][j]), 4)}
+            for j, qid in enumerate(question_ids)
+        ],
+        'grading_seconds': round(graded - started, 4)
+    }
@@ -0,0 +1,54 @@
+"""
+Smart Quiz App - Gunicorn Configuration
+gunicorn -c gunicorn.conf.py wsgi:app
+
+The default worker class is gevent. A request waiting on an AI provider
+parks its greenlet, so one worker can hold hundreds of in-flight
+generate/feedback calls instead of one per sync worker.
+"""
+
+import multiprocessing
+import os
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+
+if worker_class == 'gevent':
+    # Patch before the app and its Redis/HTTP clients are imported (also under --preload)
+    from gevent import monkey
+    monkey.patch_all()
+
+# Serving processes never run `flask db`; skip importing Alembic
+os.environ.setdefault('DB_MIGRATIONS_CLI', 'false')
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+# Concurrent requests per gevent worker; keep DB_POOL_SIZE + DB_MAX_OVERFLOW per worker within
+# Postgres max_connections since greenlets only hold a connection around DB work
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 500))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+max_requests = 1000
+max_requests_jitter = 100
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG')
+# Import the app once in the master and fork it into workers (faster boot, shared pages)
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'false').lower() == 'true'
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from app import reconnect_after_fork
+        from wsgi import app
+        reconnect_after_fork(app)
+
+
+def post_worker_init(worker):
+    from wsgi import app
+    from adaptive import adaptive_selector
+    from cache_warmer import cache_warmer
+    # In-process adaptive buckets (no Redis) are built before the worker takes requests
+    with app.app_context():
+        adaptive_selector.warm()
+    if app.config['CACHE_WARM_ON_STARTUP']:
+        # Fill pools from the bank for the hottest recent requests before the first wave misses
+        cache_warmer.start(app)
@@ -0,0 +1,216 @@
+"""
+Smart Quiz App - Health Monitoring
+Dependencies sampled by a background refresher; probes answer from the last snapshot
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+HEALTHY, DEGRADED, UNHEALTHY = 'healthy', 'degraded', 'unhealthy'
+SEVERITY = {HEALTHY: 0, DEGRADED: 1, UNHEALTHY: 2}
+
+
+class Check:
+    """One sampled dependency.
+
+    `probe` either returns None, in which case the call's latency in ms is
+    the sample, or returns the sample itself (a gauge such as queue depth).
+    A sample above `warn` degrades the check and above `fail` fails it,
+    judged on the median of the recent window so one slow call is not an
+    outage. Consecutive probe errors fail it after `failures` samples.
+    Only `critical` checks take the instance out of readiness.
+    """
+
+    def __init__(self, name: str, probe: Callable[[], Optional[float]], critical: bool = False,
+                 warn: Optional[float] = None, fail: Optional[float] = None,
+                 interval: Optional[float] = None, unit: str = 'ms'):
+        self.name = name
+        self.probe = probe
+        self.critical = critical
+        self.warn = warn
+        self.fail = fail
+        self.interval = interval
+        self.unit = unit
+        self.history: Deque[Tuple[float, Optional[float], Optional[str]]] = deque()
+        self.next_run = 0.0
+
+    def sample(self) -> None:
+        started = time.perf_counter()
+        try:
+            value = self.probe()
+            if value is None:
+                value = (time.perf_counter() - started) * 1000
+            self.history.append((time.time(), float(value), None))
+        except Exception as e:
+            self.history.append((time.time(), None, str(e)[:200]))
+
+    def summary(self, window: int, failures: int) -> Dict[str, Any]:
+        recent = list(self.history)[-window:]
+        values = sorted(v for _, v, _ in recent if v is not None)
+        errors = [err for _, _, err in recent if err]
+        streak = 0
+        for _, _, err in reversed(recent):
+            if not err:
+                break
+            streak += 1
+
+        status = HEALTHY
+        if not recent:
+            status = UNHEALTHY if self.critical else DEGRADED
+        elif streak >= failures:
+            status = UNHEALTHY
+        elif errors:
+            status = DEGRADED
+        if values:
+            median = values[len(values) // 2]
+            if self.fail is not None and median > self.fail:
+                status = UNHEALTHY
+            elif self.warn is not None and median > self.warn and status == HEALTHY:
+                status = DEGRADED
+
+        summary = {'status': status, 'critical': self.critical, 'samples': len(recent)}
+        if recent and recent[-1][1] is not None:
+            summary['last'] = round(recent[-1][1], 2)
+        if values:
+            summary['p50'] = round(values[len(values) // 2], 2)
+            summary['p95'] = round(values[min(len(values) - 1, int(len(values) * 0.95))], 2)
+            summary['unit'] = self.unit
+        if errors:
+            summary['error'] = errors[-1]
+        if recent:
+            summary['sampled_at'] = datetime.utcfromtimestamp(recent[-1][0]).isoformat()
+        return summary
+
+
+class HealthMonitor:
+    """Per-worker refresher thread plus pre-encoded probe responses.
+
+    Every `interval` seconds the refresher samples each due check, keeps
+    `history` samples per check and re-encodes the /livez, /readyz and
+    /health bodies. The probe endpoints only read those bytes, so a slow
+    dependency delays the next snapshot instead of the probe. A snapshot
+    older than `stale_after` makes the instance unready.
+    """
+
+    def __init__(self):
+        self.checks: Dict[str, Check] = {}
+        self.interval = 5.0
+        self.history = 120
+        self.window = 5
+        self.failures = 3
+        self.stale_after = 30.0
+        self.info: Dict[str, Any] = {}
+        self._started_at = time.time()
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+        self._refresher_pid = None
+        self._snapshot: Dict[str, Any] = {}
+        self._ready_body = self._encode({'status': 'starting', 'ready': False})
+        self._health_body = self._ready_body
+        self._ready = False
+
+    def init_app(self, app, info: Optional[Dict[str, Any]] = None) -> None:
+        self.interval = app.config.get('HEALTH_INTERVAL', self.interval)
+        self.history = app.config.get('HEALTH_HISTORY', self.history)
+        self.window = app.config.get('HEALTH_WINDOW', self.window)
+        self.failures = app.config.get('HEALTH_FAILURES', self.failures)
+        self.stale_after = app.config.get('HEALTH_STALE_AFTER',
+                                          max(self.stale_after, self.interval * 3))
+        self.info = dict(info or {})
+        self.checks = {}
+
+    def register(self, check: Check) -> None:
+        check.history = deque(maxlen=self.history)
+        self.checks[check.name] = check
+
+    @staticmethod
+    def _encode(payload: Dict[str, Any]) -> bytes:
+        return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+    # Refresher
+    def _ensure_refresher(self) -> None:
+        """Threads do not survive fork, so each worker starts its own on first probe"""
+        if self._refresher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._refresher_pid == os.getpid():
+                return
+            self._refresher_pid = os.getpid()
+        threading.Thread(target=self._refresh_loop, name='health-refresher', daemon=True).start()
+
+    def _refresh_loop(self) -> None:
+        while True:
+            started = time.monotonic()
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error("Health refresh failed: %s", e)
+            time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def refresh(self) -> None:
+        now = time.monotonic()
+        for check in self.checks.values():
+            if now >= check.next_run:
+                check.sample()
+                check.next_run = now + (check.interval or self.interval)
+
+        services = {name: check.summary(self.window, self.failures)
+                    for name, check in self.checks.items()}
+        worst = max((SEVERITY[s['status']] for s in services.values()), default=0)
+        ready = not any(s['critical'] and s['status'] == UNHEALTHY for s in services.values())
+        status = [HEALTHY, DEGRADED, UNHEALTHY][worst]
+        if not ready:
+            status = UNHEALTHY
+        elif status == UNHEALTHY:
+            status = DEGRADED  # non-critical failures do not take the instance out
+
+        snapshot = dict(self.info, status=status, ready=ready,
+                        timestamp=datetime.utcnow().isoformat(), services=services)
+        with self._lock:
+            self._snapshot = snapshot
+            self._ready = ready
+            self._ready_body = self._encode({'status': status, 'ready': ready,
+                                             'timestamp': snapshot['timestamp']})
+            self._health_body = self._encode(snapshot)
+            self._refreshed_at = time.monotonic()
+
+    # Probe answers
+    def _is_stale(self) -> bool:
+        return time.monotonic() - self._refreshed_at > self.stale_after
+
+    def live(self) -> Tuple[bytes, int]:
+        self._ensure_refresher()
+        uptime = round(time.time() - self._started_at)
+        return self._encode({'status': 'alive', 'uptime': uptime}), 200
+
+    def ready(self) -> Tuple[bytes, int]:
+        self._ensure_refresher()
+        with self._lock:
+            body, ready, stale = self._ready_body, self._ready, self._is_stale()
+        if stale and self._refreshed_at:
+            return self._encode({'status': UNHEALTHY, 'ready': False,
+                                 'error': 'health snapshot is stale'}), 503
+        return body, 200 if ready and not stale else 503
+
+    def health(self) -> Tuple[bytes, int]:
+        self._ensure_refresher()
+        with self._lock:
+            return self._health_body, 200
+
+    def history_of(self, name: str) -> List[Dict[str, Any]]:
+        check = self.checks.get(name)
+        if check is None:
+            return []
+        return [{'at': datetime.utcfromtimestamp(at).isoformat(), 'value': value, 'error': error}
+                for at, value, error in list(check.history)]
+
+
+health_monitor = HealthMonitor()
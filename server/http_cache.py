@@ -0,0 +1,190 @@
+"""
+Smart Quiz App - Conditional and Precompressed Responses
+Strong ETags from content versions, 304s before any work, cached gzip/brotli bodies
+"""
+
+import gzip
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable, Dict, Optional
+
+from flask import current_app, request
+
+import serialization
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+MIN_COMPRESS_SIZE = 512  # smaller bodies are sent as-is
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 9
+MAX_REPRESENTATIONS = 2048
+ENCODINGS = ('gzip', 'br')
+# Without Redis, workers cannot see each other's version bumps; rolling the
+# local version over bounds how long a worker can keep serving stale content
+LOCAL_VERSION_WINDOW = 60
+
+
+class ContentVersions:
+    """Monotonic version counters per content scope ('catalog', 'questions', ...).
+
+    Writers bump a scope after committing a change; readers derive ETags from
+    the current version alone, so revalidation never touches the database.
+    """
+
+    def __init__(self, prefix: str = 'smartquiz:content_version'):
+        self.prefix = prefix
+        self.redis = None
+        self._local: Dict[str, int] = {}
+        self._boot = f'{time.time_ns():x}'
+
+    def init_app(self, app, redis_client=None) -> None:
+        self.redis = redis_client
+
+    def get(self, scope: str) -> str:
+        if self.redis:
+            try:
+                return self.redis.get(f'{self.prefix}:{scope}') or '0'
+            except Exception as e:
+                logger.warning("Content version read failed for %s: %s", scope, e)
+        window = int(time.time() // LOCAL_VERSION_WINDOW)
+        return f'{self._boot}.{self._local.get(scope, 0)}.{window}'
+
+    def bump(self, *scopes: str) -> None:
+        for scope in scopes:
+            self._local[scope] = self._local.get(scope, 0) + 1
+            if self.redis:
+                try:
+                    self.redis.incr(f'{self.prefix}:{scope}')
+                except Exception as e:
+                    logger.warning("Content version bump failed for %s: %s", scope, e)
+
+
+content_versions = ContentVersions()
+
+
+def make_etag(*parts) -> str:
+    return hashlib.blake2b(':'.join(map(str, parts)).encode(), digest_size=12).hexdigest()
+
+
+def content_digest(body: Optional[bytes]) -> str:
+    """Digest of an already-encoded body, for ETags of content that has no version counter"""
+    return hashlib.blake2b(body, digest_size=12).hexdigest() if body is not None else 'missing'
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class RepresentationCache:
+    """Per-worker LRU of encoded bodies keyed by ETag; each encoding is built once"""
+
+    def __init__(self, max_entries: int = MAX_REPRESENTATIONS):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, Dict[str, bytes]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, etag: str, encoding: str) -> Optional[bytes]:
+        with self._lock:
+            variants = self._entries.get(etag)
+            if variants is None:
+                return None
+            self._entries.move_to_end(etag)
+            if encoding in variants:
+                return variants[encoding]
+            identity = variants['identity']
+        body = _compress(identity, encoding)
+        with self._lock:
+            self._entries.get(etag, {})[encoding] = body
+        return body
+
+    def put(self, etag: str, body: bytes) -> None:
+        with self._lock:
+            self._entries[etag] = {'identity': body}
+            self._entries.move_to_end(etag)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+representations = RepresentationCache()
+
+
+def negotiate_encoding(size: int) -> str:
+    if size < MIN_COMPRESS_SIZE:
+        return 'identity'
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return request.accept_encodings.best_match(offered) or 'identity'
+
+
+def representation_etag(etag: str, encoding: str) -> str:
+    """Each encoding is a different representation, so it gets its own strong ETag"""
+    return etag if encoding == 'identity' else f'{etag}-{encoding}'
+
+
+def _matching_etag(etag: str) -> Optional[str]:
+    """The If-None-Match tag naming any encoding of `etag`, None when none does"""
+    for encoding in ('identity',) + ENCODINGS:
+        candidate = representation_etag(etag, encoding)
+        if request.if_none_match.contains(candidate):
+            return candidate
+    return None
+
+
+def _not_modified(etag: str):
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.no_cache = True
+    return response
+
+
+def conditional(etag_for: Callable[..., str]):
+    """Serve a read-mostly GET endpoint with strong ETags and cached encodings.
+
+    `etag_for` receives the view's URL arguments and must be cheap (content
+    versions only). Encoded bodies are sent as `<etag>-gzip` / `<etag>-br`; an
+    If-None-Match naming any encoding of the current ETag returns 304 (with
+    the tag the client holds) before the view runs.
+    The view returns a JSON-serializable payload, or a response/tuple for
+    anything that should not be cached (errors).
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            etag = etag_for(**kwargs)
+            matched = _matching_etag(etag)
+            if matched is not None:
+                return _not_modified(matched)
+
+            body = representations.get(etag, 'identity')
+            if body is None:
+                payload = f(*args, **kwargs)
+                if isinstance(payload, (tuple, current_app.response_class)):
+                    return payload
+                body = serialization.dumps_bytes(payload)
+                representations.put(etag, body)
+
+            encoding = negotiate_encoding(len(body))
+            if encoding != 'identity':
+                encoded = representations.get(etag, encoding)
+                body, encoding = (encoded, encoding) if encoded is not None else (body, 'identity')
+
+            response = current_app.response_class(body, mimetype='application/json')
+            response.set_etag(representation_etag(etag, encoding))
+            response.vary.add('Accept-Encoding')
+            response.cache_control.no_cache = True
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+            return response
+        return decorated_function
+    return decorator
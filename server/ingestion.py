@@ -0,0 +1,314 @@
+"""
+Smart Quiz App - Analytics Event Ingestion
+Request handlers only validate and enqueue events; a drain process batch-writes them
+"""
+
+import glob
+import hashlib
+import json
+import logging
+import os
+import socket
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+from models import db, dialect_insert, AnalyticsEvent
+from sync import parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+EVENT_QUIZ_COMPLETED = 'quiz_completed'
+
+
+def scoped_event_id(event_type: str, user_id: str, client_id: str) -> str:
+    """Dedup key of a client-supplied id, per user so one account cannot shadow another's events"""
+    digest = hashlib.blake2b(f'{user_id}:{client_id}'.encode(), digest_size=16).hexdigest()
+    return f'{event_type}:{digest}'
+
+
+def validate_quiz_completed(user_id: str, data: Dict) -> Dict[str, Any]:
+    """Normalize a quiz-completed report into a queue-ready event"""
+    try:
+        quiz_id = str(data['quiz_id'])
+        client_event_id = str(data.get('event_id') or quiz_id)
+        event = {
+            'event_id': scoped_event_id(EVENT_QUIZ_COMPLETED, user_id, client_event_id),
+            'event_type': EVENT_QUIZ_COMPLETED,
+            'user_id': user_id,
+            'quiz_id': quiz_id,
+            'subject': str(data['subject']),
+            'difficulty': str(data['difficulty']),
+            'score': float(data.get('score', 0)),
+            'time_spent': int(data.get('time_spent', 0)),
+            'occurred_at': (parse_timestamp(data.get('completed_at'))
+                            or datetime.utcnow()).isoformat(),
+            'received_at': datetime.utcnow().isoformat()
+        }
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f'Invalid quiz-completed event: {e}')
+
+    if len(client_event_id) > 64 or len(quiz_id) > 36:
+        raise ValueError('Invalid quiz-completed event: id too long')
+    return event
+
+
+class RedisStreamQueue:
+    """Redis Stream with a consumer group; unacked entries are reclaimed after a timeout"""
+
+    def __init__(self, redis_client, stream: str = 'smartquiz:events',
+                 group: str = 'analytics-drain', max_length: int = 1_000_000,
+                 reclaim_idle_ms: int = 60_000):
+        self.redis = redis_client
+        self.stream = stream
+        self.group = group
+        self.max_length = max_length
+        self.reclaim_idle_ms = reclaim_idle_ms
+        self.consumer = f'{socket.gethostname()}-{os.getpid()}'
+        self._group_ready = False
+
+    def push(self, event: Dict) -> None:
+        self.redis.xadd(
+            self.stream,
+            {'event': json.dumps(event, separators=(',', ':'))},
+            maxlen=self.max_length,
+            approximate=True
+        )
+
+    def _ensure_group(self) -> None:
+        if self._group_ready:
+            return
+        try:
+            self.redis.xgroup_create(self.stream, self.group, id='0', mkstream=True)
+        except Exception as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+        self._group_ready = True
+
+    def read(self, count: int, block_ms: int = 0) -> List[Tuple[Any, Dict]]:
+        self._ensure_group()
+
+        # Entries delivered to a consumer that died before acking come back first
+        _, entries, *_ = self.redis.xautoclaim(
+            self.stream, self.group, self.consumer,
+            min_idle_time=self.reclaim_idle_ms, start_id='0-0', count=count
+        )
+        if not entries:
+            response = self.redis.xreadgroup(
+                self.group, self.consumer, {self.stream: '>'},
+                count=count, block=block_ms or None
+            )
+            entries = response[0][1] if response else []
+
+        return [(entry_id, json.loads(fields['event'])) for entry_id, fields in entries if fields]
+
+    def ack(self, ids: List[Any]) -> None:
+        if ids:
+            # Acked entries are deleted, so the stream holds only the backlog
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.xack(self.stream, self.group, *ids)
+            pipe.xdel(self.stream, *ids)
+            pipe.execute()
+
+    def depth(self) -> int:
+        """Events not yet acked: delivered-but-pending plus never delivered"""
+        return self.redis.xlen(self.stream)
+
+
+class FileQueue:
+    """Append-only segment files for hosts without Redis (single drain process).
+
+    Writers append JSON lines to the active segment. The drain seals it by
+    renaming, waits out a short grace period for in-flight appends, then
+    reads from a checkpointed offset and deletes segments once fully acked.
+    A sealed segment gets no more appends, so a final line without a newline
+    (a writer killed mid-write) ends it; that line and any line that is not
+    JSON are moved to quarantine.log and skipped.
+    """
+
+    ACTIVE = 'active.log'
+    QUARANTINE = 'quarantine.log'
+
+    def __init__(self, directory: str, seal_grace: float = 1.0):
+        self.directory = directory
+        self.seal_grace = seal_grace
+        os.makedirs(directory, exist_ok=True)
+
+    def push(self, event: Dict) -> None:
+        line = json.dumps(event, separators=(',', ':')) + '\n'
+        # O_APPEND keeps concurrent single-line writes from different workers intact
+        with open(os.path.join(self.directory, self.ACTIVE), 'a', encoding='utf-8') as f:
+            f.write(line)
+
+    def _sealed_segments(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.directory, 'segment-*.log')))
+
+    def _seal_active(self) -> None:
+        active = os.path.join(self.directory, self.ACTIVE)
+        if os.path.exists(active) and os.path.getsize(active) > 0:
+            os.replace(active, os.path.join(self.directory, f'segment-{time.time_ns()}.log'))
+
+    def _checkpoint(self, segment: str) -> int:
+        try:
+            with open(segment + '.offset') as f:
+                return int(f.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def read(self, count: int, block_ms: int = 0) -> List[Tuple[Any, Dict]]:
+        segments = self._sealed_segments()
+        if not segments:
+            self._seal_active()
+            if block_ms:
+                time.sleep(min(block_ms / 1000, self.seal_grace))
+            return []
+
+        segment = segments[0]
+        sealed_at = int(os.path.basename(segment)[len('segment-'):-len('.log')]) / 1e9
+        settle = self.seal_grace - (time.time() - sealed_at)
+        if settle > 0:
+            if block_ms:
+                time.sleep(min(block_ms / 1000, settle))
+            return []
+
+        messages = []
+        position = skipped_to = self._checkpoint(segment)
+        with open(segment, 'rb') as f:
+            f.seek(position)
+            while len(messages) < count:
+                line = f.readline()
+                if not line:
+                    break
+                if line.endswith(b'\n'):
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        event = None
+                else:
+                    event = None  # torn final line
+                position = f.tell()
+                if event is None:
+                    self._quarantine(segment, line)
+                    skipped_to = position
+                    continue
+                messages.append(((segment, position), event))
+
+        if messages:
+            if skipped_to > messages[-1][0][1]:
+                # Acking the last event also acks the skipped lines after it
+                messages[-1] = ((segment, skipped_to), messages[-1][1])
+        elif position >= os.path.getsize(segment):
+            self._drop(segment)
+        elif skipped_to > self._checkpoint(segment):
+            self._save_checkpoint(segment, skipped_to)
+        return messages
+
+    def _quarantine(self, segment: str, line: bytes) -> None:
+        logger.warning("Quarantining unreadable analytics event in %s (%s bytes)",
+                       os.path.basename(segment), len(line))
+        with open(os.path.join(self.directory, self.QUARANTINE), 'ab') as f:
+            f.write(line if line.endswith(b'\n') else line + b'\n')
+
+    def _save_checkpoint(self, segment: str, offset: int) -> None:
+        tmp = f'{segment}.offset.tmp'
+        with open(tmp, 'w') as f:
+            f.write(str(offset))
+        os.replace(tmp, segment + '.offset')
+
+    def ack(self, ids: List[Any]) -> None:
+        offsets = {}
+        for segment, offset in ids:
+            offsets[segment] = max(offset, offsets.get(segment, 0))
+        for segment, offset in offsets.items():
+            if offset >= os.path.getsize(segment):
+                self._drop(segment)
+                continue
+            self._save_checkpoint(segment, offset)
+
+    def _drop(self, segment: str) -> None:
+        for path in (segment, segment + '.offset'):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def depth(self) -> int:
+        """Events written but not yet acked (lines past each segment's checkpoint)"""
+        events = 0
+        for path in self._sealed_segments() + [os.path.join(self.directory, self.ACTIVE)]:
+            try:
+                with open(path, 'rb') as f:
+                    f.seek(self._checkpoint(path))
+                    for chunk in iter(lambda: f.read(1 << 20), b''):
+                        events += chunk.count(b'\n')
+            except FileNotFoundError:
+                continue
+        return events
+
+
+def create_queue(redis_client, queue_dir: str):
+    """Redis Stream when Redis is reachable, file-backed queue otherwise"""
+    if redis_client:
+        return RedisStreamQueue(redis_client)
+    logger.info("Redis unavailable, buffering analytics events in %s", queue_dir)
+    return FileQueue(queue_dir)
+
+
+def _event_row(event: Dict) -> Dict[str, Any]:
+    row = {column: event.get(column) for column in AnalyticsEvent.__table__.columns.keys()}
+    row['occurred_at'] = parse_timestamp(event['occurred_at'])
+    row['received_at'] = parse_timestamp(event['received_at'])
+    return row
+
+
+class AnalyticsDrain:
+    """Consumer that moves queued events into analytics_events in batches.
+
+    Events are acked only after their batch commits (at-least-once); replays
+    are absorbed by the event_id primary key.
+    """
+
+    def __init__(self, queue, flush_size: int = 500, flush_interval: float = 1.0):
+        self.queue = queue
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+
+    def flush_once(self) -> int:
+        """Collect up to flush_size events or until flush_interval elapses, then write them"""
+        deadline = time.monotonic() + self.flush_interval
+        messages = []
+        while len(messages) < self.flush_size:
+            remaining_ms = int((deadline - time.monotonic()) * 1000)
+            if remaining_ms <= 0:
+                break
+            messages.extend(self.queue.read(self.flush_size - len(messages), block_ms=remaining_ms))
+
+        if not messages:
+            return 0
+
+        rows = {}
+        for _, event in messages:
+            try:
+                rows[event['event_id']] = _event_row(event)
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning("Dropping malformed analytics event: %s", e)
+
+        if rows:
+            db.session.execute(
+                dialect_insert(AnalyticsEvent).on_conflict_do_nothing(index_elements=['event_id']),
+                list(rows.values())
+            )
+            db.session.commit()
+        self.queue.ack([message_id for message_id, _ in messages])
+        return len(rows)
+
+    def run(self, should_stop=lambda: False) -> None:
+        while not should_stop():
+            try:
+                written = self.flush_once()
+                if written:
+                    logger.info("Flushed %s analytics events", written)
+            except Exception as e:
+                db.session.rollback()
+                logger.error("Analytics drain failed, retrying: %s", e)
+                time.sleep(self.flush_interval)
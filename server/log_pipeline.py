@@ -0,0 +1,285 @@
+"""
+Smart Quiz App - Logging Pipeline
+Request threads only enqueue records; one listener thread formats and writes them
+"""
+
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, Optional, Tuple
+
+from flask import g, has_request_context, request
+
+try:
+    import orjson
+except ImportError:  # optional: stdlib json is fine, just slower
+    orjson = None
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+_REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._:-]{1,64}$')
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {
+    'message', 'asctime', 'request_id', 'sampled_dropped'
+}
+# Args of these types cannot change after the call, so rendering them can wait for the listener
+_IMMUTABLE_ARGS = (str, int, float, bool, type(None), bytes)
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'
+
+
+def current_request_id() -> str:
+    if has_request_context():
+        return getattr(g, 'request_id', '-')
+    return '-'
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamps the request id on the record while still on the request's thread"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, 'request_id'):
+            record.request_id = current_request_id()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Token bucket per (logger, message template) for INFO and below.
+
+    Each template may emit `rate` records per second (bursting to `burst`);
+    the rest are dropped before they reach the queue. The next record that
+    gets through carries `sampled_dropped`, the number skipped since the
+    last one. WARNING and above always pass.
+    """
+
+    MAX_KEYS = 4096
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst or max(rate, 1.0)
+        self._buckets: Dict[Tuple[str, Any], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate <= 0 or record.levelno > logging.INFO:
+            return True
+        key = (record.name, record.msg if isinstance(record.msg, str) else type(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.MAX_KEYS:
+                    self._buckets.clear()  # runaway templates (f-strings); start over
+                bucket = self._buckets[key] = [self.burst, now, 0]
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if tokens < 1:
+                bucket[0] = tokens
+                bucket[2] += 1
+                return False
+            bucket[0] = tokens - 1
+            dropped, bucket[2] = bucket[2], 0
+        if dropped:
+            record.sampled_dropped = dropped
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, request_id, extras, exc"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        created = datetime.utcfromtimestamp(record.created)
+        payload = {
+            'ts': created.isoformat(timespec='milliseconds') + 'Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'request_id': getattr(record, 'request_id', '-'),
+        }
+        if getattr(record, 'sampled_dropped', 0):
+            payload['sampled_dropped'] = record.sampled_dropped
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload['exc'] = record.exc_text
+        if record.stack_info:
+            payload['stack'] = self.formatStack(record.stack_info)
+        if orjson is not None:
+            try:
+                return orjson.dumps(payload, default=str).decode('utf-8')
+            except TypeError:
+                pass
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class LazyQueueHandler(QueueHandler):
+    """Enqueues records without rendering them.
+
+    The stdlib handler formats every record on the caller's thread; here
+    only tracebacks (which pin frames) and mutable args (which the caller
+    may change) are rendered up front, and the message itself is built by
+    the listener. A full queue drops the record instead of blocking the
+    request. Threads do not survive fork, so a worker that inherits the
+    handler from a preloading master starts its own queue and listener on
+    its first record.
+    """
+
+    def __init__(self, pipeline: 'LogPipeline'):
+        super().__init__(pipeline.queue)
+        self.pipeline = pipeline
+        self.dropped = 0
+        self._exc_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self._exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        args = record.args
+        immutable = isinstance(args, tuple) and all(isinstance(a, _IMMUTABLE_ARGS) for a in args)
+        if args and not immutable:
+            record.msg, record.args = record.getMessage(), None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if self.pipeline.pid != os.getpid():
+            self.pipeline.restart()
+        super().emit(record)
+
+
+class LogPipeline:
+    """Root logging through a bounded queue drained by a listener thread.
+
+    The listener owns the stdout handler and the optional rotating file
+    handler, so slow disks or pipes never stall a request. Records carry
+    the request id from `X-Request-ID` (or a generated one), which is also
+    echoed on the response.
+    """
+
+    def __init__(self):
+        self.queue: queue.Queue = queue.Queue()
+        self.handler: Optional[LazyQueueHandler] = None
+        self.listener: Optional[QueueListener] = None
+        self.outputs = []
+        self.pid = None
+        self.queue_size = 10000
+        self._lock = threading.Lock()
+        self._atexit = False
+
+    def init_app(self, app) -> None:
+        config = app.config
+        self.stop()
+        self.queue_size = config.get('LOG_QUEUE_SIZE', self.queue_size)
+        if config.get('LOG_FORMAT', 'json') == 'json':
+            formatter = JsonFormatter()
+        else:
+            formatter = logging.Formatter(TEXT_FORMAT)
+
+        stdout = logging.StreamHandler(sys.stdout)
+        stdout.setFormatter(formatter)
+        self.outputs = [stdout]
+        log_file = config.get('LOG_FILE')
+        if log_file:
+            os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+            file_handler = RotatingFileHandler(log_file,
+                                               maxBytes=config.get('LOG_FILE_MAX_BYTES', 10240000),
+                                               backupCount=config.get('LOG_FILE_BACKUPS', 10))
+            file_handler.setFormatter(formatter)
+            self.outputs.append(file_handler)
+
+        self.queue = queue.Queue(self.queue_size)
+        self.handler = LazyQueueHandler(self)
+        # Sampling runs before request ids so dropped records cost as little as possible
+        self.handler.addFilter(SamplingFilter(config.get('LOG_SAMPLE_RATE', 0)))
+        self.handler.addFilter(RequestIdFilter())
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(self.handler)
+        root.setLevel(config.get('LOG_LEVEL', 'INFO'))
+        # Flask's own stderr handler would write synchronously and twice
+        from flask.logging import default_handler
+        app.logger.removeHandler(default_handler)
+
+        self.start()
+        if not self._atexit:
+            atexit.register(self.stop)
+            self._atexit = True
+
+        app.before_request(self._assign_request_id)
+        app.after_request(self._echo_request_id)
+
+    # Listener
+    def start(self) -> None:
+        with self._lock:
+            self.listener = QueueListener(self.queue, *self.outputs, respect_handler_level=True)
+            self.listener.start()
+            self.pid = os.getpid()
+
+    def restart(self) -> None:
+        """After fork: the inherited queue's locks and listener thread belong to the parent"""
+        with self._lock:
+            if self.pid == os.getpid():
+                return
+            self.queue = queue.Queue(self.queue_size)
+            self.handler.queue = self.queue
+            self.listener = QueueListener(self.queue, *self.outputs, respect_handler_level=True)
+            self.listener.start()
+            self.pid = os.getpid()
+
+    def stop(self) -> None:
+        """Drain what is queued and stop the listener (at exit or before reconfiguring)"""
+        with self._lock:
+            listener, self.listener = self.listener, None
+        if listener is not None and self.pid == os.getpid():
+            try:
+                listener.stop()
+            except Exception:
+                pass
+        for output in self.outputs:
+            try:
+                output.flush()
+            except (OSError, ValueError):
+                pass  # stream already closed at interpreter exit (e.g. captured by a test runner)
+
+    def depth(self) -> int:
+        return self.queue.qsize()
+
+    def stats(self) -> Dict[str, int]:
+        return {'queued': self.depth(), 'dropped': self.handler.dropped if self.handler else 0}
+
+    # Request ids
+    @staticmethod
+    def _assign_request_id() -> None:
+        incoming = request.headers.get(REQUEST_ID_HEADER, '')
+        g.request_id = incoming if _REQUEST_ID_RE.match(incoming) else uuid.uuid4().hex
+
+    @staticmethod
+    def _echo_request_id(response):
+        response.headers.setdefault(REQUEST_ID_HEADER, current_request_id())
+        return response
+
+
+log_pipeline = LogPipeline()
@@ -0,0 +1,205 @@
+"""
+Smart Quiz App - Management Commands
+Maintenance jobs run next to the API server: python manage.py <command>
+"""
+
+import logging
+import time
+
+import click
+
+from app import create_app
+from adaptive import adaptive_selector
+from cache_warmer import cache_warmer
+from counters import question_counters
+from http_cache import content_versions
+from models import db
+import bank_transfer
+import calibration
+import ingestion
+import packs
+import question_bank
+import rollups
+
+logger = logging.getLogger(__name__)
+
+app = create_app()
+
+
+@click.group()
+def cli():
+    """Smart Quiz maintenance commands"""
+
+
+@cli.command('create-tables')
+def create_tables():
+    """Create any missing database tables"""
+    with app.app_context():
+        db.create_all()
+    click.echo('Database tables created')
+
+
+@cli.command('backfill-rollups')
+@click.option('--user-id', default=None, help='Only rebuild rollups for this user')
+def backfill_rollups(user_id):
+    """Rebuild daily statistics rollups from the quizzes table"""
+    with app.app_context():
+        written = rollups.backfill(user_id)
+    click.echo(f'Rebuilt {written} rollup buckets')
+
+
+@cli.command('drain-analytics')
+@click.option('--once', is_flag=True, help='Flush a single batch and exit')
+def drain_analytics(once):
+    """Batch-write queued analytics events into the database"""
+    drain = ingestion.AnalyticsDrain(
+        app.extensions['smartquiz']['analytics_queue'],
+        flush_size=app.config['ANALYTICS_FLUSH_SIZE'],
+        flush_interval=app.config['ANALYTICS_FLUSH_INTERVAL']
+    )
+    with app.app_context():
+        if once:
+            click.echo(f'Flushed {drain.flush_once()} events')
+        else:
+            drain.run()
+
+
+@cli.command('flush-counters')
+@click.option('--interval', type=float, default=None,
+              help='Keep flushing every INTERVAL seconds instead of once')
+def flush_counters(interval):
+    """Apply buffered question served/answered/correct counters to the questions table"""
+    with app.app_context():
+        while True:
+            started = time.perf_counter()
+            updated = question_counters.flush()
+            click.echo(f'Updated {updated} questions in {time.perf_counter() - started:.2f}s')
+            if interval is None:
+                break
+            time.sleep(interval)
+
+
+@cli.command('calibrate')
+@click.option('--iterations', type=int, default=10, help='Maximum fitting iterations')
+def calibrate(iterations):
+    """Refit question difficulty/discrimination and user ability from the answer log"""
+    with app.app_context():
+        report = calibration.calibrate(iterations)
+    click.echo(
+        f"Calibrated {report['questions']} questions and {report['users']} users "
+        f"from {report['responses']} responses in {report['seconds']}s"
+    )
+
+
+@cli.command('build-buckets')
+def build_buckets():
+    """Re-bucket the question bank by calibrated difficulty for adaptive selection"""
+    with app.app_context():
+        total = adaptive_selector.rebuild()
+    click.echo(f'Bucketed {total} active questions')
+
+
+@cli.command('build-bank')
+@click.option('--output', default=None, help='Bank file (defaults to QUESTION_BANK_PATH)')
+@click.option('--top', type=int, default=None,
+              help='Only the N most served subject/difficulty pairs')
+def build_bank(output, top):
+    """Snapshot active questions into the memory-mapped bank file; workers remap it themselves"""
+    started = time.perf_counter()
+    with app.app_context():
+        report = question_bank.build_bank(output or app.config['QUESTION_BANK_PATH'],
+                                          top_groups=top)
+    content_versions.bump('questions')
+    click.echo(f"Wrote {report['count']} questions in {report['groups']} groups "
+               f"({report['bytes'] / 1e6:.1f} MB) in {time.perf_counter() - started:.2f}s")
+
+
+@cli.command('warm-cache')
+@click.option('--budget', type=float, default=None,
+              help='Seconds to spend (defaults to CACHE_WARM_BUDGET)')
+@click.option('--concurrency', type=int, default=None,
+              help='Keys warmed at once (defaults to CACHE_WARM_CONCURRENCY)')
+@click.option('--top', type=int, default=None,
+              help='Hottest keys to warm (defaults to CACHE_WARM_TOP)')
+@click.option('--show', is_flag=True, help='List the recorded hot keys without warming')
+def warm_cache(budget, concurrency, top, show):
+    """Fill the shared question pools from the bank for the hottest recorded generate requests"""
+    with app.app_context():
+        if show:
+            for (subject, difficulty, topics, count), score in cache_warmer.hot_keys(top):
+                topic_list = ','.join(topics) or '-'
+                click.echo(f"{score:10.1f}  {subject}/{difficulty} x{count} {topic_list}")
+            return
+        if not cache_warmer.redis:
+            click.echo('Redis is not available: pools are per worker, '
+                       'which warm themselves on startup')
+            return
+        report = cache_warmer.warm(budget=budget, concurrency=concurrency, limit=top)
+    if not report['shared'] and report['keys']:
+        click.echo('Another process is warming the pools')
+    click.echo(f"Warmed {report['warmed']}/{report['keys']} keys "
+               f"with {report['questions']} questions ({report['skipped']} skipped, "
+               f"{report['failed']} failed) in {report['seconds']:.2f}s")
+
+
+@cli.command('build-packs')
+@click.option('--output', default=None, help='Pack directory (defaults to CONTENT_PACKS_DIR)')
+def build_packs(output):
+    """Export changed subject/difficulty question packs with deltas and rewrite the manifest"""
+    started = time.perf_counter()
+    with app.app_context():
+        report = packs.build_packs(output or app.config['CONTENT_PACKS_DIR'])
+    click.echo(
+        f"Built {report['built']} packs ({report['unchanged']} unchanged, "
+        f"{report['questions']} questions, {report['pruned_files']} old files pruned) "
+        f"in {time.perf_counter() - started:.2f}s"
+    )
+
+
+@cli.command('import-questions')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['jsonl', 'csv']), default=None,
+              help='Input format (default: from the file extension, .gz allowed)')
+@click.option('--chunk', type=int, default=bank_transfer.IMPORT_CHUNK,
+              help='Rows per bulk insert')
+@click.option('--restart', is_flag=True, help='Ignore any checkpoint and read from the start')
+def import_questions(path, fmt, chunk, restart):
+    """Bulk-load questions from JSONL/CSV, skipping content already in the bank"""
+    with app.app_context():
+        hashed = bank_transfer.backfill_content_hashes()
+        if hashed:
+            click.echo(f'Hashed {hashed} existing questions')
+        report = bank_transfer.import_questions(path, fmt, chunk=chunk, resume=not restart,
+                                                progress=click.echo)
+    if report['inserted']:
+        # Bulk inserts bypass the ORM hooks; workers rescan
+        content_versions.bump('catalog', 'questions')
+    rate = report['read'] / report['seconds'] if report['seconds'] else 0
+    click.echo(
+        f"Read {report['read']} rows: {report['inserted']} inserted, "
+        f"{report['duplicates']} duplicates, {report['invalid']} invalid "
+        f"in {report['seconds']}s ({rate:,.0f} rows/s)"
+    )
+
+
+@cli.command('export-questions')
+@click.argument('output_dir', type=click.Path(file_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['jsonl', 'csv']), default='jsonl')
+@click.option('--subject', 'subjects', multiple=True,
+              help='Only export these subjects (repeatable)')
+@click.option('--difficulty', default=None, help='Only export this difficulty')
+@click.option('--processes', type=int, default=None,
+              help='Worker processes (default: CPU count)')
+@click.option('--gzip', 'compress', is_flag=True, help='Write .gz files')
+def export_questions(output_dir, fmt, subjects, difficulty, processes, compress):
+    """Stream active questions to one JSONL/CSV file per subject"""
+    report = bank_transfer.export_questions(app, output_dir, fmt, list(subjects), difficulty,
+                                            processes, compress, progress=click.echo)
+    click.echo(
+        f"Exported {report['rows']} questions to {len(report['files'])} files "
+        f"in {report['seconds']}s ({report['rows_per_second']:,} rows/s)"
+    )
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,183 @@
+"""
+Smart Quiz App - Database Models
+SQLAlchemy models shared by the API server, background jobs and management commands
+"""
+
+from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
+import hashlib
+import json
+import uuid
+
+db = SQLAlchemy()
+
+
+# Database Models
+class User(db.Model):
+    __tablename__ = 'users'
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    username = db.Column(db.String(80), unique=True, nullable=False, index=True)
+    email = db.Column(db.String(120), unique=True, nullable=False, index=True)
+    password_hash = db.Column(db.String(255), nullable=False)
+    display_name = db.Column(db.String(100), nullable=False)
+    avatar_url = db.Column(db.String(255))
+    level = db.Column(db.Integer, default=1)
+    total_xp = db.Column(db.Integer, default=0)
+    current_streak = db.Column(db.Integer, default=0)
+    longest_streak = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    last_active_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    is_active = db.Column(db.Boolean, default=True)
+    ability = db.Column(db.Float, default=0.0)  # calibrated IRT ability (theta)
+
+    # Relationships
+    quizzes = db.relationship('Quiz', backref='user', lazy='dynamic', cascade='all, delete-orphan')
+
+
+class Quiz(db.Model):
+    __tablename__ = 'quizzes'
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True)
+    subject = db.Column(db.String(50), nullable=False, index=True)
+    difficulty = db.Column(db.String(20), nullable=False, index=True)
+    total_questions = db.Column(db.Integer, nullable=False)
+    correct_answers = db.Column(db.Integer, default=0)
+    score = db.Column(db.Float, default=0.0)
+    percentage = db.Column(db.Float, default=0.0)
+    time_spent = db.Column(db.Integer, default=0)  # milliseconds
+    time_limit = db.Column(db.Integer, default=900)  # seconds
+    ai_feedback = db.Column(db.Text)
+    suggestions = db.Column(db.JSON)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    completed_at = db.Column(db.DateTime, index=True)
+    is_completed = db.Column(db.Boolean, default=False, index=True)
+    synced_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # delta sync watermark
+    # 'metadata' is reserved on declarative models, so map it under another attribute
+    quiz_metadata = db.Column('metadata', db.JSON)
+
+
+class Question(db.Model):
+    __tablename__ = 'questions'
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    subject = db.Column(db.String(50), nullable=False, index=True)
+    difficulty = db.Column(db.String(20), nullable=False, index=True)
+    question_type = db.Column(db.String(30), default='multiple_choice')
+    question_text = db.Column(db.Text, nullable=False)
+    options = db.Column(db.JSON, nullable=False)  # List of options
+    correct_answer_index = db.Column(db.Integer, nullable=False)
+    explanation = db.Column(db.Text)
+    hints = db.Column(db.JSON, default=list)  # List of hints
+    tags = db.Column(db.JSON, default=list)  # List of tags
+    points = db.Column(db.Integer, default=1)
+    time_limit = db.Column(db.Integer)  # seconds
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    created_by = db.Column(db.String(20), default='ai')  # 'ai' or 'human'
+    source = db.Column(db.String(50), default='ai_generated')
+    is_active = db.Column(db.Boolean, default=True, index=True)
+    usage_count = db.Column(db.Integer, default=0)
+    answer_count = db.Column(db.Integer, default=0)
+    success_rate = db.Column(db.Float, default=0.0)  # fraction of answers that were correct
+    difficulty_score = db.Column(db.Float)  # self-reported by the generating model, 0..1
+    irt_difficulty = db.Column(db.Float, index=True)  # calibrated IRT difficulty (b)
+    irt_discrimination = db.Column(db.Float, default=1.0)  # calibrated IRT discrimination (a)
+    content_hash = db.Column(db.String(64), index=True)  # question_content_hash, dedups imports
+
+    def to_payload(self) -> dict:
+        """Client-facing question payload, same shape as freshly generated questions"""
+        return {
+            'id': self.id,
+            'subject': self.subject,
+            'difficulty': self.difficulty,
+            'question_type': self.question_type,
+            'question_text': self.question_text,
+            'options': self.options,
+            'correct_answer_index': self.correct_answer_index,
+            'explanation': self.explanation or '',
+            'hints': self.hints or [],
+            'tags': self.tags or [],
+            'points': self.points,
+            'time_limit': self.time_limit
+        }
+
+
+class UserDailyStat(db.Model):
+    """Daily per-user, per-subject rollup of completed quizzes"""
+    __tablename__ = 'user_daily_stats'
+
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    subject = db.Column(db.String(50), primary_key=True)
+    quizzes = db.Column(db.Integer, nullable=False, default=0)
+    questions = db.Column(db.Integer, nullable=False, default=0)
+    correct = db.Column(db.Integer, nullable=False, default=0)
+    time_spent = db.Column(db.BigInteger, nullable=False, default=0)  # milliseconds
+
+
+class QuizAnswer(db.Model):
+    """Per-question answer recorded for a completed quiz"""
+    __tablename__ = 'quiz_answers'
+
+    quiz_id = db.Column(db.String(36), db.ForeignKey('quizzes.id'), primary_key=True)
+    question_id = db.Column(db.String(36), primary_key=True)
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True)
+    selected_answer_index = db.Column(db.Integer)  # None when skipped
+    is_correct = db.Column(db.Boolean, nullable=False, default=False)
+    time_spent = db.Column(db.Integer, default=0)  # milliseconds
+    answered_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class AnalyticsEvent(db.Model):
+    """Append-only analytics event written in batches by the ingestion drain"""
+    __tablename__ = 'analytics_events'
+
+    event_id = db.Column(db.String(64), primary_key=True)
+    event_type = db.Column(db.String(50), nullable=False, index=True)
+    user_id = db.Column(db.String(36), nullable=False, index=True)
+    quiz_id = db.Column(db.String(36), index=True)
+    subject = db.Column(db.String(50))
+    difficulty = db.Column(db.String(20))
+    score = db.Column(db.Float)
+    time_spent = db.Column(db.BigInteger)  # milliseconds
+    occurred_at = db.Column(db.DateTime, nullable=False, index=True)
+    received_at = db.Column(db.DateTime, nullable=False)
+    payload = db.Column(db.JSON)
+
+
+class ReviewItem(db.Model):
+    """Spaced-repetition state of one question for one user (SM-2)"""
+    __tablename__ = 'review_items'
+    __table_args__ = (
+        db.Index('ix_review_items_user_due', 'user_id', 'due_at'),
+    )
+
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), primary_key=True)
+    question_id = db.Column(db.String(36), primary_key=True)
+    ease = db.Column(db.Float, nullable=False, default=2.5)
+    interval_days = db.Column(db.Float, nullable=False, default=0.0)
+    repetitions = db.Column(db.Integer, nullable=False, default=0)
+    lapses = db.Column(db.Integer, nullable=False, default=0)
+    due_at = db.Column(db.DateTime, nullable=False)
+    last_reviewed_at = db.Column(db.DateTime)
+
+
+# Query Helpers
+def question_content_hash(subject, question_text, options) -> str:
+    """Identity of a question's content, insensitive to case and whitespace"""
+    def normalize(text) -> str:
+        return ' '.join(str(text).split()).lower()
+
+    canonical = json.dumps([subject, normalize(question_text), [normalize(o) for o in options]],
+                           ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def dialect_insert(model):
+    """INSERT construct supporting ON CONFLICT for the bound database dialect"""
+    if db.engine.dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    return insert(model.__table__)
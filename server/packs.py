@@ -0,0 +1,196 @@
+"""
+Smart Quiz App - Offline Content Packs
+Versioned, content-hashed question bundles per subject/difficulty with deltas between versions
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from werkzeug.utils import secure_filename
+
+from models import db, Question
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+KEEP_VERSIONS = 5  # older packs and deltas are pruned
+GZIP_LEVEL = 9
+LOAD_CHUNK = 10_000
+
+
+def _canonical(value: Any) -> bytes:
+    """Stable encoding used for hashing and for pack bodies"""
+    return json.dumps(value, sort_keys=True, separators=(',', ':'),
+                      ensure_ascii=False).encode('utf-8')
+
+
+def file_slug(value: str) -> str:
+    """Safe file name for a subject or difficulty; altered names get a hash suffix"""
+    slug = secure_filename(value)
+    if slug != value:
+        slug = f"{slug or 'x'}-{hashlib.sha256(value.encode('utf-8')).hexdigest()[:8]}"
+    return slug
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as fh:
+        fh.write(data)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+
+
+def load_manifest(packs_dir: str) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(packs_dir, MANIFEST_NAME), 'rb') as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return {'packs': {}}
+
+
+def read_pack(packs_dir: str, filename: str) -> Dict[str, Any]:
+    with gzip.open(os.path.join(packs_dir, filename), 'rb') as fh:
+        return json.load(fh)
+
+
+def _iter_groups() -> Iterator[Tuple[Tuple[str, str], Dict[str, bytes]]]:
+    """Active questions grouped by (subject, difficulty), as canonical bytes keyed by id"""
+    result = db.session.execute(
+        db.select(Question)
+        .where(Question.is_active.is_(True))
+        .order_by(Question.subject, Question.difficulty, Question.id)
+        .execution_options(yield_per=LOAD_CHUNK)
+    ).scalars()
+
+    group, items = None, {}
+    for question in result:
+        key = (question.subject, question.difficulty)
+        if key != group:
+            if group is not None:
+                yield group, items
+            group, items = key, {}
+        items[question.id] = _canonical(question.to_payload())
+        db.session.expunge(question)
+    if group is not None:
+        yield group, items
+
+
+def _join(items: Dict[str, bytes]) -> bytes:
+    return b'[' + b','.join(items.values()) + b']'
+
+
+def _write_pack(packs_dir: str, folder: str, header: Dict[str, Any], body: bytes,
+                digest: str) -> Tuple[str, int]:
+    """Gzip a pack object around an already-encoded `questions` array"""
+    head = _canonical(header)
+    data = gzip.compress(head[:-1] + b',"questions":' + body + b'}',
+                         compresslevel=GZIP_LEVEL, mtime=0)
+    filename = f"{folder}/{header['kind']}-{header['version']}-{digest[:16]}.json.gz"
+    _atomic_write(os.path.join(packs_dir, filename), data)
+    return filename, len(data)
+
+
+def _build_group(packs_dir: str, subject: str, difficulty: str, items: Dict[str, bytes],
+                 previous: Optional[Dict[str, Any]], built_at: str) -> Optional[Dict[str, Any]]:
+    body = _join(items)
+    digest = hashlib.sha256(body).hexdigest()
+    if previous and previous['sha256'] == digest:
+        return None
+
+    folder = f'{file_slug(subject)}/{file_slug(difficulty)}'
+    version = previous['version'] + 1 if previous else 1
+    filename, size = _write_pack(packs_dir, folder, {
+        'kind': 'full', 'subject': subject, 'difficulty': difficulty,
+        'version': version, 'sha256': digest, 'built_at': built_at
+    }, body, digest)
+
+    entry = {
+        'subject': subject,
+        'difficulty': difficulty,
+        'version': version,
+        'sha256': digest,
+        'file': filename,
+        'size': size,
+        'question_count': len(items),
+        'built_at': built_at,
+        'deltas': []
+    }
+    if not previous:
+        return entry
+
+    # Question-level delta from the previous version: changed/new payloads plus removed ids
+    old = {q['id']: _canonical(q) for q in read_pack(packs_dir, previous['file'])['questions']}
+    upserted = {qid: raw for qid, raw in items.items() if old.get(qid) != raw}
+    removed = [qid for qid in old if qid not in items]
+    header = {
+        'kind': 'delta', 'subject': subject, 'difficulty': difficulty,
+        'from_version': previous['version'], 'version': version, 'sha256': digest,
+        'removed': removed, 'built_at': built_at
+    }
+    delta_body = _join(upserted)
+    delta_digest = hashlib.sha256(_canonical(header) + delta_body).hexdigest()
+    delta_file, delta_size = _write_pack(packs_dir, folder, header, delta_body, delta_digest)
+    deltas = [d for d in previous.get('deltas', []) if d['to'] > version - KEEP_VERSIONS]
+    entry['deltas'] = deltas + [{'from': previous['version'], 'to': version,
+                                 'file': delta_file, 'size': delta_size,
+                                 'upserted': len(upserted), 'removed': len(removed)}]
+    return entry
+
+
+def _prune(packs_dir: str, manifest: Dict[str, Any]) -> int:
+    """Remove packs and deltas older than the retained versions, or of groups that are gone.
+
+    Old files are kept for KEEP_VERSIONS so clients holding a manifest from
+    just before a rebuild can still download what it points to.
+    """
+    removed = 0
+    folders = {os.path.dirname(entry['file']): entry for entry in manifest['packs'].values()}
+    for root, _, files in os.walk(packs_dir):
+        entry = folders.get(os.path.relpath(root, packs_dir).replace(os.sep, '/'))
+        for filename in files:
+            parts = filename.split('-')
+            if len(parts) < 3 or not parts[1].isdigit():
+                continue
+            if entry and int(parts[1]) > entry['version'] - KEEP_VERSIONS:
+                continue
+            os.remove(os.path.join(root, filename))
+            removed += 1
+    return removed
+
+
+def build_packs(packs_dir: str) -> Dict[str, Any]:
+    """Rebuild changed packs and write the manifest last, so readers never see missing files"""
+    manifest = load_manifest(packs_dir)
+    packs = dict(manifest.get('packs', {}))
+    built_at = datetime.utcnow().isoformat()
+    report = {'built': 0, 'unchanged': 0, 'removed_groups': 0, 'questions': 0}
+
+    seen = set()
+    for (subject, difficulty), items in _iter_groups():
+        name = f'{subject}/{difficulty}'
+        seen.add(name)
+        report['questions'] += len(items)
+        entry = _build_group(packs_dir, subject, difficulty, items, packs.get(name), built_at)
+        if entry is None:
+            report['unchanged'] += 1
+            continue
+        packs[name] = entry
+        report['built'] += 1
+        logger.info("Built pack %s v%s (%s questions, %s bytes)",
+                    name, entry['version'], entry['question_count'], entry['size'])
+
+    for name in [n for n in packs if n not in seen]:
+        del packs[name]
+        report['removed_groups'] += 1
+
+    manifest = {'built_at': built_at, 'packs': packs}
+    _atomic_write(os.path.join(packs_dir, MANIFEST_NAME), _canonical(manifest))
+    report['pruned_files'] = _prune(packs_dir, manifest)
+    return report
@@ -0,0 +1,96 @@
+"""
+Smart Quiz App - Password Hashing Pool
+Slow KDF work runs in a bounded process pool so request threads never burn CPU on it
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from typing import Optional
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+
+
+class HasherBusy(Exception):
+    """Too many hashes queued or one timed out; the caller should ask the client to retry"""
+
+
+class PasswordHasher:
+    """Hash/verify through a per-worker process pool with a cap on queued jobs.
+
+    The cost is the werkzeug method string (PASSWORD_HASH_METHOD), e.g.
+    'scrypt:32768:8:1' or 'pbkdf2:sha256:600000'. With PASSWORD_HASH_WORKERS
+    set to 0 hashing runs inline, which is what tests and scripts want.
+    """
+
+    def __init__(self):
+        self.method = DEFAULT_METHOD
+        self.workers = 2
+        self.max_pending = 64
+        self.timeout = 10.0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_pid = None
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._dummy_hash = None
+
+    def init_app(self, app) -> None:
+        self.method = app.config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', 2)
+        self.max_pending = app.config.get('PASSWORD_HASH_MAX_PENDING', 64)
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', 10.0)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+
+    def _executor(self) -> ProcessPoolExecutor:
+        # Pools do not survive fork, so each server worker starts its own on first use
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            future = self._executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is held until the job finishes, not just until this caller
+        # stops waiting, so timed-out jobs still count against max_pending
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            logger.warning("Password hash took longer than %ss", self.timeout)
+            raise HasherBusy()
+
+    def hash(self, password: str) -> str:
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash: Optional[str], password: str) -> bool:
+        if not password_hash:
+            # Unknown account: still pay for one KDF so timing does not reveal it
+            if self._dummy_hash is None:
+                self._dummy_hash = self.hash(os.urandom(16).hex())
+            password_hash = self._dummy_hash
+            self._run(check_password_hash, password_hash, password)
+            return False
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """Hash was made with a different method/cost than currently configured"""
+        return not password_hash.startswith(self.method + '$')
+
+
+password_hasher = PasswordHasher()
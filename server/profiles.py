@@ -0,0 +1,222 @@
+"""
+Smart Quiz App - User Profile Cache
+Level/XP/streak/ability lookups served from a per-worker LRU in front of Redis
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from redis.exceptions import WatchError
+
+from models import db, User
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FIELDS = ('level', 'total_xp', 'current_streak', 'ability')
+ALL_USERS = '*'
+RECONNECT_DELAY = 2.0
+
+
+class UserProfiles:
+    """Read-mostly profile fields cached in two tiers, invalidated over Redis pub/sub.
+
+    A lookup tries the worker's LRU, then one Redis GET, then the database.
+    Whoever changes a cached field calls `invalidate(user_id)` after the
+    commit: the Redis copy is deleted and every worker drops its local copy
+    when the message arrives. Local entries also expire after `local_ttl`,
+    which bounds staleness if a message is missed while reconnecting.
+    `invalidate` also bumps a per-user version key; a refill from the
+    database is written back to Redis only if that version is unchanged
+    since the miss, so a slow refill cannot pin a profile that was
+    invalidated while it was loading. Without Redis the LRU alone is used, as for a single worker.
+    """
+
+    def __init__(self, prefix: str = 'smartquiz:profile', max_entries: int = 4096):
+        self.prefix = prefix
+        self.channel = f'{prefix}:invalidate'
+        self.max_entries = max_entries
+        self.local_ttl = 30.0
+        self.ttl = 600
+        self.redis = None
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._listener_pid = None
+
+    def init_app(self, app, redis_client=None) -> None:
+        self.redis = redis_client
+        self.max_entries = app.config.get('PROFILE_CACHE_SIZE', self.max_entries)
+        self.local_ttl = app.config.get('PROFILE_CACHE_LOCAL_TTL', self.local_ttl)
+        self.ttl = app.config.get('PROFILE_CACHE_TTL', self.ttl)
+
+    def _key(self, user_id: str) -> str:
+        return f'{self.prefix}:{user_id}'
+
+    def _version_key(self, user_id: str) -> str:
+        # Outside the `prefix:*` pattern so invalidate_all does not delete it
+        return f'{self.prefix}-version:{user_id}'
+
+    def _version_keys(self, user_id: str) -> Tuple[str, str]:
+        return self._version_key(user_id), self._version_key(ALL_USERS)
+
+    # Local tier
+    def _local_get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def _local_put(self, user_id: str, profile: Dict[str, Any], generation: int) -> None:
+        with self._lock:
+            # An invalidation that arrived while this value was loading wins
+            if generation != self._generation:
+                return
+            self._entries[user_id] = (time.monotonic() + self.local_ttl, profile)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _local_drop(self, user_ids: Iterable[str]) -> None:
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                if user_id == ALL_USERS:
+                    self._entries.clear()
+                else:
+                    self._entries.pop(user_id, None)
+
+    # Invalidation messages
+    def _ensure_listener(self) -> None:
+        # Threads do not survive fork, so each server worker subscribes on first use
+        if not self.redis or self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+        threading.Thread(target=self._listen, name='profile-invalidation', daemon=True).start()
+
+    def _listen(self) -> None:
+        while True:
+            pubsub = None
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                # Anything published while unsubscribed is lost; start from empty
+                self._local_drop([ALL_USERS])
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message['type'] == 'message':
+                        data = message['data']
+                        if isinstance(data, bytes):
+                            data = data.decode()
+                        self._local_drop(data.split(','))
+            except Exception as e:
+                logger.warning("Profile invalidation listener reconnecting: %s", e)
+                time.sleep(RECONNECT_DELAY)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    # Public API
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """{level, total_xp, current_streak, ability} for a user, None if unknown"""
+        self._ensure_listener()
+        profile = self._local_get(user_id)
+        if profile is not None:
+            return profile
+
+        generation = self._generation
+        versions = None
+        if self.redis:
+            try:
+                raw, *versions = self.redis.mget(self._key(user_id), *self._version_keys(user_id))
+                if raw:
+                    profile = json.loads(raw)
+                    self._local_put(user_id, profile, generation)
+                    return profile
+            except Exception as e:
+                logger.warning("Profile cache read failed: %s", e)
+
+        row = db.session.execute(
+            db.select(*(getattr(User, field) for field in PROFILE_FIELDS)).where(User.id == user_id)
+        ).first()
+        if row is None:
+            return None
+        profile = dict(zip(PROFILE_FIELDS, row))
+        if versions is not None:
+            self._refill(user_id, profile, versions)
+        self._local_put(user_id, profile, generation)
+        return profile
+
+    def _refill(self, user_id: str, profile: Dict[str, Any], versions: List[Optional[str]]) -> None:
+        """Cache a profile loaded from the database unless it was invalidated meanwhile"""
+        version_keys = self._version_keys(user_id)
+        try:
+            with self.redis.pipeline() as pipe:
+                pipe.watch(*version_keys)
+                if pipe.mget(*version_keys) != versions:
+                    return
+                pipe.multi()
+                pipe.set(self._key(user_id), json.dumps(profile), ex=self.ttl)
+                pipe.execute()
+        except WatchError:
+            pass  # invalidated between the check and the write
+        except Exception as e:
+            logger.warning("Profile cache write failed: %s", e)
+
+    def invalidate(self, *user_ids: str) -> None:
+        """Drop cached profiles everywhere; call after committing a change to a cached field"""
+        user_ids = [u for u in user_ids if u]
+        if not user_ids:
+            return
+        self._local_drop(user_ids)
+        if not self.redis:
+            return
+        try:
+            # Versions move first so refills that read the old rows are not written back,
+            # then shared copies go so workers refill from the database, not from Redis
+            pipe = self.redis.pipeline()
+            for version_key in map(self._version_key, user_ids):
+                pipe.incr(version_key)
+                pipe.expire(version_key, self.ttl)
+            if ALL_USERS not in user_ids:
+                pipe.delete(*(self._key(u) for u in user_ids))
+            pipe.execute()
+            if ALL_USERS in user_ids:
+                for keys in _chunks(self.redis.scan_iter(f'{self.prefix}:*', count=1000), 1000):
+                    self.redis.delete(*keys)
+            self.redis.publish(self.channel, ','.join(user_ids))
+        except Exception as e:
+            logger.warning("Profile invalidation failed: %s", e)
+
+    def invalidate_all(self) -> None:
+        """After bulk rewrites such as calibration"""
+        self.invalidate(ALL_USERS)
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+user_profiles = UserProfiles()
@@ -0,0 +1,70 @@
+"""
+Smart Quiz App - AI Provider Clients
+The OpenAI and Gemini SDKs are imported on first use, not at worker boot
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_settings = {}
+_openai = None
+_genai = None
+
+
+def init_app(app) -> None:
+    _settings.update(
+        openai_key=app.config.get('OPENAI_API_KEY'),
+        gemini_key=app.config.get('GEMINI_API_KEY'),
+        pool_size=app.config.get('AI_HTTP_POOL_SIZE', 100)
+    )
+
+
+def openai_configured() -> bool:
+    return bool(_settings.get('openai_key'))
+
+
+def gemini_configured() -> bool:
+    return bool(_settings.get('gemini_key'))
+
+
+def get_openai():
+    """The configured `openai` module (about 0.4s to import, so not at boot)"""
+    global _openai
+    if _openai is None:
+        with _lock:
+            if _openai is None:
+                started = time.perf_counter()
+                import openai
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                openai.api_key = _settings.get('openai_key')
+                # One keep-alive pool for provider calls, shared by the worker's threads/greenlets
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4,
+                                      pool_maxsize=_settings.get('pool_size', 100))
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                openai.requestssession = session
+                _openai = openai
+                logger.info("OpenAI client loaded in %.2fs", time.perf_counter() - started)
+    return _openai
+
+
+def get_genai():
+    """The configured `google.generativeai` module (about 1s to import, so not at boot)"""
+    global _genai
+    if _genai is None:
+        with _lock:
+            if _genai is None:
+                started = time.perf_counter()
+                import google.generativeai as genai
+
+                genai.configure(api_key=_settings.get('gemini_key'))
+                _genai = genai
+                logger.info("Gemini client loaded in %.2fs", time.perf_counter() - started)
+    return _genai
@@ -0,0 +1,229 @@
+"""
+Smart Quiz App - Query Instrumentation
+Per-request query counts and DB time, N+1 and slow-query detection
+"""
+
+import heapq
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from flask import g
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Expanding IN lists render one placeholder per value; collapse them so the statement shape groups
+_IN_LIST_RE = re.compile(r'\(\s*(?:\?|%\(\w+\)s|%s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|%s|:\w+))+\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+EXPLAIN_PREFIX = {'postgresql': 'EXPLAIN ', 'sqlite': 'EXPLAIN QUERY PLAN ', 'mysql': 'EXPLAIN '}
+
+# Every recorder open in this context (the request's plus any assert_query_budget around it)
+_active: ContextVar[Tuple['QueryLog', ...]] = ContextVar('query_logs', default=())
+
+
+def normalize(statement: str) -> str:
+    return _IN_LIST_RE.sub('(...)', _SPACE_RE.sub(' ', statement).strip())
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised by assert_query_budget; the message lists what ran"""
+
+
+class QueryLog:
+    """Statements seen while a request (or a budget block) was open"""
+
+    def __init__(self, keep_slowest: int = 5):
+        self.count = 0
+        self.total_ms = 0.0
+        self.statements: Dict[str, List[float]] = {}  # normalized statement -> [count, total ms]
+        self.slowest: List[Tuple[float, str]] = []  # min-heap of (ms, statement)
+        self.plans: Dict[str, str] = {}
+        self.keep_slowest = keep_slowest
+
+    def record(self, statement: str, elapsed_ms: float) -> None:
+        self.count += 1
+        self.total_ms += elapsed_ms
+        entry = self.statements.get(statement)
+        if entry is None:
+            self.statements[statement] = [1, elapsed_ms]
+        else:
+            entry[0] += 1
+            entry[1] += elapsed_ms
+        if len(self.slowest) < self.keep_slowest:
+            heapq.heappush(self.slowest, (elapsed_ms, statement))
+        elif elapsed_ms > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (elapsed_ms, statement))
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int, float]]:
+        """Statements run at least `threshold` times: the N+1 suspects"""
+        return sorted(((stmt, int(n), ms) for stmt, (n, ms) in self.statements.items()
+                       if n >= threshold),
+                      key=lambda row: -row[1])
+
+    def summary(self, threshold: int = 5) -> Dict[str, Any]:
+        return {
+            'queries': self.count,
+            'db_ms': round(self.total_ms, 2),
+            'slowest': [{'ms': round(ms, 2), 'statement': stmt[:300]}
+                        for ms, stmt in sorted(self.slowest, reverse=True)],
+            'repeated': [{'count': n, 'ms': round(ms, 2), 'statement': stmt[:300]}
+                         for stmt, n, ms in self.repeated(threshold)]
+        }
+
+    def report(self) -> str:
+        lines = [f'{self.count} queries, {self.total_ms:.1f}ms']
+        for stmt, (n, ms) in sorted(self.statements.items(), key=lambda item: -item[1][0]):
+            lines.append(f'  {int(n):4d}x {ms:8.1f}ms  {stmt[:200]}')
+        return '\n'.join(lines)
+
+
+class QueryInspector:
+    """Engine-wide cursor hooks feeding the recorders open in the current context.
+
+    Each request gets a QueryLog. When it ends, statements that ran
+    `n_plus_one` times or more are logged as N+1 suspects, and a
+    Server-Timing header reports the count and DB time if `header` is on.
+    Any statement slower than `slow_ms` is logged on its own, with its plan
+    when `explain` is on (SELECTs only, each statement shape once).
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.slow_ms = 200.0
+        self.n_plus_one = 5
+        self.explain = False
+        self.header = False
+        self._explained: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._listening = False
+
+    def init_app(self, app) -> None:
+        config = app.config
+        self.enabled = config.get('QUERY_STATS_ENABLED', self.enabled)
+        self.slow_ms = config.get('SLOW_QUERY_MS', self.slow_ms)
+        self.n_plus_one = config.get('N_PLUS_ONE_THRESHOLD', self.n_plus_one)
+        self.explain = config.get('QUERY_EXPLAIN', self.explain)
+        self.header = config.get('QUERY_STATS_HEADER', self.header)
+        with self._lock:
+            if not self._listening:
+                event.listen(Engine, 'before_cursor_execute', self._before_execute)
+                event.listen(Engine, 'after_cursor_execute', self._after_execute)
+                self._listening = True
+        app.before_request(self._open_request)
+        app.after_request(self._close_request)
+        app.teardown_request(self._teardown_request)
+
+    # Engine hooks
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.enabled and context is not None:
+            context._query_started = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_query_started', None)
+        if started is None:
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        logs = _active.get()
+        if not logs and elapsed_ms < self.slow_ms:
+            return
+        shape = normalize(statement)
+        for log in logs:
+            log.record(shape, elapsed_ms)
+        if elapsed_ms >= self.slow_ms:
+            plan = None
+            if self.explain and not executemany:
+                plan = self._explain(conn, statement, parameters, shape)
+            if plan:
+                for log in logs:
+                    log.plans[shape] = plan
+            logger.warning("Slow query %.1fms: %s", elapsed_ms, shape[:500],
+                           extra={'query_ms': round(elapsed_ms, 2), 'plan': plan})
+
+    def _explain(self, conn, statement, parameters, shape) -> Optional[str]:
+        prefix = EXPLAIN_PREFIX.get(conn.dialect.name)
+        if not prefix or statement.lstrip()[:6].upper() not in ('SELECT', 'WITH'):
+            return None
+        if shape in self._explained:
+            return self._explained[shape]
+        # A fresh DBAPI cursor: the statement's own cursor still holds its rows,
+        # and this one bypasses the hooks
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            plan = '\n'.join(' '.join(str(col) for col in row) for row in cursor.fetchall())
+        except Exception as e:
+            plan = f'EXPLAIN failed: {e}'
+        finally:
+            cursor.close()
+        with self._lock:
+            if len(self._explained) >= 256:
+                self._explained.clear()
+            self._explained[shape] = plan
+        return plan
+
+    # Request scope
+    def _open_request(self) -> None:
+        if self.enabled:
+            g.query_log = QueryLog()
+            g.query_log_token = _active.set(_active.get() + (g.query_log,))
+
+    def _close_request(self, response):
+        log = g.get('query_log')
+        if log is None:
+            return response
+        suspects = log.repeated(self.n_plus_one)
+        if suspects:
+            statement, count, ms = suspects[0]
+            logger.warning("Possible N+1: %s queries, %s statement(s) repeated; top %sx %.1fms: %s",
+                           log.count, len(suspects), count, ms, statement[:300],
+                           extra={'query_stats': log.summary(self.n_plus_one)})
+        if self.header:
+            response.headers.add('Server-Timing',
+                                 f'db;dur={log.total_ms:.1f};desc="{log.count} queries"')
+        return response
+
+    @staticmethod
+    def _teardown_request(exc) -> None:
+        token = g.pop('query_log_token', None)
+        if token is not None:
+            _active.reset(token)
+
+
+@contextmanager
+def assert_query_budget(max_queries: int, max_ms: Optional[float] = None,
+                        max_repeats: Optional[int] = None) -> Iterator[QueryLog]:
+    """Fail when the block runs more than `max_queries` statements.
+
+    Optionally also caps total DB time and how often one statement shape
+    may repeat (an N+1 guard). Requests made through the test client inside
+    the block are counted too:
+
+        with assert_query_budget(3, max_repeats=1):
+            client.get('/api/v1/reviews/due', headers=auth)
+    """
+    log = QueryLog()
+    token = _active.set(_active.get() + (log,))
+    try:
+        yield log
+    finally:
+        _active.reset(token)
+    problems = []
+    if log.count > max_queries:
+        problems.append(f'{log.count} queries > budget {max_queries}')
+    if max_ms is not None and log.total_ms > max_ms:
+        problems.append(f'{log.total_ms:.1f}ms DB time > budget {max_ms}ms')
+    if max_repeats is not None:
+        worst = log.repeated(max_repeats + 1)
+        if worst:
+            problems.append(f'statement repeated {worst[0][1]}x > {max_repeats}')
+    if problems:
+        raise QueryBudgetExceeded('; '.join(problems) + '\n' + log.report())
+
+
+query_inspector = QueryInspector()
@@ -0,0 +1,475 @@
+"""
+Smart Quiz App - Memory-Mapped Question Bank
+Read-only columnar snapshot of the active bank, shared by all workers through the page cache
+"""
+
+import json
+import logging
+import mmap
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from array import array
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import redis
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from catalog import PAYLOAD_FIELDS
+from models import db, Question
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'SQBANK01'
+ALIGN = 8
+ID_WIDTH = 36
+BUILD_CHUNK = 10_000
+CHANGED_RETENTION = 3600  # seconds a shared change outlives the build that covers it
+
+# Per-row columns, all in id order: (section, dtype)
+COLUMNS = (
+    ('ids', f'S{ID_WIDTH}'),
+    ('subject', '<u2'),  # index into the string table
+    ('difficulty', '<u2'),
+    ('correct', '<i1'),
+    ('points', '<u2'),
+    ('irt_difficulty', '<f4'),  # NaN when uncalibrated
+    ('payload_start', '<u8'),  # byte range of the row's JSON in `payload`
+    ('payload_length', '<u4'),
+)
+
+
+def _group_key(subject: str, difficulty: str, topic: Optional[str] = None) -> str:
+    return f'{subject}/{difficulty}' if topic is None else f'{subject}/{difficulty}/{topic}'
+
+
+def _encode_payload(payload: Dict[str, Any]) -> bytes:
+    return json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+# Writing
+def write_bank(path: str, rows: Iterable[Dict[str, Any]],
+               built_at: Optional[float] = None) -> Dict[str, Any]:
+    """Write a bank file from rows, then swap it into place.
+
+    Each row needs id, subject, difficulty, tags, correct_answer_index,
+    points, irt_difficulty and payload (the client JSON as a dict). Payload
+    bytes are streamed to a scratch file in input order, so memory stays at
+    the small per-row columns, which are sorted by id at the end for binary
+    search. The finished file replaces `path` with os.replace:
+    workers mapping the old file keep reading it until they remap.
+    `built_at` is when the rows were read (default: now).
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    strings: Dict[str, int] = {}
+
+    def intern(value: str) -> int:
+        code = strings.get(value)
+        if code is None:
+            code = strings[value] = len(strings)
+        return code
+
+    columns = {name: [] for name, _ in COLUMNS}
+    groups: Dict[str, array] = defaultdict(lambda: array('I'))
+    started = time.perf_counter()
+    size = 0
+
+    with tempfile.TemporaryFile(dir=directory) as blob:
+        for row_index, row in enumerate(rows):
+            qid = str(row['id'])
+            subject, difficulty = row['subject'], row['difficulty']
+            columns['ids'].append(qid.encode('ascii'))
+            columns['subject'].append(intern(subject))
+            columns['difficulty'].append(intern(difficulty))
+            columns['correct'].append(row['correct_answer_index'])
+            columns['points'].append(row.get('points') or 1)
+            irt = row.get('irt_difficulty')
+            columns['irt_difficulty'].append(np.nan if irt is None else irt)
+            groups[_group_key(subject, difficulty)].append(row_index)
+            for tag in {t for t in row.get('tags') or [] if isinstance(t, str)}:
+                groups[_group_key(subject, difficulty, tag)].append(row_index)
+            data = _encode_payload(row['payload'])
+            blob.write(data)
+            columns['payload_start'].append(size)
+            columns['payload_length'].append(len(data))
+            size += len(data)
+
+        # Rows in id order; group members are renumbered to match
+        count = len(columns['ids'])
+        order = np.argsort(np.array(columns['ids'], dtype=f'S{ID_WIDTH}'), kind='stable')
+        arrays = [(name, np.array(columns[name], dtype=dtype)[order]) for name, dtype in COLUMNS]
+        ids = arrays[0][1]
+        if count > 1 and (ids[1:] == ids[:-1]).any():
+            raise ValueError('Bank rows must have unique ids')
+        renumber = np.empty(count, dtype='<u4')
+        renumber[order] = np.arange(count, dtype='<u4')
+        # Group membership: row numbers of every subject/difficulty(/topic), back to back
+        group_ranges, position = {}, 0
+        for key in sorted(groups):
+            group_ranges[key] = [position, position + len(groups[key])]
+            position += len(groups[key])
+        group_rows = np.empty(position, dtype='<u4')
+        for key, (start, end) in group_ranges.items():
+            group_rows[start:end] = renumber[np.frombuffer(groups[key], dtype='<u4')]
+        arrays.append(('group_rows', group_rows))
+
+        # Section offsets depend on the header length, which depends on the offsets: leave slack
+        header = {'version': 1, 'count': count, 'built_at': built_at or time.time(),
+                  'strings': list(strings), 'groups': group_ranges, 'sections': {}}
+        reserved = len(json.dumps(header).encode()) + 128 * (len(arrays) + 1)
+        cursor = _aligned(len(MAGIC) + 4 + reserved)
+        for name, values in arrays:
+            header['sections'][name] = [cursor, values.dtype.str, len(values)]
+            cursor = _aligned(cursor + values.nbytes)
+        header['sections']['payload'] = [cursor, '|u1', size]
+        encoded_header = json.dumps(header).encode()
+
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as fh:
+            fh.write(MAGIC + len(encoded_header).to_bytes(4, 'little') + encoded_header)
+            for name, values in arrays:
+                fh.write(b'\0' * (header['sections'][name][0] - fh.tell()))
+                fh.write(values.tobytes())
+            fh.write(b'\0' * (header['sections']['payload'][0] - fh.tell()))
+            blob.seek(0)
+            shutil.copyfileobj(blob, fh, 1 << 20)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, path)
+
+    logger.info("Question bank written: %s questions, %s groups, %.1f MB in %.1fs",
+                count, len(group_ranges), os.path.getsize(path) / 1e6,
+                time.perf_counter() - started)
+    return {'count': count, 'groups': len(group_ranges), 'bytes': os.path.getsize(path)}
+
+
+def _aligned(offset: int) -> int:
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def build_bank(path: str, top_groups: Optional[int] = None) -> Dict[str, Any]:
+    """Snapshot the active bank into `path` (needs an app context).
+
+    `top_groups` keeps only the most served subject/difficulty pairs, for
+    banks too large to map whole.
+    """
+    # Taken before the scan: edits committed from here on are newer than the file
+    started = time.time()
+    query = db.select(Question).where(Question.is_active.is_(True))
+    if top_groups:
+        popular = db.session.execute(
+            db.select(Question.subject, Question.difficulty)
+            .where(Question.is_active.is_(True))
+            .group_by(Question.subject, Question.difficulty)
+            .order_by(db.func.sum(Question.usage_count).desc())
+            .limit(top_groups)
+        ).all()
+        query = query.where(db.tuple_(Question.subject, Question.difficulty)
+                            .in_([tuple(p) for p in popular]))
+
+    def rows():
+        result = db.session.execute(query.execution_options(yield_per=BUILD_CHUNK))
+        for question in result.scalars():
+            if len(question.id) > ID_WIDTH or not question.id.isascii():
+                continue  # not addressable in the fixed-width id column; served from the DB
+            yield {
+                'id': question.id, 'subject': question.subject, 'difficulty': question.difficulty,
+                'tags': question.tags, 'correct_answer_index': question.correct_answer_index,
+                'points': question.points, 'irt_difficulty': question.irt_difficulty,
+                'payload': question.to_payload()
+            }
+
+    return write_bank(path, rows(), built_at=started)
+
+
+# Reading
+class BankView:
+    """One mapped bank file; numpy views over the mapping, nothing copied"""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as fh:
+            self.stat = os.fstat(fh.fileno())
+            self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'{path} is not a question bank file')
+        header_len = int.from_bytes(self._map[len(MAGIC):len(MAGIC) + 4], 'little')
+        header = json.loads(self._map[len(MAGIC) + 4:len(MAGIC) + 4 + header_len])
+        self.count = header['count']
+        self.built_at = header['built_at']
+        self.strings: List[str] = header['strings']
+        self.codes = {value: code for code, value in enumerate(self.strings)}
+        self.groups: Dict[str, List[int]] = header['groups']
+        self.sections = {
+            name: np.frombuffer(self._map, dtype=dtype, count=length, offset=offset)
+            for name, (offset, dtype, length) in header['sections'].items()
+        }
+        self.ids = self.sections['ids']
+        self.payload_start_of = self.sections['payload_start']
+        self.payload_length_of = self.sections['payload_length']
+        self.payload = self._map  # sliced directly: bytes out, no array round trip
+        self.payload_start = header['sections']['payload'][0]
+
+    def row_of(self, question_id: str) -> int:
+        key = question_id.encode('ascii', 'replace')[:ID_WIDTH + 1]
+        row = int(np.searchsorted(self.ids, key))
+        return row if row < self.count and self.ids[row] == key else -1
+
+    def payload_of(self, row: int) -> bytes:
+        start = self.payload_start + int(self.payload_start_of[row])
+        return self.payload[start:start + int(self.payload_length_of[row])]
+
+    def group(self, key: str) -> np.ndarray:
+        start, end = self.groups.get(key, (0, 0))
+        return self.sections['group_rows'][start:end]
+
+
+class QuestionBank:
+    """Active questions served from a memory-mapped file built by `manage.py build-bank`.
+
+    The file is mapped read-only, so every worker (and the master when the
+    app is preloaded) shares the same page-cache pages: memory does not grow
+    with the worker count, and a worker forked after loading inherits the
+    mapping. Every `check_interval` seconds a reader stats the file; when a
+    new build has been swapped in, the next reader maps it and replaces the
+    view in one assignment. Readers still holding the old view finish on the
+    old mapping.
+
+    The bank is a snapshot, so questions edited, deactivated or deleted
+    through the ORM after the build are recorded as changed when their
+    transaction commits (in a shared Redis sorted set when Redis is up,
+    which other workers pull every `sync_interval` seconds). Lookups treat
+    a changed question as absent, and callers fall through to the DB,
+    until a build newer than the change is mapped.
+    """
+
+    def __init__(self, changed_key: str = 'smartquiz:question_bank:changed'):
+        self.path: Optional[str] = None
+        self.check_interval = 30.0
+        self.sync_interval = 5.0
+        self.changed_key = changed_key
+        self.redis = None
+        self._view: Optional[BankView] = None
+        self._checked_at = 0.0
+        self._changed: Dict[str, float] = {}  # question id -> when its change committed
+        self._changed_cursor = 0.0
+        self._synced_at = 0.0
+        self._lock = threading.Lock()
+        self._listening = False
+
+    def init_app(self, app, redis_client=None) -> None:
+        self.path = app.config.get('QUESTION_BANK_PATH')
+        self.check_interval = app.config.get('QUESTION_BANK_CHECK_INTERVAL', self.check_interval)
+        self.sync_interval = app.config.get('QUESTION_BANK_SYNC_INTERVAL', self.sync_interval)
+        self.redis = redis_client
+        self._view = None
+        self._checked_at = 0.0
+        self._changed = {}
+        self._changed_cursor = self._synced_at = 0.0
+        if not self._listening:
+            event.listen(Question, 'after_update', _after_update)
+            event.listen(Question, 'after_delete', _after_delete)
+            event.listen(Session, 'after_commit', _after_commit)
+            event.listen(Session, 'after_rollback', _after_rollback)
+            self._listening = True
+        if self.path and os.path.exists(self.path):
+            self.load()
+
+    def load(self, path: Optional[str] = None) -> bool:
+        path = path or self.path
+        try:
+            view = BankView(path)
+        except (OSError, ValueError) as e:
+            logger.error("Question bank %s not loaded: %s", path, e)
+            return False
+        self.path = path
+        self._view = view
+        # Changes the new file already includes
+        self._changed = {qid: at for qid, at in self._changed.items() if at >= view.built_at}
+        if self.redis:
+            try:
+                self.redis.zremrangebyscore(self.changed_key, '-inf',
+                                            view.built_at - CHANGED_RETENTION)
+            except redis.RedisError as e:
+                logger.warning("Trimming changed bank questions failed: %s", e)
+        logger.info("Question bank mapped: %s questions built %s", view.count,
+                    time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(view.built_at)))
+        return True
+
+    def _current(self) -> Optional[BankView]:
+        now = time.monotonic()
+        if self.path and now - self._checked_at >= self.check_interval:
+            with self._lock:
+                if now - self._checked_at >= self.check_interval:
+                    self._checked_at = now
+                    self._reload_if_changed()
+        if self._view is not None:
+            self._sync_changed()
+        return self._view
+
+    def _reload_if_changed(self) -> None:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        view = self._view
+        if view is None or (stat.st_ino, stat.st_mtime_ns, stat.st_size) != \
+                (view.stat.st_ino, view.stat.st_mtime_ns, view.stat.st_size):
+            self.load(self.path)
+
+    # Changes since the build
+    def mark_changed(self, question_ids: Iterable[str]) -> None:
+        """Stop serving these questions from the mapped file (called after commit)"""
+        if self._view is None:
+            return  # nothing mapped in this deployment
+        now = time.time()
+        changed = {qid: now for qid in question_ids}
+        self._changed.update(changed)
+        if self.redis and changed:
+            try:
+                self.redis.zadd(self.changed_key, changed)
+            except redis.RedisError as e:
+                logger.warning("Sharing changed bank questions failed: %s", e)
+
+    def _sync_changed(self) -> None:
+        now = time.monotonic()
+        if not self.redis or now - self._synced_at < self.sync_interval:
+            return
+        self._synced_at = now
+        try:
+            rows = self.redis.zrangebyscore(self.changed_key, self._changed_cursor, '+inf',
+                                            withscores=True)
+        except redis.RedisError as e:
+            logger.warning("Reading changed bank questions failed: %s", e)
+            return
+        for qid, at in rows:
+            if at > self._changed.get(qid, 0.0):
+                self._changed[qid] = at
+            self._changed_cursor = max(self._changed_cursor, at)
+
+    def _row(self, view: BankView, question_id: str) -> int:
+        """Row of a question the file still serves, -1 when absent or changed since the build"""
+        row = view.row_of(question_id)
+        if row >= 0 and self._changed:
+            changed_at = self._changed.get(question_id)
+            if changed_at is not None and changed_at >= view.built_at:
+                return -1
+        return row
+
+    @property
+    def loaded(self) -> bool:
+        return self._current() is not None
+
+    def built_at(self) -> float:
+        """Build time of the mapped file (0 when none), part of ETags of bank-served content"""
+        view = self._current()
+        return view.built_at if view else 0.0
+
+    def __len__(self) -> int:
+        view = self._current()
+        return view.count if view else 0
+
+    # Lookups
+    def get(self, question_id: str) -> Optional[bytes]:
+        """Client payload JSON of one question, or None when it is not in the bank"""
+        view = self._current()
+        if view is None:
+            return None
+        row = self._row(view, question_id)
+        return view.payload_of(row) if row >= 0 else None
+
+    def get_many(self, question_ids: List[str]) -> Optional[List[bytes]]:
+        """Payloads in the given order, or None unless the bank holds every one"""
+        view = self._current()
+        if view is None:
+            return None
+        payloads = []
+        for qid in question_ids:
+            row = self._row(view, qid)
+            if row < 0:
+                return None
+            payloads.append(view.payload_of(row))
+        return payloads
+
+    def answer_key(self, question_id: str) -> Optional[Tuple[int, int]]:
+        """(correct answer index, points), None unless the bank holds the current version"""
+        view = self._current()
+        row = self._row(view, question_id) if view else -1
+        if row < 0:
+            return None
+        return int(view.sections['correct'][row]), int(view.sections['points'][row])
+
+    def has_group(self, subject: str, difficulty: str) -> bool:
+        view = self._current()
+        return bool(view and _group_key(subject, difficulty) in view.groups)
+
+    def group_size(self, subject: str, difficulty: str, topic: Optional[str] = None) -> int:
+        view = self._current()
+        if view is None:
+            return 0
+        start, end = view.groups.get(_group_key(subject, difficulty, topic), (0, 0))
+        return end - start
+
+    def sample(self, subject: str, difficulty: str, count: int,
+               topics: Optional[Iterable[str]] = None) -> List[str]:
+        """Up to `count` random question ids of the group (any of `topics` when given)"""
+        view = self._current()
+        if view is None or count <= 0:
+            return []
+        if topics:
+            parts = [view.group(_group_key(subject, difficulty, topic)) for topic in topics]
+            rows = np.concatenate(parts) if parts else np.empty(0, dtype='<u4')
+            # A question tagged with several of the topics appears once per topic
+            drawn = rows[random.sample(range(len(rows)), min(count * 2, len(rows)))]
+            picked = list(dict.fromkeys(int(r) for r in drawn))
+            if len(picked) < count and len(picked) < len(rows):
+                rows = np.unique(rows)
+                picked = rows[random.sample(range(len(rows)), min(count, len(rows)))]
+            return self._unchanged(view, [view.ids[row].decode('ascii') for row in picked[:count]])
+        rows = view.group(_group_key(subject, difficulty))
+        picked = rows[random.sample(range(len(rows)), min(count, len(rows)))]
+        return self._unchanged(view, [view.ids[row].decode('ascii') for row in picked])
+
+    def _unchanged(self, view: BankView, question_ids: List[str]) -> List[str]:
+        if not self._changed:
+            return question_ids
+        return [qid for qid in question_ids if self._changed.get(qid, 0.0) < view.built_at]
+
+    @staticmethod
+    def join(payloads: List[bytes]) -> bytes:
+        """JSON array of payloads, ready to splice into a response"""
+        return b'[' + b','.join(payloads) + b']'
+
+
+question_bank = QuestionBank()
+
+
+# ORM hooks: edited, deactivated and deleted questions are marked changed on commit
+def _pending(target) -> set:
+    return object_session(target).info.setdefault('bank_changed', set())
+
+
+def _after_update(mapper, connection, target) -> None:
+    state = inspect(target)
+    if any(state.attrs[attr].history.has_changes() for attr in PAYLOAD_FIELDS):
+        _pending(target).add(target.id)
+
+
+def _after_delete(mapper, connection, target) -> None:
+    _pending(target).add(target.id)
+
+
+def _after_commit(session) -> None:
+    changed = session.info.pop('bank_changed', None)
+    if changed:
+        question_bank.mark_changed(changed)
+
+
+def _after_rollback(session) -> None:
+    session.info.pop('bank_changed', None)
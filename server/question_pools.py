@@ -0,0 +1,145 @@
+"""
+Smart Quiz App - Generated Question Pools
+Question ids per subject/difficulty/topic (generated, or warmed from the bank),
+sampled for any requested count
+"""
+
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MAX_TOPICS = 10
+MAX_TOPIC_LENGTH = 64
+NO_TOPIC = '*'
+
+
+def normalize_topics(topics) -> List[str]:
+    """Stable, deduplicated topic list (case and spacing do not split pools)"""
+    if not isinstance(topics, (list, tuple)):
+        return []
+    cleaned = {' '.join(str(t).split()).lower()[:MAX_TOPIC_LENGTH]
+               for t in topics if isinstance(t, str)}
+    return sorted(t for t in cleaned if t)[:MAX_TOPICS]
+
+
+class QuestionPools:
+    """One pool of question ids per (subject, difficulty, topic).
+
+    Questions generated for a topic list join the pool of every topic in
+    it (or the topic-less pool); a request is served from the union of its
+    topics' pools, so overlapping topic lists share questions and the
+    requested count only decides how many ids are sampled. Pools are Redis
+    sorted sets scored by insertion time, shared by all workers, or process
+    memory without Redis. Ids older than `ttl` and the oldest past
+    `max_size` per pool are evicted; without Redis the least recently used
+    pools beyond `max_pools` are dropped too.
+    """
+
+    def __init__(self, prefix: str = 'smartquiz:pool'):
+        self.prefix = prefix
+        self.redis = None
+        self.ttl = 3600
+        self.max_size = 200
+        self.max_pools = 5000
+        self._local: 'OrderedDict[str, OrderedDict[str, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'hits': 0, 'partial': 0, 'misses': 0, 'served': 0,
+                      'generated': 0}
+
+    def init_app(self, app, redis_client=None) -> None:
+        self.redis = redis_client
+        self.ttl = app.config.get('QUESTION_POOL_TTL', self.ttl)
+        self.max_size = app.config.get('QUESTION_POOL_MAX_SIZE', self.max_size)
+        self.max_pools = app.config.get('QUESTION_POOL_MAX_POOLS', self.max_pools)
+
+    def _keys(self, subject: str, difficulty: str, topics: List[str]) -> List[str]:
+        return [f'{self.prefix}:{subject}:{difficulty}:{topic}' for topic in (topics or [NO_TOPIC])]
+
+    # Reads
+    def candidates(self, subject: str, difficulty: str, topics: List[str]) -> List[str]:
+        """Every live id in the union of the topics' pools"""
+        keys = self._keys(subject, difficulty, topics)
+        cutoff = time.time() - self.ttl
+        if self.redis:
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                for key in keys:
+                    pipe.zrangebyscore(key, cutoff, '+inf')
+                return list(dict.fromkeys(qid for ids in pipe.execute() for qid in ids))
+            except Exception as e:
+                logger.warning("Question pool read failed: %s", e)
+                return []
+
+        union: Dict[str, None] = {}
+        with self._lock:
+            for key in keys:
+                pool = self._local.get(key)
+                if pool is None:
+                    continue
+                self._local.move_to_end(key)
+                while pool and next(iter(pool.values())) < cutoff:
+                    pool.popitem(last=False)
+                union.update(dict.fromkeys(pool))
+        return list(union)
+
+    def sample(self, subject: str, difficulty: str, topics: List[str], count: int) -> List[str]:
+        ids = self.candidates(subject, difficulty, topics)
+        return random.sample(ids, min(count, len(ids)))
+
+    # Writes
+    def add(self, subject: str, difficulty: str, topics: List[str],
+            question_ids: Iterable[str]) -> None:
+        question_ids = [qid for qid in question_ids if qid]
+        if not question_ids:
+            return
+        now = time.time()
+        keys = self._keys(subject, difficulty, topics)
+        if self.redis:
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                for key in keys:
+                    pipe.zadd(key, {qid: now for qid in question_ids})
+                    pipe.zremrangebyscore(key, '-inf', now - self.ttl)
+                    pipe.zremrangebyrank(key, 0, -self.max_size - 1)
+                    pipe.expire(key, self.ttl)
+                pipe.execute()
+            except Exception as e:
+                logger.warning("Question pool update failed: %s", e)
+            return
+
+        with self._lock:
+            for key in keys:
+                pool = self._local.pop(key, None) or OrderedDict()
+                for qid in question_ids:
+                    pool.pop(qid, None)
+                    pool[qid] = now
+                while len(pool) > self.max_size:
+                    pool.popitem(last=False)
+                self._local[key] = pool
+            while len(self._local) > self.max_pools:
+                self._local.popitem(last=False)
+
+    def record(self, requested: int, served: int) -> None:
+        """Count one request: served from the pools, topped up, or generated in full"""
+        stats = self.stats
+        stats['requests'] += 1
+        stats['served'] += served
+        stats['generated'] += requested - served
+        if served >= requested:
+            stats['hits'] += 1
+        elif served:
+            stats['partial'] += 1
+        else:
+            stats['misses'] += 1
+
+    def hit_ratio(self) -> Optional[float]:
+        requests = self.stats['requests']
+        return self.stats['hits'] / requests if requests else None
+
+
+question_pools = QuestionPools()
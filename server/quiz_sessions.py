@@ -0,0 +1,281 @@
+"""
+Smart Quiz App - Server-Graded Quiz Sessions
+Start/answer/finish flow with the answer key held server-side and one aggregate write per quiz
+"""
+
+import json
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from counters import question_counters
+from profiles import user_profiles
+import calibration
+import review
+import rollups
+from models import db, dialect_insert, Question, Quiz, QuizAnswer
+
+logger = logging.getLogger(__name__)
+
+MAX_SESSION_QUESTIONS = 50
+SESSION_GRACE = 300  # seconds a session outlives its time limit
+DEFAULT_TIME_LIMIT = 900
+LATE_ANSWER_GRACE = 2  # seconds of network latency allowed past the time limit
+
+
+class SessionError(Exception):
+    """Session request that cannot be honoured; `status` is the HTTP status to answer with"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class QuizSessions:
+    """Live quiz sessions in a Redis hash per session.
+
+    Fields of a session hash:
+      meta        JSON: user_id, subject, difficulty, started_at (ms), time_limit, count
+      q:<qid>     "<position>,<correct index>,<points>,<option count>"  (the answer key)
+      x:<pos>     explanation, revealed once the question is answered
+      a:<pos>     "<qid>,<selected>,<0|1>,<time_spent ms>,<answered_at ms>"
+    Grading an answer reads one key field and sets one answer field, whatever
+    the quiz length. The database sees the quiz row at start and the graded
+    aggregate at finish. Answers arriving after the time limit are refused.
+
+    Without Redis, sessions are kept in process memory only when
+    QUIZ_SESSIONS_IN_PROCESS is set (single-process development and tests);
+    otherwise starting a session fails with 503, since another worker could
+    not find it.
+    """
+
+    def __init__(self, prefix: str = 'smartquiz:session'):
+        self.prefix = prefix
+        self.redis = None
+        self.in_process = False
+        self._local: Dict[str, Dict[str, str]] = {}
+        self._expires: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app, redis_client=None) -> None:
+        self.redis = redis_client
+        self.in_process = app.config.get('QUIZ_SESSIONS_IN_PROCESS', False)
+
+    @property
+    def available(self) -> bool:
+        """Whether sessions started here can be found by every server process"""
+        return bool(self.redis) or self.in_process
+
+    def _key(self, quiz_id: str) -> str:
+        return f'{self.prefix}:{quiz_id}'
+
+    # Storage
+    def _store(self, quiz_id: str, fields: Dict[str, str], ttl: int) -> None:
+        if self.redis:
+            pipe = self.redis.pipeline()
+            pipe.hset(self._key(quiz_id), mapping=fields)
+            pipe.expire(self._key(quiz_id), ttl)
+            pipe.execute()
+            return
+        with self._lock:
+            now = time.time()
+            for stale in [k for k, at in self._expires.items() if at < now]:
+                self._local.pop(stale, None)
+                self._expires.pop(stale, None)
+            self._local[quiz_id] = dict(fields)
+            self._expires[quiz_id] = now + ttl
+
+    def _get(self, quiz_id: str, *fields: str) -> List[Optional[str]]:
+        if self.redis:
+            return self.redis.hmget(self._key(quiz_id), fields)
+        with self._lock:
+            live = self._expires.get(quiz_id, 0) >= time.time()
+            session = self._local.get(quiz_id) if live else None
+            return [session.get(f) for f in fields] if session else [None] * len(fields)
+
+    def _set_once(self, quiz_id: str, field: str, value: str) -> bool:
+        if self.redis:
+            return bool(self.redis.hsetnx(self._key(quiz_id), field, value))
+        with self._lock:
+            session = self._local.get(quiz_id)
+            if session is None or field in session:
+                return False
+            session[field] = value
+            return True
+
+    def _get_all(self, quiz_id: str) -> Dict[str, str]:
+        if self.redis:
+            return self.redis.hgetall(self._key(quiz_id))
+        with self._lock:
+            if self._expires.get(quiz_id, 0) < time.time():
+                return {}
+            return dict(self._local.get(quiz_id, {}))
+
+    def _delete(self, quiz_id: str) -> None:
+        if self.redis:
+            self.redis.delete(self._key(quiz_id))
+            return
+        with self._lock:
+            self._local.pop(quiz_id, None)
+            self._expires.pop(quiz_id, None)
+
+    def _meta(self, user_id: str, quiz_id: str, raw: Optional[str]) -> Dict[str, Any]:
+        if not raw:
+            raise SessionError('Quiz session not found or expired', 404)
+        meta = json.loads(raw)
+        if meta['user_id'] != user_id:
+            raise SessionError('Quiz session not found or expired', 404)
+        return meta
+
+    # Flow
+    def start(self, user_id: str, subject: str, difficulty: str, questions: List[Question],
+              time_limit: int = DEFAULT_TIME_LIMIT) -> Dict[str, Any]:
+        """Create the quiz row and session; returns the questions without their answers"""
+        if not self.available:
+            raise SessionError('Quiz sessions are unavailable, try again later', 503)
+        if not questions:
+            raise SessionError('No questions available for this quiz', 404)
+        questions = list({q.id: q for q in questions}.values())[:MAX_SESSION_QUESTIONS]
+        now = datetime.utcnow()
+        quiz_id = str(uuid.uuid4())
+
+        # Read everything off the questions before the commit expires them
+        # (one reload each otherwise)
+        fields = {'meta': json.dumps({
+            'user_id': user_id, 'subject': subject, 'difficulty': difficulty,
+            'started_at': int(time.time() * 1000), 'time_limit': time_limit, 'count': len(questions)
+        })}
+        payloads = []
+        for position, question in enumerate(questions):
+            fields[f'q:{question.id}'] = (f'{position},{question.correct_answer_index},'
+                                          f'{question.points or 1},{len(question.options)}')
+            fields[f'x:{position}'] = question.explanation or ''
+            payload = question.to_payload()
+            del payload['correct_answer_index'], payload['explanation']
+            payloads.append(payload)
+        question_ids = [q.id for q in questions]
+
+        db.session.add(Quiz(
+            id=quiz_id,
+            user_id=user_id,
+            subject=subject,
+            difficulty=difficulty,
+            total_questions=len(questions),
+            time_limit=time_limit,
+            started_at=now,
+            is_completed=False,
+            quiz_metadata={'graded_by': 'server'}
+        ))
+        db.session.commit()
+        self._store(quiz_id, fields, time_limit + SESSION_GRACE)
+        question_counters.record_served(question_ids)
+
+        return {'quiz_id': quiz_id, 'questions': payloads, 'time_limit': time_limit,
+                'started_at': now.isoformat()}
+
+    def answer(self, user_id: str, quiz_id: str, question_id: str, selected: Optional[int],
+               time_spent: int = 0) -> Dict[str, Any]:
+        """Grade one answer against the session key; each question can be answered once"""
+        raw_meta, key = self._get(quiz_id, 'meta', f'q:{question_id}')
+        meta = self._meta(user_id, quiz_id, raw_meta)
+        now_ms = int(time.time() * 1000)
+        if now_ms > meta['started_at'] + (meta['time_limit'] + LATE_ANSWER_GRACE) * 1000:
+            raise SessionError('Time limit exceeded', 409)
+        if key is None:
+            raise SessionError('Question is not part of this quiz')
+
+        position, correct, *rest = (int(v) for v in key.split(','))
+        options = rest[1] if len(rest) > 1 else None  # None: session started without option counts
+        if selected is not None and (selected < 0 or (options is not None and selected >= options)):
+            raise SessionError('selected_answer_index is not one of the options')
+        is_correct = selected is not None and selected == correct
+        answered = f"{question_id},{-1 if selected is None else selected},{int(is_correct)}," \
+                   f"{max(0, time_spent)},{now_ms}"
+        if not self._set_once(quiz_id, f'a:{position}', answered):
+            raise SessionError('Question already answered', 409)
+
+        explanation, = self._get(quiz_id, f'x:{position}')
+        return {'question_id': question_id, 'is_correct': is_correct,
+                'correct_answer_index': correct, 'explanation': explanation or ''}
+
+    def finish(self, user_id: str, quiz_id: str) -> Dict[str, Any]:
+        """Write the graded aggregate (plus answer log and derived stats) in one transaction"""
+        session = self._get_all(quiz_id)
+        meta = self._meta(user_id, quiz_id, session.get('meta'))
+
+        points = {int(v.split(',')[0]): int(v.split(',')[2])
+                  for k, v in session.items() if k.startswith('q:')}
+        now = datetime.utcnow()
+        answers = []
+        for field, value in session.items():
+            if not field.startswith('a:'):
+                continue
+            question_id, selected, is_correct, spent, answered_ms = value.split(',')
+            answers.append({
+                'quiz_id': quiz_id,
+                'question_id': question_id,
+                'user_id': user_id,
+                'selected_answer_index': None if selected == '-1' else int(selected),
+                'is_correct': is_correct == '1',
+                'time_spent': int(spent),
+                'answered_at': datetime.utcfromtimestamp(int(answered_ms) / 1000),
+                'position': int(field[2:])
+            })
+
+        correct = sum(a['is_correct'] for a in answers)
+        total = meta['count']
+        row = {
+            'correct_answers': correct,
+            'score': float(sum(points[a['position']] for a in answers if a['is_correct'])),
+            'percentage': correct / total * 100,
+            'time_spent': min(sum(a['time_spent'] for a in answers),
+                              int(time.time() * 1000) - meta['started_at']),
+            'completed_at': now,
+            'is_completed': True,
+            'synced_at': now
+        }
+        updated = db.session.execute(
+            db.update(Quiz)
+            .where(Quiz.id == quiz_id, Quiz.user_id == user_id, Quiz.is_completed.is_(False))
+            .values(**row)
+        ).rowcount
+        if not updated:
+            db.session.rollback()
+            self._delete(quiz_id)
+            raise SessionError('Quiz already finished', 409)
+
+        for answer in answers:
+            del answer['position']
+        if answers:
+            db.session.execute(
+                dialect_insert(QuizAnswer).on_conflict_do_nothing(
+                    index_elements=['quiz_id', 'question_id']),
+                answers
+            )
+        rollups.apply_quizzes([Quiz(id=quiz_id, user_id=user_id, subject=meta['subject'],
+                                    total_questions=total, **row)])
+        ability = calibration.update_ability(
+            user_id, [[(a['question_id'], a['is_correct']) for a in answers]])
+        review.apply_answers(user_id, answers)
+        db.session.commit()
+
+        question_counters.record_answers((a['question_id'], a['is_correct']) for a in answers)
+        user_profiles.invalidate(user_id)
+        self._delete(quiz_id)
+
+        return {
+            'quiz_id': quiz_id,
+            'total_questions': total,
+            'answered': len(answers),
+            'correct_answers': correct,
+            'score': row['score'],
+            'percentage': row['percentage'],
+            'time_spent': row['time_spent'],
+            'ability': ability
+        }
+
+
+quiz_sessions = QuizSessions()
@@ -0,0 +1,122 @@
+"""
+Smart Quiz App - Spaced Repetition Review Queue
+SM-2 scheduling of missed questions, stored in a (user_id, due_at) indexed table
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from models import db, dialect_insert, Question, ReviewItem
+
+MIN_EASE = 1.3
+MAX_INTERVAL_DAYS = 365.0
+RELEARN_DELAY = timedelta(minutes=10)
+SLOW_ANSWER_MS = 30_000
+MAX_DUE_BATCH = 100
+
+STATE_FIELDS = ('ease', 'interval_days', 'repetitions', 'lapses', 'due_at', 'last_reviewed_at')
+
+
+def answer_quality(is_correct: bool, time_spent: int = 0) -> int:
+    """Map an answer onto the SM-2 0-5 recall scale"""
+    if not is_correct:
+        return 1
+    return 4 if time_spent and time_spent > SLOW_ANSWER_MS else 5
+
+
+def schedule(state: Dict[str, Any], quality: int, reviewed_at: datetime) -> Dict[str, Any]:
+    """Next SM-2 state after a review of the given quality"""
+    ease = max(MIN_EASE, state['ease'] + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+
+    if quality < 3:
+        return dict(state, ease=ease, repetitions=0, lapses=state['lapses'] + 1,
+                    interval_days=0.0, due_at=reviewed_at + RELEARN_DELAY,
+                    last_reviewed_at=reviewed_at)
+
+    repetitions = state['repetitions'] + 1
+    if repetitions == 1:
+        interval = 1.0
+    elif repetitions == 2:
+        interval = 6.0
+    else:
+        interval = min(MAX_INTERVAL_DAYS, state['interval_days'] * ease)
+
+    return dict(state, ease=ease, repetitions=repetitions, interval_days=interval,
+                due_at=reviewed_at + timedelta(days=interval), last_reviewed_at=reviewed_at)
+
+
+def apply_answers(user_id: str, answers: Iterable[Dict[str, Any]]) -> int:
+    """Fold a batch of answers (quiz_answers rows) into the user's review state.
+
+    Missed questions enter the queue; questions already in it are rescheduled
+    whatever the outcome. Answers are replayed in answered_at order with one
+    read and one bulk upsert per batch (caller commits).
+    """
+    answers = sorted(answers, key=lambda a: a.get('answered_at') or datetime.min)
+    if not answers:
+        return 0
+
+    states = {
+        item.question_id: {field: getattr(item, field) for field in STATE_FIELDS}
+        for item in ReviewItem.query.filter(
+            ReviewItem.user_id == user_id,
+            ReviewItem.question_id.in_(list({a['question_id'] for a in answers}))
+        )
+    }
+
+    for answer in answers:
+        reviewed_at = answer.get('answered_at') or datetime.utcnow()
+        state = states.get(answer['question_id'])
+        if state is None:
+            if answer['is_correct']:
+                continue
+            state = {'ease': 2.5, 'interval_days': 0.0, 'repetitions': 0, 'lapses': 0,
+                     'due_at': reviewed_at, 'last_reviewed_at': None}
+        quality = answer_quality(answer['is_correct'], answer.get('time_spent', 0))
+        states[answer['question_id']] = schedule(state, quality, reviewed_at)
+
+    if not states:
+        return 0
+
+    stmt = dialect_insert(ReviewItem)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id', 'question_id'],
+        set_={field: stmt.excluded[field] for field in STATE_FIELDS}
+    )
+    db.session.execute(stmt, [
+        dict(state, user_id=user_id, question_id=question_id)
+        for question_id, state in states.items()
+    ])
+    return len(states)
+
+
+def due_reviews(user_id: str, limit: int = 20,
+                now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Next due reviews as a range read on (user_id, due_at)"""
+    now = now or datetime.utcnow()
+    rows = db.session.execute(
+        db.select(ReviewItem, Question)
+        .join(Question, Question.id == ReviewItem.question_id)
+        .where(ReviewItem.user_id == user_id, ReviewItem.due_at <= now)
+        .order_by(ReviewItem.due_at)
+        .limit(min(limit, MAX_DUE_BATCH))
+    ).all()
+
+    return [
+        {
+            'question': question.to_payload(),
+            'due_at': item.due_at.isoformat(),
+            'repetitions': item.repetitions,
+            'lapses': item.lapses,
+            'interval_days': item.interval_days
+        }
+        for item, question in rows
+    ]
+
+
+def due_count(user_id: str, now: Optional[datetime] = None) -> int:
+    now = now or datetime.utcnow()
+    return db.session.execute(
+        db.select(db.func.count()).select_from(ReviewItem)
+        .where(ReviewItem.user_id == user_id, ReviewItem.due_at <= now)
+    ).scalar()
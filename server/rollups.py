@@ -0,0 +1,159 @@
+"""
+Smart Quiz App - Statistics Rollups
+Daily per-user, per-subject buckets maintained incrementally as quizzes complete
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from models import db, dialect_insert, Quiz, UserDailyStat
+
+# Window sizes accepted by /analytics/user-stats
+TIMEFRAME_DAYS = {
+    'day': 1,
+    'week': 7,
+    'month': 30,
+    'year': 365
+}
+
+BUCKET_KEY = ('user_id', 'day', 'subject')
+BUCKET_COUNTERS = ('quizzes', 'questions', 'correct', 'time_spent')
+# A quiz is bucketed on the first of these that is set, else today
+DAY_SOURCES = ('completed_at', 'started_at')
+
+
+def _quiz_day(quiz: Quiz) -> date:
+    moments = (getattr(quiz, name) for name in DAY_SOURCES)
+    return next((m for m in moments if m is not None), datetime.utcnow()).date()
+
+
+def _quiz_day_sql(now: datetime):
+    """_quiz_day as a SQL expression over the quizzes table"""
+    return db.func.date(db.func.coalesce(*(getattr(Quiz, name) for name in DAY_SOURCES), now))
+
+
+def apply_quizzes(quizzes: Iterable[Quiz]) -> List[Dict[str, Any]]:
+    """Fold newly completed quizzes into their daily buckets.
+
+    Quizzes are pre-aggregated in memory so each touched bucket costs one
+    upsert row. The caller owns the transaction and must only pass quizzes
+    that have not been applied before, otherwise they are counted twice.
+    Returns the per-bucket deltas that were applied.
+    """
+    deltas = defaultdict(lambda: dict.fromkeys(BUCKET_COUNTERS, 0))
+    for quiz in quizzes:
+        if not quiz.is_completed:
+            continue
+        bucket = deltas[(quiz.user_id, _quiz_day(quiz), quiz.subject)]
+        bucket['quizzes'] += 1
+        bucket['questions'] += quiz.total_questions or 0
+        bucket['correct'] += quiz.correct_answers or 0
+        bucket['time_spent'] += quiz.time_spent or 0
+
+    if not deltas:
+        return []
+
+    rows = [dict(zip(BUCKET_KEY, key), **counters) for key, counters in deltas.items()]
+    table = UserDailyStat.__table__
+    stmt = dialect_insert(UserDailyStat)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(BUCKET_KEY),
+        set_={name: table.c[name] + stmt.excluded[name] for name in BUCKET_COUNTERS}
+    )
+    db.session.execute(stmt, rows)
+
+    return [dict(row, day=row['day'].isoformat()) for row in rows]
+
+
+def _accuracy(counts: Dict[str, int]) -> float:
+    return round(counts['correct'] / counts['questions'] * 100, 1) if counts['questions'] else 0.0
+
+
+def get_user_stats(user_id: str, days: int, today: Optional[date] = None) -> Dict[str, Any]:
+    """Build the user-stats payload from the rollups of the last `days` days"""
+    today = today or datetime.utcnow().date()
+    since = today - timedelta(days=days - 1)
+
+    buckets = UserDailyStat.query.filter(
+        UserDailyStat.user_id == user_id,
+        UserDailyStat.day >= since
+    ).all()
+
+    daily = {since + timedelta(days=i): dict.fromkeys(BUCKET_COUNTERS, 0) for i in range(days)}
+    subjects = defaultdict(lambda: dict.fromkeys(BUCKET_COUNTERS, 0))
+    for bucket in buckets:
+        for target in (daily.setdefault(bucket.day, dict.fromkeys(BUCKET_COUNTERS, 0)),
+                       subjects[bucket.subject]):
+            for name in BUCKET_COUNTERS:
+                target[name] += getattr(bucket, name)
+
+    totals = {name: sum(s[name] for s in subjects.values()) for name in BUCKET_COUNTERS}
+    favorite_subject = max(subjects, key=lambda s: subjects[s]['questions']) if subjects else None
+
+    return {
+        'total_quizzes': totals['quizzes'],
+        'total_questions': totals['questions'],
+        'total_correct': totals['correct'],
+        'average_accuracy': _accuracy(totals),
+        'total_time_spent': totals['time_spent'],
+        'favorite_subject': favorite_subject,
+        'subject_stats': {
+            subject: {
+                'quizzes_completed': s['quizzes'],
+                'questions': s['questions'],
+                'correct': s['correct'],
+                'average_accuracy': _accuracy(s),
+                'total_time_spent': s['time_spent']
+            }
+            for subject, s in subjects.items()
+        },
+        'weekly_progress': [
+            {
+                'date': day.isoformat(),
+                'quizzes': d['quizzes'],
+                'questions': d['questions'],
+                'correct': d['correct'],
+                'time_spent': d['time_spent']
+            }
+            for day, d in sorted(daily.items())
+        ]
+    }
+
+
+def backfill(user_id: Optional[str] = None) -> int:
+    """Rebuild rollups from the quizzes table; returns the number of buckets written"""
+    delete = UserDailyStat.query
+    if user_id:
+        delete = delete.filter(UserDailyStat.user_id == user_id)
+    delete.delete(synchronize_session=False)
+
+    # Day computed in a subquery so the grouping does not repeat its bound `now`
+    quizzes = db.select(
+        Quiz.user_id,
+        _quiz_day_sql(datetime.utcnow()).label('day'),
+        Quiz.subject,
+        Quiz.id,
+        Quiz.total_questions,
+        Quiz.correct_answers,
+        Quiz.time_spent
+    ).where(Quiz.is_completed.is_(True))
+    if user_id:
+        quizzes = quizzes.where(Quiz.user_id == user_id)
+    quizzes = quizzes.subquery()
+
+    source = db.select(
+        quizzes.c.user_id,
+        quizzes.c.day,
+        quizzes.c.subject,
+        db.func.count(quizzes.c.id),
+        db.func.coalesce(db.func.sum(quizzes.c.total_questions), 0),
+        db.func.coalesce(db.func.sum(quizzes.c.correct_answers), 0),
+        db.func.coalesce(db.func.sum(quizzes.c.time_spent), 0)
+    ).group_by(quizzes.c.user_id, quizzes.c.day, quizzes.c.subject)
+
+    result = db.session.execute(
+        db.insert(UserDailyStat).from_select(list(BUCKET_KEY + BUCKET_COUNTERS), source)
+    )
+    db.session.commit()
+    return result.rowcount
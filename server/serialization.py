@@ -0,0 +1,137 @@
+"""
+Smart Quiz App - Response Serialization
+Fast JSON provider, MessagePack negotiation and helpers for splicing pre-serialized payloads
+"""
+
+import json
+import logging
+from datetime import date, datetime
+from typing import Any, Dict
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # stdlib json fallback
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # JSON only
+    msgpack = None
+
+MSGPACK_MIMETYPE = 'application/msgpack'
+MSGPACK_MIMETYPES = (MSGPACK_MIMETYPE, 'application/x-msgpack')
+
+logger = logging.getLogger(__name__)
+
+
+def _fallback_default(value: Any) -> Any:
+    return DefaultJSONProvider.default(value)
+
+
+def dumps_bytes(value: Any) -> bytes:
+    """Compact UTF-8 JSON bytes, via orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(value, default=_fallback_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, default=_fallback_default, ensure_ascii=False,
+                      separators=(',', ':')).encode('utf-8')
+
+
+def loads(value) -> Any:
+    if orjson is not None:
+        return orjson.loads(value)
+    return json.loads(value)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson; responses skip the bytes -> str round trip"""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if kwargs.get('indent') or kwargs.get('sort_keys'):
+            return super().dumps(obj, **kwargs)
+        return dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs: Any) -> Any:
+        return loads(s)
+
+    def response(self, *args: Any, **kwargs: Any):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj) + b'\n', mimetype=self.mimetype)
+
+
+def init_app(app) -> None:
+    if orjson is None:
+        logger.info("orjson not installed, using the stdlib JSON provider")
+        return
+    app.json = OrjsonProvider(app)
+
+
+def splice_json(raw_fields: Dict[str, bytes], fields: Dict[str, Any]) -> bytes:
+    """Build a JSON object from already-serialized members plus ordinary ones.
+
+    `raw_fields` values must be valid JSON documents (e.g. cached blobs); they
+    are copied into the output without being parsed.
+    """
+    parts = [dumps_bytes(name) + b':' + raw for name, raw in raw_fields.items()]
+    tail = dumps_bytes(fields)
+    if tail != b'{}':
+        parts.append(tail[1:-1])
+    return b'{' + b','.join(parts) + b'}\n'
+
+
+def raw_json_response(app, raw_fields: Dict[str, bytes], fields: Dict[str, Any], status: int = 200):
+    if wants_msgpack():
+        # The cached JSON has to be decoded once for a binary client
+        decoded = {name: loads(raw) for name, raw in raw_fields.items()}
+        return response(app, dict(decoded, **fields), status)
+    rv = app.response_class(splice_json(raw_fields, fields), status=status,
+                            mimetype='application/json')
+    rv.vary.add('Accept')
+    return rv
+
+
+# MessagePack
+def _msgpack_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return _fallback_default(value)
+
+
+def pack(value: Any) -> bytes:
+    return msgpack.packb(value, default=_msgpack_default, use_bin_type=True)
+
+
+def unpack(data: bytes) -> Any:
+    if msgpack is None:
+        raise ValueError('MessagePack is not supported by this server')
+    try:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+    except (msgpack.UnpackException, TypeError) as e:
+        raise ValueError(f'Invalid MessagePack body: {e}') from e
+
+
+def is_msgpack_request() -> bool:
+    return request.mimetype in MSGPACK_MIMETYPES
+
+
+def wants_msgpack() -> bool:
+    """Accept header prefers MessagePack over JSON (JSON wins ties and */*)"""
+    if msgpack is None:
+        return False
+    best = request.accept_mimetypes.best_match(('application/json',) + MSGPACK_MIMETYPES)
+    return best in MSGPACK_MIMETYPES
+
+
+def response(app, payload: Any, status: int = 200):
+    """JSON or MessagePack response, negotiated from the Accept header"""
+    if wants_msgpack():
+        rv = app.response_class(pack(payload), status=status, mimetype=MSGPACK_MIMETYPE)
+    else:
+        rv = app.json.response(payload)
+        rv.status_code = status
+    rv.vary.add('Accept')
+    return rv
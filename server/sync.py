@@ -0,0 +1,291 @@
+"""
+Smart Quiz App - Offline Quiz Sync
+Idempotent batch upload of quizzes recorded offline, plus paged delta download by watermark
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from catalog import subject_catalog, DIFFICULTIES
+from counters import question_counters
+from profiles import user_profiles
+import calibration
+import review
+from models import db, dialect_insert, Question, Quiz, QuizAnswer
+import rollups
+
+SYNC_MAX_QUIZZES = 500
+SYNC_MAX_ANSWERS_PER_QUIZ = 100
+SYNC_PULL_LIMIT = 200  # server quizzes per response; `has_more` asks the client to pull again
+# Rows synced within this window are left for the next pull so a transaction
+# that commits slightly late can never slip under a watermark already handed out
+SYNC_WATERMARK_LAG = timedelta(seconds=2)
+
+
+def to_millis(value: Optional[datetime]) -> Optional[int]:
+    return (value - datetime(1970, 1, 1)) // timedelta(milliseconds=1) if value else None
+
+
+def from_millis(value: int) -> datetime:
+    return datetime(1970, 1, 1) + timedelta(milliseconds=value)
+
+
+def parse_timestamp(value: Any) -> Optional[datetime]:
+    """Accept epoch milliseconds (as sent by the Android client) or ISO-8601"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return datetime(1970, 1, 1) + timedelta(milliseconds=value)
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00')).replace(tzinfo=None)
+
+
+def _quiz_row(user_id: str, data: Dict, synced_at: datetime) -> Dict[str, Any]:
+    if not isinstance(data, dict):
+        raise ValueError('Each quiz must be an object')
+    quiz_id = str(data.get('id') or '')
+    if not quiz_id or len(quiz_id) > 36:
+        raise ValueError('Each quiz needs a client-generated id of at most 36 characters')
+
+    total = int(data['total_questions'])
+    correct = int(data.get('correct_answers', 0))
+    if total <= 0 or not (0 <= correct <= total):
+        raise ValueError(f'Quiz {quiz_id} has inconsistent question counts')
+
+    completed_at = parse_timestamp(data.get('completed_at')) or synced_at
+    return {
+        'id': quiz_id,
+        'user_id': user_id,
+        'subject': data['subject'],
+        'difficulty': data['difficulty'],
+        'total_questions': total,
+        'correct_answers': correct,
+        'score': float(data.get('score', correct)),
+        'percentage': float(data.get('percentage', correct / total * 100)),
+        'time_spent': int(data.get('time_spent', 0)),
+        'time_limit': int(data.get('time_limit', 900)),
+        'started_at': parse_timestamp(data.get('started_at')) or completed_at,
+        'completed_at': completed_at,
+        'is_completed': True,
+        'synced_at': synced_at
+    }
+
+
+def _invalid_reason(row: Dict[str, Any]) -> Optional[str]:
+    """Why the server cannot store a quiz's subject/difficulty, None when it can"""
+    if not isinstance(row['subject'], str) or not subject_catalog.has_subject(row['subject']):
+        return 'invalid_subject'
+    if row['difficulty'] not in DIFFICULTIES:
+        return 'invalid_difficulty'
+    return None
+
+
+def _answer_rows(quiz: Dict[str, Any], answers: Any) -> List[Dict[str, Any]]:
+    """Answer log rows, checked for shape only; `_grade` fills in is_correct"""
+    if not isinstance(answers, list):
+        raise ValueError(f"Quiz {quiz['id']} answers must be a list")
+    if len(answers) > min(SYNC_MAX_ANSWERS_PER_QUIZ, quiz['total_questions']):
+        raise ValueError(f"Quiz {quiz['id']} has too many answers")
+    rows, seen = [], set()
+    for answer in answers:
+        if not isinstance(answer, dict):
+            raise ValueError(f"Quiz {quiz['id']} has an answer that is not an object")
+        question_id = str(answer['question_id'])
+        selected = answer.get('selected_answer_index')
+        if not question_id or len(question_id) > 36 or question_id in seen:
+            raise ValueError(f"Quiz {quiz['id']} has a missing, too long or repeated question id")
+        if selected is not None and (not isinstance(selected, int) or isinstance(selected, bool)):
+            raise ValueError(f"Quiz {quiz['id']} has a non-integer selected_answer_index")
+        seen.add(question_id)
+        rows.append({
+            'quiz_id': quiz['id'],
+            'question_id': question_id,
+            'user_id': quiz['user_id'],
+            'selected_answer_index': selected,
+            'is_correct': False,
+            'time_spent': int(answer.get('time_spent', 0)),
+            'answered_at': quiz['completed_at']
+        })
+    return rows
+
+
+def _grade(rows: Dict[str, Any], conflicts: List[Dict[str, str]]) -> None:
+    """Grade every answer against the bank in one query; quizzes it cannot grade become conflicts.
+
+    Client is_correct flags are ignored. A quiz that carries answers gets
+    its correct count and percentage from the server's grading too.
+    """
+    question_ids = {answer['question_id'] for _, answers in rows.values() for answer in answers}
+    if not question_ids:
+        return
+    keys = {
+        qid: (correct, len(options or []))
+        for qid, correct, options in db.session.execute(
+            db.select(Question.id, Question.correct_answer_index, Question.options)
+            .where(Question.id.in_(question_ids))
+        )
+    }
+    for quiz_id, (row, answers) in list(rows.items()):
+        reason = None
+        for answer in answers:
+            key = keys.get(answer['question_id'])
+            selected = answer['selected_answer_index']
+            if key is None:
+                reason = 'unknown_question'
+            elif selected is not None and not 0 <= selected < key[1]:
+                reason = 'invalid_answer'
+            if reason:
+                break
+            answer['is_correct'] = selected == key[0]
+        if reason:
+            del rows[quiz_id]
+            conflicts.append({'quiz_id': quiz_id, 'reason': reason})
+        elif answers:
+            row['correct_answers'] = sum(answer['is_correct'] for answer in answers)
+            row['score'] = float(row['correct_answers'])
+            row['percentage'] = row['correct_answers'] / row['total_questions'] * 100
+
+
+def serialize_quiz(quiz: Quiz) -> Dict[str, Any]:
+    return {
+        'id': quiz.id,
+        'subject': quiz.subject,
+        'difficulty': quiz.difficulty,
+        'total_questions': quiz.total_questions,
+        'correct_answers': quiz.correct_answers,
+        'score': quiz.score,
+        'percentage': quiz.percentage,
+        'time_spent': quiz.time_spent,
+        'completed_at': to_millis(quiz.completed_at)
+    }
+
+
+def sync_quizzes(user_id: str, payload: Dict) -> Dict[str, Any]:
+    """Upsert a batch of offline quizzes and return what changed on the server.
+
+    Re-sending a batch is harmless: quizzes are keyed by their client id and
+    only rows that are actually inserted reach the answer log and rollups.
+    Answers are graded against the bank, not the client's flags. Quizzes
+    for a subject, difficulty or question the server does not know, or
+    with an answer outside a question's options, are returned as conflicts
+    rather than failing the batch, so one stale record cannot block the
+    rest of the client's queue.
+
+    Server quizzes changed since `last_sync_timestamp` come back at most
+    SYNC_PULL_LIMIT at a time; the returned timestamp covers exactly the
+    quizzes sent (every quiz synced up to and including that millisecond),
+    and `has_more` tells the client to pull again with it.
+    """
+    quizzes = payload.get('quizzes') or []
+    if not isinstance(quizzes, list):
+        raise ValueError('quizzes must be a list')
+    if len(quizzes) > SYNC_MAX_QUIZZES:
+        raise ValueError(f'At most {SYNC_MAX_QUIZZES} quizzes per sync')
+
+    now = datetime.utcnow()
+    since = to_millis(parse_timestamp(payload.get('last_sync_timestamp'))) or 0
+
+    rows, conflicts = {}, []
+    try:
+        for data in quizzes:
+            row = _quiz_row(user_id, data, now)
+            reason = _invalid_reason(row)
+            if reason:
+                rows.pop(row['id'], None)
+                conflicts.append({'quiz_id': row['id'], 'reason': reason})
+                continue
+            rows[row['id']] = (row, _answer_rows(row, data.get('answers') or []))
+    except (KeyError, TypeError) as e:
+        raise ValueError(f'Malformed quiz record: {e}')
+    _grade(rows, conflicts)
+
+    # Ids owned by another user are conflicts, our own are replays
+    duplicates = []
+    if rows:
+        existing = db.session.execute(
+            db.select(Quiz.id, Quiz.user_id).where(Quiz.id.in_(list(rows)))
+        ).all()
+        for quiz_id, owner_id in existing:
+            rows.pop(quiz_id)
+            if owner_id == user_id:
+                duplicates.append(quiz_id)
+            else:
+                conflicts.append({'quiz_id': quiz_id, 'reason': 'id_taken'})
+
+    inserted_ids = set()
+    rollup_deltas = []
+    if rows:
+        stmt = dialect_insert(Quiz).on_conflict_do_nothing(index_elements=['id'])
+        result = db.session.execute(
+            stmt.returning(Quiz.__table__.c.id),
+            [row for row, _ in rows.values()]
+        )
+        inserted_ids = set(result.scalars().all())
+
+        answer_rows = []
+        for quiz_id in inserted_ids:
+            answer_rows.extend(rows[quiz_id][1])
+        if answer_rows:
+            db.session.execute(
+                dialect_insert(QuizAnswer).on_conflict_do_nothing(
+                    index_elements=['quiz_id', 'question_id']
+                ),
+                answer_rows
+            )
+
+        rollup_deltas = rollups.apply_quizzes(
+            Quiz(**rows[quiz_id][0]) for quiz_id in inserted_ids
+        )
+        calibration.update_ability(user_id, [
+            [(answer['question_id'], answer['is_correct']) for answer in rows[quiz_id][1]]
+            for quiz_id in sorted(inserted_ids, key=lambda qid: rows[qid][0]['completed_at'])
+        ])
+        review.apply_answers(user_id, answer_rows)
+
+    db.session.commit()
+    if inserted_ids:
+        user_profiles.invalidate(user_id)
+        question_counters.record_answers(
+            (answer['question_id'], answer['is_correct'])
+            for quiz_id in inserted_ids for answer in rows[quiz_id][1]
+        )
+
+    watermark = to_millis(now - SYNC_WATERMARK_LAG)
+    changed, last_sync, has_more = _changed_since(user_id, since, watermark)
+    return {
+        'synced_count': len(inserted_ids),
+        'duplicates': duplicates,
+        'conflicts': conflicts,
+        'server_quizzes': [serialize_quiz(q) for q in changed],
+        'has_more': has_more,
+        'rollup_deltas': rollup_deltas,
+        'last_sync_timestamp': last_sync
+    }
+
+
+def _changed_since(user_id: str, since: int, watermark: int) -> Tuple[List[Quiz], int, bool]:
+    """One page of quizzes synced in the milliseconds after `since`, up to `watermark`.
+
+    Returns (quizzes, last millisecond they cover, has_more). Pages end on
+    a millisecond boundary so quizzes synced in the same millisecond are
+    never split across pages; a millisecond holding more than a page is
+    sent whole.
+    """
+    def page(before: int, limit: Optional[int] = None) -> List[Quiz]:
+        query = Quiz.query.filter(
+            Quiz.user_id == user_id,
+            Quiz.synced_at >= from_millis(since + 1),
+            Quiz.synced_at < from_millis(before)
+        ).order_by(Quiz.synced_at, Quiz.id)
+        return query.limit(limit).all() if limit else query.all()
+
+    if watermark <= since:
+        return [], since, False
+    quizzes = page(watermark + 1, SYNC_PULL_LIMIT + 1)
+    if len(quizzes) <= SYNC_PULL_LIMIT:
+        return quizzes, watermark, False
+
+    boundary = to_millis(quizzes[SYNC_PULL_LIMIT].synced_at)
+    quizzes = [q for q in quizzes[:SYNC_PULL_LIMIT] if to_millis(q.synced_at) < boundary]
+    if quizzes:
+        return quizzes, boundary - 1, True
+    return page(boundary + 1), boundary, True
@@ -0,0 +1,94 @@
+"""
+Shared fixtures: one app built from TestingConfig (in-memory SQLite, no Redis),
+fresh tables for every test, and helpers to register users and seed questions.
+
+Redis-backed code paths are exercised with fakeredis in the tests that need them,
+so the suite gives the same results whether or not a Redis server is reachable.
+"""
+
+import atexit
+import os
+import shutil
+import socket
+import sys
+import tempfile
+
+import pytest
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+# Config classes read the environment when config.py is imported, so this runs first
+_workdir = tempfile.mkdtemp(prefix='smartquiz-tests-')
+atexit.register(shutil.rmtree, _workdir, True)
+os.environ.update(
+    FLASK_ENV='testing',
+    REDIS_HOST='127.0.0.1', REDIS_PORT=str(_free_port()),  # nothing listens: in-process fallbacks
+    ANALYTICS_QUEUE_DIR=os.path.join(_workdir, 'queue'),
+    QUESTION_BANK_PATH=os.path.join(_workdir, 'questions.bank'),
+    CACHE_WARM_SNAPSHOT=os.path.join(_workdir, 'warm_keys.json'),
+    CONTENT_PACKS_DIR=os.path.join(_workdir, 'packs'),
+    CACHE_WARM_ON_STARTUP='false', DB_MIGRATIONS_CLI='false',
+    QUESTION_COUNTERS_FLUSH_INTERVAL='3600',  # tests flush explicitly
+    JWT_SECRET_KEY=os.environ.get('JWT_SECRET_KEY') or 'test-jwt-secret-key-of-32-bytes!',
+    LOG_LEVEL='WARNING'
+)
+
+from app import create_app  # noqa: E402
+from models import db, Question  # noqa: E402
+
+PASSWORD = 'Password-12345'
+
+
+@pytest.fixture(scope='session')
+def app():
+    return create_app('testing')
+
+
+@pytest.fixture(autouse=True)
+def database(app):
+    with app.app_context():
+        db.create_all()
+        yield db
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def make_user(client):
+    """Register a user through the API; returns {'id', 'headers'}"""
+    def make(username: str = 'tester'):
+        response = client.post('/api/v1/users/register', json={
+            'username': username, 'email': f'{username}@example.com',
+            'password': PASSWORD, 'display_name': username.title()})
+        assert response.status_code == 201, response.get_json()
+        body = response.get_json()
+        headers = {'Authorization': f"Bearer {body['access_token']}"}
+        return {'id': body['user']['id'], 'headers': headers}
+    return make
+
+
+@pytest.fixture
+def user(make_user):
+    return make_user()
+
+
+@pytest.fixture
+def questions():
+    """Ids of six active math/easy questions; question i has options A-D and answer i % 4"""
+    rows = [
+        Question(subject='math', difficulty='easy', question_text=f'Question {i}?',
+                 options=['A', 'B', 'C', 'D'], correct_answer_index=i % 4,
+                 explanation=f'Because {i}', tags=['algebra'])
+        for i in range(6)
+    ]
+    db.session.add_all(rows)
+    db.session.commit()
+    return [q.id for q in rows]
@@ -0,0 +1,83 @@
+"""Adaptive selection: difficulty buckets, ability-matched picks and the seen filter"""
+
+import pytest
+
+import adaptive
+from models import db, Question
+
+
+@pytest.fixture(params=['memory', 'redis'])
+def selector(request, app, monkeypatch):
+    redis_client = None
+    if request.param == 'redis':
+        fakeredis = pytest.importorskip('fakeredis')
+        redis_client = fakeredis.FakeRedis(decode_responses=True)
+    selector = adaptive.AdaptiveSelector()
+    selector.init_app(app, redis_client)
+    monkeypatch.setattr(adaptive, 'adaptive_selector', selector)  # the ORM hooks report here
+    return selector
+
+
+@pytest.fixture
+def ladder():
+    """Ids of ten physics questions by calibrated difficulty, from -2.0 up to 2.5"""
+    rows = [Question(subject='physics', difficulty='medium', question_text=f'Step {i}?',
+                     options=['A', 'B'], correct_answer_index=0, irt_difficulty=-2.0 + i * 0.5)
+            for i in range(10)]
+    db.session.add_all(rows)
+    db.session.commit()
+    return [q.id for q in rows]
+
+
+def test_bucket_of_clamps_to_the_ability_range():
+    assert adaptive.bucket_of(-100) == 0
+    assert adaptive.bucket_of(100) == adaptive.bucket_of(adaptive.ABILITY_RANGE[1] - 0.01)
+    assert adaptive.bucket_of(0.0) == adaptive.bucket_of(0.49) != adaptive.bucket_of(0.5)
+
+
+def test_picks_start_near_the_target_difficulty(selector, ladder, questions):
+    assert selector.rebuild() == 16
+    target = -adaptive.TARGET_OFFSET  # ability 0 aims ~0.85 below it
+    first = selector.pick('user-1', 'physics', 0.0, 1)
+    assert len(first) == 1
+    difficulty = {qid: db.session.get(Question, qid).irt_difficulty for qid in ladder}
+    closest = min(ladder, key=lambda qid: abs(difficulty[qid] - target))
+    assert first == [closest]
+
+    picked = selector.pick('user-1', 'physics', 0.0, 4)
+    assert len(picked) == 4 and len(set(picked)) == 4
+    assert set(picked) <= set(ladder)
+    assert selector.pick('user-1', 'chemistry', 0.0, 4) == []
+
+
+def test_seen_questions_are_skipped(selector, ladder):
+    selector.rebuild()
+    assert selector.filter_unseen('user-1', ladder) == ladder
+    selector.mark_seen('user-1', ladder[:5])
+    assert selector.filter_unseen('user-1', ladder) == ladder[5:]
+    assert selector.filter_unseen('user-2', ladder) == ladder
+
+
+def test_new_and_deactivated_questions_update_the_buckets(selector, ladder):
+    selector.rebuild()
+    extra = Question(subject='biology', difficulty='easy', question_text='New?',
+                     options=['A', 'B'], correct_answer_index=0)
+    db.session.add(extra)
+    db.session.commit()
+    selector.add_questions([extra])
+    assert selector.pick('user-1', 'biology', -1.0, 3) == [extra.id]
+
+    for qid in ladder:
+        db.session.get(Question, qid).is_active = False
+    db.session.commit()
+    assert selector.pick('user-1', 'physics', 0.0, 10) == []
+
+
+def test_rolled_back_deactivation_keeps_the_question(selector, ladder):
+    selector.rebuild()
+    db.session.get(Question, ladder[0]).is_active = False
+    db.session.flush()
+    db.session.rollback()
+    db.session.commit()
+    assert selector.filter_unseen('user-1', [ladder[0]]) == [ladder[0]]
+    assert ladder[0] in selector.pick('user-1', 'physics', -2.0, 10)
@@ -0,0 +1,79 @@
+"""Question bank import/export: dedup, validation, resumable imports and safe file names"""
+
+import json
+import os
+
+import bank_transfer
+from models import db, Question
+
+
+def _record(i, **fields):
+    return dict({'subject': 'math', 'difficulty': 'easy', 'question_text': f'Imported {i}?',
+                 'options': ['A', 'B', 'C'], 'correct_answer_index': i % 3, 'tags': ['algebra']},
+                **fields)
+
+
+def _write_jsonl(path, records):
+    with open(path, 'w') as fh:
+        for record in records:
+            fh.write(json.dumps(record) + '\n')
+    return str(path)
+
+
+def test_import_keeps_given_ids_next_to_generated_ones(tmp_path):
+    path = _write_jsonl(tmp_path / 'bank.jsonl', [
+        _record(0, id='given-0'), _record(1), _record(2, id='given-2'), _record(3)])
+
+    report = bank_transfer.import_questions(path, chunk=10)
+    assert (report['inserted'], report['invalid']) == (4, 0)
+    ids = {q.question_text: q.id for q in Question.query.all()}
+    assert (ids['Imported 0?'], ids['Imported 2?']) == ('given-0', 'given-2')
+    assert len(set(ids.values())) == 4
+    assert not os.path.exists(f'{path}.checkpoint')
+
+
+def test_import_skips_duplicates_and_invalid_rows(tmp_path):
+    path = _write_jsonl(tmp_path / 'bank.jsonl', [
+        _record(0), _record(0),  # same content twice
+        _record(1, subject='../../etc'),
+        _record(2, difficulty='insane'),
+        _record(3, correct_answer_index=5),
+        _record(4, id='x' * 40),
+    ])
+
+    report = bank_transfer.import_questions(path, chunk=2)
+    assert (report['read'], report['inserted']) == (6, 1)
+    assert (report['duplicates'], report['invalid']) == (1, 4)
+
+    again = bank_transfer.import_questions(path, chunk=2)
+    assert (again['inserted'], again['duplicates']) == (0, 2)
+    assert Question.query.count() == 1
+
+
+def test_import_reads_csv(tmp_path):
+    path = tmp_path / 'bank.csv'
+    path.write_text('subject,difficulty,question_text,options,correct_answer_index,tags\n'
+                    'math,hard,"2 + 2?","[""3"", ""4""]",1,"[""arithmetic""]"\n')
+
+    assert bank_transfer.import_questions(str(path))['inserted'] == 1
+    question = Question.query.one()
+    assert question.difficulty == 'hard'
+    assert (question.options, question.tags) == (['3', '4'], ['arithmetic'])
+
+
+def test_export_writes_one_safe_file_per_subject(app, tmp_path, questions):
+    db.session.add(Question(subject='../history', difficulty='easy', question_text='Escape?',
+                            options=['A', 'B'], correct_answer_index=0))
+    db.session.commit()
+    out = tmp_path / 'export'
+
+    report = bank_transfer.export_questions(app, str(out), processes=1, progress=lambda line: None)
+    assert report['files'] == {'math': 6, '../history': 1}
+    names = sorted(os.listdir(out))
+    assert len(names) == 2 and 'math.jsonl' in names
+    assert all(os.sep not in name and not name.startswith('.') for name in names)
+    assert not os.path.exists(tmp_path / 'history.jsonl')
+
+    with open(out / 'math.jsonl') as fh:
+        exported = [json.loads(line) for line in fh]
+    assert sorted(q['id'] for q in exported) == sorted(questions)
@@ -0,0 +1,86 @@
+"""Cache warmer: the heavy-hitters sketch, shared rankings and warming pools from the bank"""
+
+import os
+from collections import OrderedDict
+
+import pytest
+
+from cache_warmer import CacheWarmer, HeavyHitters, decode_key, encode_key
+from question_pools import question_pools
+
+
+@pytest.fixture(params=['snapshot', 'redis'])
+def warmer(request, app, tmp_path):
+    redis_client = None
+    if request.param == 'redis':
+        fakeredis = pytest.importorskip('fakeredis')
+        redis_client = fakeredis.FakeRedis(decode_responses=True)
+    warmer = CacheWarmer()
+    warmer.init_app(app, redis_client)
+    warmer.snapshot_path = str(tmp_path / 'warm_keys.json')
+    warmer._flusher_pid = os.getpid()  # flush by hand
+    return warmer
+
+
+@pytest.fixture
+def pools(monkeypatch):
+    monkeypatch.setattr(question_pools, '_local', OrderedDict())
+    return question_pools
+
+
+def test_sketch_keeps_the_heavy_hitters():
+    sketch = HeavyHitters(capacity=2)
+    for key in ['a'] * 5 + ['b'] * 3 + ['c']:
+        sketch.add(key)
+    # 'c' took over the least counted slot and inherited its count
+    assert sketch.top() == [('a', 5.0), ('c', 4.0)]
+    sketch.decay(0.5)
+    assert sketch.top(1) == [('a', 2.5)]
+    sketch.decay(0.001)
+    assert len(sketch) == 0
+
+
+def test_keys_round_trip():
+    key = encode_key('math', 'easy', ['algebra'])
+    assert decode_key(key) == ('math', 'easy', ['algebra'])
+    assert decode_key('not json') is None
+    assert decode_key('[1, 2]') is None
+
+
+def test_flush_ranks_keys_with_their_largest_count(warmer, app):
+    for count in (5, 15, 10):
+        warmer.record('math', 'easy', ['algebra'], count)
+    warmer.record('physics', 'hard', [], 3)
+    assert warmer.flush() == 2
+
+    hot = warmer.hot_keys()
+    assert [key for key, _ in hot] == [('math', 'easy', ['algebra'], 15),
+                                       ('physics', 'hard', [], 3)]
+
+    # The snapshot file alone restores the ranking (after a deploy or a Redis flush)
+    restored = CacheWarmer()
+    restored.init_app(app)
+    restored.snapshot_path = warmer.snapshot_path
+    assert restored.hot_keys() == hot
+
+
+def test_warm_fills_pools_for_hot_keys(warmer, pools, questions):
+    warmer.record('math', 'easy', ['algebra'], 2)
+    warmer.record('astrology', 'easy', [], 2)  # unknown subject: skipped
+    warmer.flush()
+
+    report = warmer.warm(budget=5)
+    assert (report['keys'], report['warmed'], report['skipped']) == (2, 1, 1)
+    assert report['questions'] == 6
+    assert sorted(pools.candidates('math', 'easy', ['algebra'])) == sorted(questions)
+
+    # Pools already hold what a request samples
+    assert warmer.warm(budget=5)['questions'] == 0
+
+
+def test_warm_stops_at_the_budget(warmer, pools, questions):
+    warmer.record('math', 'easy', [], 2)
+    warmer.flush()
+    report = warmer.warm(budget=0)
+    assert report['warmed'] == 0 and report['skipped'] == 1
+    assert pools.candidates('math', 'easy', []) == []
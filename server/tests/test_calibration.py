@@ -0,0 +1,67 @@
+"""IRT calibration: the batch 2PL fit, stored parameters and the online ability step"""
+
+import numpy as np
+
+import calibration
+from models import db, Question, Quiz, QuizAnswer, User
+
+
+def test_prior_difficulty():
+    assert calibration.prior_difficulty('hard') == 1.0
+    assert calibration.prior_difficulty('unknown') == 0.0
+    assert calibration.prior_difficulty('easy', 1.0) == 2.0
+    assert calibration.prior_difficulty('easy', 7.0) == -1.0  # out-of-range score: label wins
+
+
+def test_fit_recovers_ability_and_difficulty_order():
+    rng = np.random.default_rng(7)
+    true_theta = np.linspace(-2, 2, 200)
+    true_b = np.linspace(-1.5, 1.5, 20)
+    users, items = np.meshgrid(np.arange(200), np.arange(20), indexing='ij')
+    users, items = users.ravel(), items.ravel()
+    p = 1 / (1 + np.exp(-(true_theta[users] - true_b[items])))
+    correct = (rng.random(len(p)) < p).astype(np.int8)
+
+    theta, b, a = calibration.fit_2pl(users, items, correct, 200, 20, iterations=30)
+    assert np.corrcoef(b, true_b)[0, 1] > 0.9
+    assert np.corrcoef(theta, true_theta)[0, 1] > 0.8
+    assert np.all((a >= 0.2) & (a <= 3.0))
+
+
+def _answer(quiz, question_id, is_correct):
+    return QuizAnswer(quiz_id=quiz.id, question_id=question_id, user_id=quiz.user_id,
+                      selected_answer_index=0, is_correct=is_correct)
+
+
+def test_calibrate_stores_parameters(make_user, questions):
+    strong, weak = make_user('strong'), make_user('weak')
+    for account, right in ((strong, 6), (weak, 1)):
+        quiz = Quiz(user_id=account['id'], subject='math', difficulty='easy', total_questions=6)
+        db.session.add(quiz)
+        db.session.flush()
+        db.session.add_all(_answer(quiz, qid, i < right) for i, qid in enumerate(questions))
+    db.session.commit()
+
+    report = calibration.calibrate()
+    assert (report['responses'], report['questions'], report['users']) == (12, 6, 2)
+    assert db.session.get(User, strong['id']).ability > db.session.get(User, weak['id']).ability
+    # Everyone answered the first question and only the strong user the last ones
+    first, last = db.session.get(Question, questions[0]), db.session.get(Question, questions[-1])
+    assert first.irt_difficulty < last.irt_difficulty
+    assert last.irt_discrimination is not None
+
+
+def test_calibrate_without_answers():
+    assert calibration.calibrate()['responses'] == 0
+
+
+def test_online_ability_step(user, questions):
+    assert calibration.update_ability(user['id'], []) is None
+    assert calibration.update_ability(user['id'], [[('no-such-question', True)]]) is None
+
+    up = calibration.update_ability(user['id'], [[(qid, True) for qid in questions]])
+    assert 0 < up <= calibration.ONLINE_STEP
+    down = calibration.update_ability(user['id'], [[(qid, False) for qid in questions]] * 3)
+    assert down < up
+    db.session.commit()
+    assert db.session.get(User, user['id']).ability == down
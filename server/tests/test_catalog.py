@@ -0,0 +1,76 @@
+"""Subject catalog: counts built once, kept current by committed ORM changes"""
+
+import pytest
+
+from catalog import DEFAULT_SUBJECTS, subject_catalog
+from models import db, Question
+
+
+@pytest.fixture
+def catalog(app, questions):
+    subject_catalog.rebuild()
+    yield subject_catalog
+    subject_catalog.init_app(app)  # the next test starts from a fresh scan
+
+
+def _counts(catalog, subject):
+    payload = {s['subject']: s for s in catalog.subjects_payload()['subjects']}
+    return payload[subject]['question_counts']
+
+
+def _topics(catalog, subject):
+    return {t['topic']: t['question_counts'] for t in catalog.topics_payload(subject)['topics']}
+
+
+def test_rebuild_counts_active_questions(catalog):
+    assert catalog.subjects() == list(DEFAULT_SUBJECTS)
+    assert _counts(catalog, 'math') == {'easy': 6}
+    assert _counts(catalog, 'physics') == {}
+    assert _topics(catalog, 'math') == {'algebra': {'easy': 6}}
+    assert catalog.topics_payload('astrology') is None
+
+
+def test_committed_changes_update_the_counts(catalog, questions):
+    version = catalog.version()
+    db.session.add(Question(subject='astronomy', difficulty='hard', question_text='Stars?',
+                            options=['A', 'B'], correct_answer_index=0, tags=['stars']))
+    moved = db.session.get(Question, questions[0])
+    moved.difficulty, moved.tags = 'medium', ['geometry']
+    db.session.get(Question, questions[1]).is_active = False
+    db.session.delete(db.session.get(Question, questions[2]))
+    db.session.commit()
+
+    assert catalog.version() != version
+    assert catalog.has_subject('astronomy') and catalog.subjects()[-1] == 'astronomy'
+    assert _counts(catalog, 'math') == {'easy': 3, 'medium': 1}
+    assert _topics(catalog, 'math') == {'algebra': {'easy': 3}, 'geometry': {'medium': 1}}
+    assert _topics(catalog, 'astronomy') == {'stars': {'hard': 1}}
+
+    # A rescan agrees with the incremental counts
+    incremental = catalog.subjects_payload()
+    catalog.rebuild()
+    assert catalog.subjects_payload() == incremental
+
+
+def test_rolled_back_changes_are_dropped(catalog, questions):
+    version = catalog.version()
+    db.session.get(Question, questions[0]).difficulty = 'hard'
+    db.session.flush()
+    db.session.rollback()
+    db.session.commit()
+    assert catalog.version() == version
+    assert _counts(catalog, 'math') == {'easy': 6}
+
+
+def test_subject_routes(client, catalog, questions):
+    subjects = client.get('/api/v1/subjects')
+    etag = subjects.headers['ETag']
+    assert {s['subject'] for s in subjects.get_json()['subjects']} == set(DEFAULT_SUBJECTS)
+    topics = client.get('/api/v1/subjects/math/topics').get_json()
+    assert topics['topics'][0]['topic'] == 'algebra'
+    assert client.get('/api/v1/subjects/astrology/topics').status_code == 404
+
+    db.session.get(Question, questions[0]).is_active = False
+    db.session.commit()
+    changed = client.get('/api/v1/subjects', headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
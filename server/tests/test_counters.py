@@ -0,0 +1,120 @@
+"""Write-behind question counters: tallies reach the questions table only on flush"""
+
+import pytest
+
+from counters import QuestionCounters, question_counters
+from models import db, Question
+
+
+def _stats(question_id):
+    db.session.expire_all()
+    q = db.session.get(Question, question_id)
+    return q.usage_count, q.answer_count, q.success_rate
+
+
+def _record_some(counters, questions):
+    counters.record_served(questions[:2])
+    counters.record_served(questions[:1])
+    counters.record_answers([(questions[0], True), (questions[0], False), (questions[1], True)])
+    counters.record_answer_totals([(questions[1], 3, 0)])
+
+
+@pytest.fixture(params=['in-process', 'redis'])
+def counters(request, app):
+    if request.param == 'redis':
+        fakeredis = pytest.importorskip('fakeredis')
+        redis_client = fakeredis.FakeRedis(decode_responses=True)
+    else:
+        redis_client = None
+    counters = QuestionCounters(key='test:question_counters')
+    counters.init_app(app, redis_client)
+    counters.app = None  # no background flusher; the tests flush
+    return counters
+
+
+def test_flush_applies_tallies_once(counters, questions):
+    _record_some(counters, questions)
+    assert _stats(questions[0]) == (0, 0, 0.0)
+
+    assert counters.flush() == 2
+    assert _stats(questions[0]) == (2, 2, 0.5)
+    assert _stats(questions[1]) == (1, 4, 0.25)
+
+    assert counters.flush() == 0
+    assert _stats(questions[0]) == (2, 2, 0.5)
+
+
+def test_flush_folds_into_the_stored_success_rate(counters, questions):
+    counters.record_answers([(questions[2], True)] * 3)
+    counters.flush()
+    counters.record_answers([(questions[2], False)])
+    counters.flush()
+    assert _stats(questions[2]) == (0, 4, 0.75)
+
+
+def test_redis_flush_picks_up_an_interrupted_flush(app, questions):
+    fakeredis = pytest.importorskip('fakeredis')
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    counters = QuestionCounters(key='test:question_counters')
+    counters.init_app(app, redis_client)
+
+    counters.record_served(questions[:1])
+    # A worker died after renaming the hash but before applying it
+    redis_client.rename(counters.key, f'{counters.key}:flushing:dead')
+    counters.record_served(questions[:1])
+
+    assert counters.flush() == 1
+    assert _stats(questions[0])[0] == 2
+    assert redis_client.keys('test:*') == []
+
+
+def test_redis_flush_waits_for_a_flush_in_progress(app, questions):
+    fakeredis = pytest.importorskip('fakeredis')
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    counters = QuestionCounters(key='test:question_counters')
+    counters.init_app(app, redis_client)
+
+    counters.record_served(questions[:1])
+    # Another flusher holds the lock and is applying its renamed hash
+    redis_client.set(f'{counters.key}:lock', 'other')
+    redis_client.rename(counters.key, f'{counters.key}:flushing:other')
+    assert counters.flush() == 0
+    assert redis_client.exists(f'{counters.key}:flushing:other')
+    assert _stats(questions[0])[0] == 0
+
+    redis_client.delete(f'{counters.key}:lock')
+    assert counters.flush() == 1
+    assert _stats(questions[0])[0] == 1
+    assert redis_client.keys('test:*') == []
+
+
+def test_failed_flush_keeps_in_process_tallies(app, questions, monkeypatch):
+    counters = QuestionCounters()
+    counters.init_app(app)
+    counters.app = None
+    counters.record_served(questions[:1])
+
+    def broken(rows):
+        raise RuntimeError('database unavailable')
+    monkeypatch.setattr('counters._apply_batch', broken)
+    with pytest.raises(RuntimeError):
+        counters.flush()
+
+    monkeypatch.undo()
+    assert counters.flush() == 1
+    assert _stats(questions[0])[0] == 1
+
+
+def test_finished_quiz_is_counted_after_flush(client, user, questions):
+    question_counters.flush()  # tallies left over from earlier tests
+    quiz_id = client.post('/api/v1/quizzes/start', headers=user['headers'], json={
+        'subject': 'math', 'difficulty': 'easy',
+        'question_ids': questions[:2]}).get_json()['quiz_id']
+    client.post(f'/api/v1/quizzes/{quiz_id}/answer', headers=user['headers'],
+                json={'question_id': questions[0], 'selected_answer_index': 0})
+    client.post(f'/api/v1/quizzes/{quiz_id}/finish', headers=user['headers'])
+    assert _stats(questions[0]) == (0, 0, 0.0)
+
+    question_counters.flush()
+    assert _stats(questions[0]) == (1, 1, 1.0)
+    assert _stats(questions[1]) == (1, 0, 0.0)
@@ -0,0 +1,107 @@
+"""Batch grading: scores, idempotent quiz ids and rejection of malformed answers"""
+
+import numpy as np
+import pytest
+
+import grading
+from models import Quiz, QuizAnswer
+
+
+@pytest.fixture
+def grader(app, user, monkeypatch):
+    monkeypatch.setitem(app.config, 'GRADING_USER_IDS', {user['id']})
+    return user
+
+
+def _grade(client, grader, question_ids, submissions):
+    return client.post('/api/v1/grading/batch', headers=grader['headers'],
+                       json={'question_ids': question_ids, 'submissions': submissions})
+
+
+def test_grade_submissions_scores_and_item_stats():
+    key = np.array([0, 1, 2], dtype=np.int16)
+    points = np.array([1.0, 1.0, 2.0])
+    responses = np.array([[0, 1, 2], [0, 0, -1], [3, 1, 2]], dtype=np.int16)
+
+    result = grading.grade_submissions(key, points, responses)
+    assert result['correct_count'].tolist() == [3, 1, 2]
+    assert result['score'].tolist() == [4.0, 1.0, 3.0]
+    assert result['difficulty'].tolist() == pytest.approx([2 / 3, 2 / 3, 2 / 3])
+
+
+def test_response_matrix_pads_short_rows():
+    matrix = grading.response_matrix([[0, None, 2], [1], []], np.array([4, 4, 3]))
+    assert matrix.dtype == np.int16
+    assert matrix.tolist() == [[0, -1, 2], [1, -1, -1], [-1, -1, -1]]
+    # Extra answers past the last question are ignored
+    assert grading.response_matrix([[0, 1, 2, 9]], np.array([4, 4, 3])).tolist() == [[0, 1, 2]]
+
+
+def test_item_statistics():
+    correct = np.array([[1, 1, 0], [1, 0, 0], [1, 1, 1], [1, 0, 0]], dtype=bool)
+    stats = grading.item_statistics(correct)
+    assert stats['difficulty'].tolist() == [1.0, 0.5, 0.25]
+    # Everyone got the first item right, so it cannot discriminate
+    assert stats['discrimination'][0] == 0.0
+    assert stats['discrimination'][1] > 0 and stats['discrimination'][2] > 0
+
+
+def test_batch_is_graded_and_stored(client, grader, make_user, questions):
+    student = make_user('student')
+    # Answers for questions 0-3 are 0, 1, 2, 3
+    response = _grade(client, grader, questions[:4], [
+        {'user_id': student['id'], 'quiz_id': 'exam-1', 'answers': [0, 1, 2, 3]},
+        {'user_id': student['id'], 'quiz_id': 'exam-2', 'answers': [0, None, 0]},
+    ])
+    assert response.status_code == 200, response.get_json()
+    body = response.get_json()
+    assert (body['graded'], body['stored'], body['duplicates']) == (2, 2, [])
+    assert [r['correct_answers'] for r in body['results']] == [4, 1]
+    assert Quiz.query.count() == 2
+    # Unanswered questions are not logged
+    assert QuizAnswer.query.filter_by(quiz_id='exam-2').count() == 2
+
+
+def test_quiz_ids_are_graded_once(client, grader, make_user, questions):
+    student = make_user('student')
+    submission = {'user_id': student['id'], 'quiz_id': 'exam-1', 'answers': [0, 1]}
+
+    first = _grade(client, grader, questions[:2], [submission, dict(submission, answers=[1, 1])])
+    assert (first.get_json()['stored'], first.get_json()['duplicates']) == (1, ['exam-1'])
+    assert first.get_json()['results'][0]['correct_answers'] == 2
+
+    again = _grade(client, grader, questions[:2], [submission])
+    assert (again.get_json()['stored'], again.get_json()['duplicates']) == (0, ['exam-1'])
+    assert Quiz.query.count() == 1
+
+
+@pytest.mark.parametrize('answers', [
+    [1.9, 1],      # would truncate to a valid index
+    [65537, 1],    # would wrap around int16
+    [4, 1],        # past the last option
+    [-2, 1],
+    ['1', 1],
+    [True, 1],
+    'AB',
+])
+def test_malformed_answers_reject_the_batch(client, grader, make_user, questions, answers):
+    student = make_user('student')
+    response = _grade(client, grader, questions[:2], [
+        {'user_id': student['id'], 'quiz_id': 'ok', 'answers': [0, 1]},
+        {'user_id': student['id'], 'quiz_id': 'bad', 'answers': answers},
+    ])
+    assert response.status_code == 400
+    assert Quiz.query.count() == 0
+
+
+def test_unknown_questions_and_users_are_rejected(client, grader, make_user, questions):
+    student = make_user('student')
+    missing = _grade(client, grader, ['missing'], [{'user_id': student['id'], 'answers': [0]}])
+    assert missing.status_code == 400
+    nobody = _grade(client, grader, questions[:1], [{'user_id': 'nobody', 'answers': [0]}])
+    assert nobody.status_code == 400
+
+
+def test_batch_grading_needs_a_grader_account(client, user, questions):
+    response = _grade(client, user, questions[:1], [{'user_id': user['id'], 'answers': [0]}])
+    assert response.status_code == 403
@@ -0,0 +1,102 @@
+"""Health monitoring: sampled checks, snapshot statuses and the probe routes"""
+
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from health import Check, DEGRADED, HEALTHY, HealthMonitor, UNHEALTHY, health_monitor
+
+
+@pytest.fixture
+def monitor():
+    monitor = HealthMonitor()
+    monitor.init_app(SimpleNamespace(config={'HEALTH_WINDOW': 3, 'HEALTH_FAILURES': 2}))
+    monitor._refresher_pid = os.getpid()  # refresh by hand
+    return monitor
+
+
+def _failing():
+    raise ConnectionError('connection refused')
+
+
+def _snapshot(monitor):
+    return json.loads(monitor.health()[0])
+
+
+def _sample(monitor, times=1):
+    for _ in range(times):
+        for check in monitor.checks.values():
+            check.next_run = 0
+        monitor.refresh()
+
+
+def test_gauge_thresholds_use_the_recent_median(monitor):
+    depth = [10]
+    monitor.register(Check('queue', lambda: depth[0], warn=100, fail=1000, unit='events'))
+    _sample(monitor, 2)
+    queue = _snapshot(monitor)['services']['queue']
+    assert (queue['status'], queue['last'], queue['unit']) == (HEALTHY, 10.0, 'events')
+
+    depth[0] = 5000  # one spike does not move the median
+    _sample(monitor)
+    assert _snapshot(monitor)['services']['queue']['status'] == HEALTHY
+
+    _sample(monitor)
+    snapshot = _snapshot(monitor)
+    assert snapshot['services']['queue']['status'] == UNHEALTHY
+    # A failing non-critical check degrades the instance but keeps it ready
+    assert (snapshot['status'], snapshot['ready']) == (DEGRADED, True)
+    assert monitor.ready()[1] == 200
+
+
+def test_critical_check_failing_takes_the_instance_out(monitor):
+    monitor.register(Check('database', _failing, critical=True))
+    monitor.refresh()
+    database = _snapshot(monitor)['services']['database']
+    assert database['status'] == DEGRADED and database['error'] == 'connection refused'
+    assert monitor.ready()[1] == 200
+
+    _sample(monitor)
+    assert _snapshot(monitor)['status'] == UNHEALTHY
+    body, status = monitor.ready()
+    assert status == 503 and json.loads(body)['ready'] is False
+    errors = [entry['error'] for entry in monitor.history_of('database')]
+    assert errors == ['connection refused'] * 2
+    assert monitor.history_of('missing') == []
+
+
+def test_checks_run_on_their_own_interval(monitor):
+    calls = []
+    monitor.register(Check('slow', lambda: calls.append(1), interval=3600))
+    monitor.refresh()
+    monitor.refresh()
+    assert len(calls) == 1
+    assert _snapshot(monitor)['services']['slow']['unit'] == 'ms'  # latency sample
+
+
+def test_unready_until_the_first_snapshot_and_when_stale(monitor):
+    assert monitor.ready()[1] == 503
+    monitor.register(Check('database', lambda: None, critical=True))
+    monitor.refresh()
+    assert monitor.ready()[1] == 200
+
+    monitor.stale_after = -1
+    body, status = monitor.ready()
+    assert status == 503 and json.loads(body)['error'] == 'health snapshot is stale'
+
+
+def test_probe_routes(client, monkeypatch):
+    monkeypatch.setattr(health_monitor, '_refresher_pid', os.getpid())
+    live = client.get('/livez')
+    assert live.status_code == 200 and live.get_json()['status'] == 'alive'
+    assert live.headers['Cache-Control'] == 'no-store'
+
+    health_monitor.refresh()
+    ready = client.get('/readyz')
+    assert ready.status_code == 200 and ready.get_json()['ready'] is True
+    health = client.get('/api/v1/health').get_json()
+    assert health['services']['database']['status'] == HEALTHY
+    history = client.get('/api/v1/health?history=database').get_json()
+    assert history['service'] == 'database' and history['history']
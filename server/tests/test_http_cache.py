@@ -0,0 +1,64 @@
+"""Conditional GETs: per-question ETags, 304s and a distinct ETag per encoding"""
+
+import gzip
+import json
+
+from models import db, Question
+
+
+def _get(client, user, question_id, **headers):
+    return client.get(f'/api/v1/questions/{question_id}', headers=dict(user['headers'], **headers))
+
+
+def test_question_etag_follows_its_own_content(client, user, questions):
+    first = _get(client, user, questions[0])
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and etag
+    assert _get(client, user, questions[0], **{'If-None-Match': etag}).status_code == 304
+
+    # Editing another question leaves this one's ETag alone
+    db.session.get(Question, questions[1]).explanation = 'Changed'
+    db.session.commit()
+    assert _get(client, user, questions[0], **{'If-None-Match': etag}).status_code == 304
+
+    db.session.get(Question, questions[0]).correct_answer_index = 3
+    db.session.commit()
+    changed = _get(client, user, questions[0], **{'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert changed.get_json()['correct_answer_index'] == 3
+
+
+def test_missing_question_is_not_cached(client, user, questions):
+    assert _get(client, user, 'no-such-question').status_code == 404
+    db.session.get(Question, questions[0]).is_active = False
+    db.session.commit()
+    assert _get(client, user, questions[0]).status_code == 404
+
+
+def test_each_encoding_has_its_own_etag(client, user, questions):
+    db.session.get(Question, questions[0]).explanation = 'Long explanation. ' * 100
+    db.session.commit()
+
+    plain = _get(client, user, questions[0], **{'Accept-Encoding': 'identity'})
+    gzipped = _get(client, user, questions[0], **{'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in plain.headers
+    assert gzipped.headers['Content-Encoding'] == 'gzip'
+    assert gzipped.headers['ETag'] == plain.headers['ETag'][:-1] + '-gzip"'
+    assert json.loads(gzip.decompress(gzipped.data)) == plain.get_json()
+    assert 'Accept-Encoding' in gzipped.headers['Vary']
+
+    # Either tag revalidates, and the 304 names the representation the client holds
+    for response in (plain, gzipped):
+        etag = response.headers['ETag']
+        revalidated = _get(client, user, questions[0], **{'If-None-Match': etag,
+                                                          'Accept-Encoding': 'gzip'})
+        assert revalidated.status_code == 304
+        assert revalidated.headers['ETag'] == etag
+
+
+def test_subjects_revalidate(client):
+    first = client.get('/api/v1/subjects')
+    assert first.status_code == 200
+    again = client.get('/api/v1/subjects', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
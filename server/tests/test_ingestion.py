@@ -0,0 +1,112 @@
+"""Analytics ingestion: file queue segments, torn and corrupt lines, and the batch drain"""
+
+import os
+
+import pytest
+
+import ingestion
+from models import AnalyticsEvent
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return ingestion.FileQueue(str(tmp_path), seal_grace=0)
+
+
+def _event(user_id, quiz_id):
+    return ingestion.validate_quiz_completed(user_id, {
+        'quiz_id': quiz_id, 'subject': 'math', 'difficulty': 'easy', 'score': 3})
+
+
+def _segments(queue):
+    return [name for name in os.listdir(queue.directory) if name.startswith('segment-')]
+
+
+def _read_all(queue, count=100):
+    assert queue.read(count) == []  # seals the active segment
+    return queue.read(count)
+
+
+def test_events_are_read_once_acked(queue):
+    for i in range(3):
+        queue.push({'n': i})
+    assert queue.depth() == 3
+
+    first = _read_all(queue, count=2)
+    assert [event['n'] for _, event in first] == [0, 1]
+    queue.ack([message_id for message_id, _ in first])
+    assert queue.depth() == 1
+
+    rest = queue.read(10)
+    assert [event['n'] for _, event in rest] == [2]
+    queue.ack([message_id for message_id, _ in rest])
+    assert _segments(queue) == [] and queue.depth() == 0
+
+
+def test_torn_final_line_ends_the_sealed_segment(queue):
+    queue.push({'n': 0})
+    with open(os.path.join(queue.directory, queue.ACTIVE), 'a') as f:
+        f.write('{"n": 1, "trunc')
+
+    messages = _read_all(queue)
+    assert [event for _, event in messages] == [{'n': 0}]
+    queue.ack([message_id for message_id, _ in messages])
+    assert _segments(queue) == []
+    with open(os.path.join(queue.directory, queue.QUARANTINE)) as f:
+        assert f.read() == '{"n": 1, "trunc\n'
+
+
+def test_segment_holding_only_a_torn_line_is_dropped(queue):
+    with open(os.path.join(queue.directory, queue.ACTIVE), 'w') as f:
+        f.write('{"n":')
+    assert _read_all(queue) == []
+    assert _segments(queue) == []
+
+
+def test_corrupt_lines_are_skipped(queue):
+    with open(os.path.join(queue.directory, queue.ACTIVE), 'w') as f:
+        f.write('not json\n{"n": 1}\n\xff\xfe\n')
+
+    messages = _read_all(queue)
+    assert [event for _, event in messages] == [{'n': 1}]
+    queue.ack([message_id for message_id, _ in messages])
+    assert _segments(queue) == []
+    assert queue.read(10) == []
+
+    # Nothing but corrupt lines: the checkpoint still moves past them
+    with open(os.path.join(queue.directory, queue.ACTIVE), 'w') as f:
+        f.write('oops\n')
+    assert _read_all(queue) == []
+    assert _segments(queue) == []
+
+
+def test_drain_writes_each_event_once(app, queue, user):
+    drain = ingestion.AnalyticsDrain(queue, flush_size=10, flush_interval=0.05)
+    for quiz_id in ('quiz-1', 'quiz-2', 'quiz-1'):
+        queue.push(_event(user['id'], quiz_id))
+    queue.push({'event_id': 'broken'})  # no timestamps: dropped, the batch goes on
+
+    assert drain.flush_once() == 2
+    assert sorted(e.quiz_id for e in AnalyticsEvent.query.all()) == ['quiz-1', 'quiz-2']
+    assert queue.depth() == 0
+
+    queue.push(_event(user['id'], 'quiz-2'))
+    drain.flush_once()
+    assert AnalyticsEvent.query.count() == 2
+
+
+def test_event_ids_are_scoped_to_the_user():
+    first = _event('user-a', 'quiz-1')['event_id']
+    assert first == _event('user-a', 'quiz-1')['event_id']
+    assert first != _event('user-b', 'quiz-1')['event_id']
+
+
+def test_quiz_completed_is_queued(client, user):
+    response = client.post('/api/v1/analytics/quiz-completed', headers=user['headers'], json={
+        'quiz_id': 'quiz-1', 'subject': 'math', 'difficulty': 'easy', 'score': 5})
+    assert response.status_code == 202
+    assert AnalyticsEvent.query.count() == 0  # written later by the drain
+
+    bad = client.post('/api/v1/analytics/quiz-completed', headers=user['headers'],
+                      json={'quiz_id': 'x' * 40, 'subject': 'math', 'difficulty': 'easy'})
+    assert bad.status_code == 400
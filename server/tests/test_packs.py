@@ -0,0 +1,107 @@
+"""Offline content packs: versioned builds, deltas, pruning and the download routes"""
+
+import gzip
+import json
+import os
+import shutil
+
+import packs
+from models import db, Question
+
+
+def _files(packs_dir):
+    return sorted(os.path.relpath(os.path.join(root, name), packs_dir).replace(os.sep, '/')
+                  for root, _, names in os.walk(packs_dir) for name in names
+                  if name != packs.MANIFEST_NAME)
+
+
+def test_file_slug():
+    assert packs.file_slug('math') == 'math'
+    assert packs.file_slug('computer_science') == 'computer_science'
+    unsafe = packs.file_slug('../etc')
+    assert '/' not in unsafe and '..' not in unsafe and unsafe != packs.file_slug('etc')
+    assert packs.file_slug('..').startswith('x-')
+
+
+def test_build_is_versioned_and_skips_unchanged_groups(tmp_path, questions):
+    packs_dir = str(tmp_path)
+    report = packs.build_packs(packs_dir)
+    assert (report['built'], report['questions']) == (1, 6)
+    entry = packs.load_manifest(packs_dir)['packs']['math/easy']
+    assert entry['version'] == 1 and entry['file'].startswith('math/easy/full-1-')
+    body = packs.read_pack(packs_dir, entry['file'])
+    assert len(body['questions']) == 6 and body['sha256'] == entry['sha256']
+
+    assert packs.build_packs(packs_dir)['unchanged'] == 1
+    assert packs.load_manifest(packs_dir)['packs']['math/easy']['version'] == 1
+
+
+def test_delta_holds_only_what_changed(tmp_path, questions):
+    packs_dir = str(tmp_path)
+    packs.build_packs(packs_dir)
+    db.session.get(Question, questions[0]).explanation = 'Edited'
+    db.session.get(Question, questions[1]).is_active = False
+    db.session.commit()
+
+    packs.build_packs(packs_dir)
+    entry = packs.load_manifest(packs_dir)['packs']['math/easy']
+    assert (entry['version'], entry['question_count']) == (2, 5)
+    [delta] = entry['deltas']
+    assert (delta['from'], delta['to'], delta['upserted'], delta['removed']) == (1, 2, 1, 1)
+    body = packs.read_pack(packs_dir, delta['file'])
+    assert [q['id'] for q in body['questions']] == [questions[0]]
+    assert body['questions'][0]['explanation'] == 'Edited'
+    assert body['removed'] == [questions[1]]
+
+
+def test_old_versions_and_removed_groups_are_pruned(tmp_path, questions):
+    packs_dir = str(tmp_path)
+    for version in range(1, packs.KEEP_VERSIONS + 3):
+        db.session.get(Question, questions[0]).explanation = f'Version {version}'
+        db.session.commit()
+        packs.build_packs(packs_dir)
+
+    entry = packs.load_manifest(packs_dir)['packs']['math/easy']
+    latest = packs.KEEP_VERSIONS + 2
+    assert entry['version'] == latest
+    kept = {int(os.path.basename(f).split('-')[1]) for f in _files(packs_dir)}
+    assert kept == set(range(latest - packs.KEEP_VERSIONS + 1, latest + 1))
+    assert all(d['to'] > latest - packs.KEEP_VERSIONS for d in entry['deltas'])
+
+    Question.query.update({'is_active': False})
+    db.session.commit()
+    report = packs.build_packs(packs_dir)
+    assert report['removed_groups'] == 1
+    assert packs.load_manifest(packs_dir)['packs'] == {} and _files(packs_dir) == []
+
+
+def test_unsafe_subject_stays_inside_the_packs_dir(tmp_path):
+    db.session.add(Question(subject='../../escape', difficulty='easy', question_text='Q?',
+                            options=['A', 'B'], correct_answer_index=0))
+    db.session.commit()
+    packs_dir = str(tmp_path / 'packs')
+    packs.build_packs(packs_dir)
+    entry = packs.load_manifest(packs_dir)['packs']['../../escape/easy']
+    assert os.path.isfile(os.path.join(packs_dir, entry['file']))
+    assert os.listdir(str(tmp_path)) == ['packs']
+
+
+def test_pack_routes(app, client, user, questions):
+    packs_dir = app.config['CONTENT_PACKS_DIR']
+    packs.build_packs(packs_dir)
+    try:
+        manifest = client.get('/api/v1/packs/manifest', headers=user['headers'])
+        assert manifest.status_code == 200
+        entry = json.loads(manifest.data)['packs']['math/easy']
+
+        pack = client.get(f"/api/v1/packs/{entry['file']}", headers=user['headers'])
+        assert pack.status_code == 200
+        assert 'immutable' in pack.headers['Cache-Control']
+        assert len(json.loads(gzip.decompress(pack.data))['questions']) == 6
+        pack.close()
+
+        outside = client.get('/api/v1/packs/../conftest.py', headers=user['headers'])
+        assert outside.status_code == 404
+        assert client.get('/api/v1/packs/manifest').status_code == 401
+    finally:
+        shutil.rmtree(packs_dir)
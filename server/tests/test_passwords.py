@@ -0,0 +1,81 @@
+"""Password hashing pool and the register/login routes built on it"""
+
+import threading
+import time
+
+import pytest
+
+from models import db, User
+from passwords import HasherBusy, PasswordHasher, password_hasher
+
+PASSWORD = 'Password-12345'  # what the make_user fixture registers with
+
+
+@pytest.fixture
+def pool_hasher():
+    hasher = PasswordHasher()
+    hasher.workers, hasher.max_pending, hasher.timeout = 1, 1, 0.2
+    hasher._slots = threading.BoundedSemaphore(1)
+    yield hasher
+    hasher._pool.shutdown(wait=True, cancel_futures=True)
+
+
+def test_inline_hash_and_verify():
+    hasher = PasswordHasher()
+    hasher.workers, hasher.method = 0, 'pbkdf2:sha256:1000'
+    hashed = hasher.hash('secret')
+    assert hasher.verify(hashed, 'secret') and not hasher.verify(hashed, 'wrong')
+    assert not hasher.verify(None, 'secret')
+    assert not hasher.needs_rehash(hashed)
+    hasher.method = 'pbkdf2:sha256:2000'
+    assert hasher.needs_rehash(hashed)
+
+
+def test_slow_hash_is_busy_and_keeps_its_slot(pool_hasher):
+    pool_hasher._run(time.sleep, 0)  # start the pool process outside the timed calls
+
+    with pytest.raises(HasherBusy):
+        pool_hasher._run(time.sleep, 1)
+    # The timed-out job is still running in the pool, so it still holds the only slot
+    with pytest.raises(HasherBusy):
+        pool_hasher._run(time.sleep, 0)
+
+    time.sleep(1.2)
+    assert pool_hasher._run(pow, 2, 3) == 8
+
+
+def _login(client, username, password=PASSWORD):
+    return client.post('/api/v1/users/login', json={'username': username, 'password': password})
+
+
+def test_login(client, user):
+    assert _login(client, 'tester').status_code == 200
+    assert _login(client, 'tester@example.com').get_json()['user']['id'] == user['id']
+    assert _login(client, 'tester', 'wrong-password').status_code == 401
+    assert _login(client, 'nobody').status_code == 401
+
+
+def test_login_rehashes_with_the_configured_method(client, user, monkeypatch):
+    monkeypatch.setattr(password_hasher, 'method', 'pbkdf2:sha256:1001')
+    assert _login(client, 'tester').status_code == 200
+    assert db.session.get(User, user['id']).password_hash.startswith('pbkdf2:sha256:1001$')
+    assert _login(client, 'tester').status_code == 200
+
+
+def test_busy_hasher_asks_the_client_to_retry(client, user, monkeypatch):
+    def busy(*args):
+        raise HasherBusy()
+    monkeypatch.setattr(password_hasher, '_run', busy)
+    response = _login(client, 'tester')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '2'
+
+
+def test_username_and_email_are_unique(client, user):
+    def register(username, email):
+        return client.post('/api/v1/users/register', json={
+            'username': username, 'email': email, 'password': PASSWORD, 'display_name': 'Someone'})
+
+    assert register('tester', 'other@example.com').get_json()['error'] == 'Username already exists'
+    assert register('other', 'tester@example.com').get_json()['error'] == 'Email already registered'
+    assert register('other', 'other@example.com').status_code == 201
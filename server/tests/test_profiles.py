@@ -0,0 +1,90 @@
+"""Profile cache: the local LRU, the Redis tier and invalidation"""
+
+import pytest
+
+from models import db, User
+from profiles import ALL_USERS, UserProfiles
+
+
+@pytest.fixture
+def profiles(app):
+    profiles = UserProfiles()
+    profiles.init_app(app)
+    profiles.max_entries = 2
+    return profiles
+
+
+@pytest.fixture
+def shared(app):
+    fakeredis = pytest.importorskip('fakeredis')
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    profiles = UserProfiles()
+    profiles.init_app(app, redis_client)
+    profiles._listener_pid = 'no listener thread in tests'
+    return profiles
+
+
+def _set_level(user_id, level):
+    db.session.get(User, user_id).level = level
+    db.session.commit()
+
+
+def test_local_tier_until_invalidated(profiles, user):
+    profile = profiles.get(user['id'])
+    assert set(profile) == {'level', 'total_xp', 'current_streak', 'ability'}
+    assert profiles.get('no-such-user') is None
+
+    _set_level(user['id'], 7)
+    assert profiles.get(user['id'])['level'] == profile['level']  # still cached
+    profiles.invalidate(user['id'])
+    assert profiles.get(user['id'])['level'] == 7
+
+
+def test_local_entries_expire_and_are_bounded(profiles, make_user):
+    users = [make_user(name)['id'] for name in ('one', 'two', 'three')]
+    for user_id in users:
+        profiles.get(user_id)
+    assert list(profiles._entries) == users[1:]
+
+    profiles.local_ttl = -1
+    profiles._local_drop([ALL_USERS])
+    profiles.get(users[0])
+    _set_level(users[0], 5)
+    assert profiles.get(users[0])['level'] == 5
+
+
+def test_redis_tier_is_shared_and_invalidated(shared, app, user):
+    other = UserProfiles()
+    other.init_app(app, shared.redis)
+    other._listener_pid = shared._listener_pid
+
+    shared.get(user['id'])
+    assert shared.redis.get(shared._key(user['id']))
+    _set_level(user['id'], 3)
+    assert other.get(user['id'])['level'] != 3  # served from Redis
+
+    shared.invalidate(user['id'])
+    assert shared.redis.get(shared._key(user['id'])) is None
+    other._local_drop([user['id']])  # what its listener does with the published message
+    assert other.get(user['id'])['level'] == 3
+
+
+def test_refill_loses_to_a_concurrent_invalidate(shared, user):
+    versions = shared.redis.mget(*shared._version_keys(user['id']))
+    shared.invalidate(user['id'])  # lands while the database row is loading
+    shared._refill(user['id'], {'level': 1}, versions)
+    assert shared.redis.get(shared._key(user['id'])) is None
+
+    shared._refill(user['id'], {'level': 1}, shared.redis.mget(*shared._version_keys(user['id'])))
+    assert shared.redis.get(shared._key(user['id'])) is not None
+
+
+def test_invalidate_all_clears_every_profile(shared, make_user):
+    users = [make_user(name)['id'] for name in ('one', 'two')]
+    for user_id in users:
+        shared.get(user_id)
+    shared.invalidate_all()
+    assert not shared._entries
+    assert all(shared.redis.get(shared._key(user_id)) is None for user_id in users)
+    # Versions survive the wipe, so refills that started before it are still refused
+    assert shared.redis.get(shared._version_key(ALL_USERS)) == '1'
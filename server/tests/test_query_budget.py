@@ -0,0 +1,104 @@
+"""Statements per request on the main routes (see benchmarks/query_budget.py).
+
+Budgets do not grow with the size of the request, so a per-item query (N+1)
+fails here as soon as a request carries more than one item.
+"""
+
+import time
+
+import pytest
+
+from models import db, Question
+from query_stats import assert_query_budget
+
+SYNC_QUIZZES = 20
+QUIZ_QUESTIONS = 10
+PASSWORD = 'budget-password-1'
+
+
+@pytest.fixture
+def bank():
+    rows = [
+        Question(subject='math', difficulty=('easy', 'medium', 'hard')[i % 3],
+                 question_text=f'Budget {i}?',
+                 options=['A', 'B', 'C', 'D'], correct_answer_index=i % 4, explanation='Because',
+                 tags=[f'topic{i % 5}'])
+        for i in range(30)
+    ]
+    db.session.add_all(rows)
+    db.session.commit()
+    return [q.id for q in rows]
+
+
+def _sync_body(question_ids):
+    now = int(time.time() * 1000)
+    return {'quizzes': [
+        {'id': f'budget-{i}', 'subject': 'math', 'difficulty': 'easy', 'total_questions': 5,
+         'correct_answers': 3, 'time_spent': 120, 'completed_at': now - i * 60_000,
+         'answers': [{'question_id': qid, 'selected_answer_index': 0, 'is_correct': j % 2 == 0}
+                     for j, qid in enumerate(question_ids[i:i + 5])]}
+        for i in range(SYNC_QUIZZES)
+    ]}
+
+
+def test_register_and_login(client):
+    with assert_query_budget(3, max_repeats=1):
+        response = client.post('/api/v1/users/register', json={
+            'username': 'budget', 'email': 'budget@example.com', 'password': PASSWORD,
+            'display_name': 'Budget'})
+    assert response.status_code == 201
+
+    with assert_query_budget(3, max_repeats=1):
+        response = client.post('/api/v1/users/login',
+                               json={'username': 'budget', 'password': PASSWORD})
+    assert response.status_code == 200
+
+
+def test_question(client, user, bank):
+    with assert_query_budget(1):
+        response = client.get(f'/api/v1/questions/{bank[0]}', headers=user['headers'])
+    assert response.status_code == 200
+
+
+def test_sync_and_stats(client, user, bank):
+    with assert_query_budget(12, max_repeats=1):
+        response = client.post('/api/v1/quizzes/sync', headers=user['headers'],
+                               json=_sync_body(bank))
+    assert response.get_json()['synced_count'] == SYNC_QUIZZES
+
+    with assert_query_budget(2, max_repeats=1):
+        response = client.get('/api/v1/analytics/user-stats', headers=user['headers'])
+        assert response.status_code == 200
+    with assert_query_budget(2, max_repeats=1):
+        assert client.get('/api/v1/reviews/due', headers=user['headers']).status_code == 200
+
+
+def test_quiz_session(client, user, bank):
+    question_ids = bank[:QUIZ_QUESTIONS]
+    with assert_query_budget(3, max_repeats=1):
+        response = client.post('/api/v1/quizzes/start', headers=user['headers'], json={
+            'subject': 'math', 'difficulty': 'easy', 'question_ids': question_ids})
+    assert response.status_code == 201
+    quiz_id = response.get_json()['quiz_id']
+
+    with assert_query_budget(0):
+        for qid in question_ids:
+            client.post(f'/api/v1/quizzes/{quiz_id}/answer', headers=user['headers'],
+                        json={'question_id': qid, 'selected_answer_index': 1, 'time_spent': 5})
+
+    with assert_query_budget(10, max_repeats=1):
+        response = client.post(f'/api/v1/quizzes/{quiz_id}/finish', headers=user['headers'])
+    assert response.status_code == 200
+
+
+def test_batch_grading(app, client, make_user, bank, monkeypatch):
+    grader = make_user('grader')
+    students = [make_user(f'student{i}')['id'] for i in range(5)]
+    monkeypatch.setitem(app.config, 'GRADING_USER_IDS', {grader['id']})
+
+    with assert_query_budget(5, max_repeats=1):
+        response = client.post('/api/v1/grading/batch', headers=grader['headers'], json={
+            'question_ids': bank[:QUIZ_QUESTIONS],
+            'submissions': [{'user_id': uid, 'quiz_id': f'exam-{uid}',
+                             'answers': [1] * QUIZ_QUESTIONS} for uid in students]})
+    assert response.status_code == 200, response.get_json()
@@ -0,0 +1,73 @@
+"""Memory-mapped question bank: lookups, sampling and questions changed after the build"""
+
+import json
+import os
+
+import pytest
+
+from models import db, Question
+from question_bank import QuestionBank, build_bank, question_bank
+
+
+@pytest.fixture
+def bank(app, questions):
+    path = app.config['QUESTION_BANK_PATH']
+    build_bank(path)
+    assert question_bank.load(path)
+    yield question_bank
+    os.remove(path)
+    question_bank.init_app(app)
+
+
+def test_lookups_come_from_the_file(bank, questions):
+    assert len(bank) == 6
+    assert json.loads(bank.get(questions[1]))['question_text'] == 'Question 1?'
+    assert bank.answer_key(questions[3]) == (3, 1)
+    assert len(bank.get_many(questions)) == 6
+    assert bank.get('no-such-question') is None
+    assert set(bank.sample('math', 'easy', 10)) == set(questions)
+    assert set(bank.sample('math', 'easy', 3, topics=['algebra'])) <= set(questions)
+
+
+def test_changed_questions_are_not_served_from_the_file(client, user, bank, questions):
+    edited = db.session.get(Question, questions[0])
+    deactivated = db.session.get(Question, questions[1])
+    edited.question_text = 'Edited?'
+    deactivated.is_active = False
+    db.session.commit()
+
+    assert bank.get(questions[0]) is None and bank.answer_key(questions[1]) is None
+    assert bank.get_many(questions) is None
+    assert set(bank.sample('math', 'easy', 10)) == set(questions[2:])
+
+    response = client.get(f'/api/v1/questions/{questions[0]}', headers=user['headers'])
+    assert response.get_json()['question_text'] == 'Edited?'
+    response = client.get(f'/api/v1/questions/{questions[1]}', headers=user['headers'])
+    assert response.status_code == 404
+
+    # A newer build includes the edit and drops the deactivated question
+    build_bank(bank.path)
+    bank.load()
+    assert json.loads(bank.get(questions[0]))['question_text'] == 'Edited?'
+    assert bank.get(questions[1]) is None and len(bank) == 5
+
+
+def test_rolled_back_changes_keep_the_file(bank, questions):
+    db.session.get(Question, questions[0]).question_text = 'Never committed'
+    db.session.flush()
+    db.session.rollback()
+    assert bank.get(questions[0]) is not None
+
+
+def test_changes_reach_other_workers_through_redis(app, bank, questions):
+    fakeredis = pytest.importorskip('fakeredis')
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    editor, reader = QuestionBank(), QuestionBank()
+    for worker in (editor, reader):
+        worker.init_app(app, redis_client)
+        worker.sync_interval = 0
+        assert worker.load(bank.path)
+
+    editor.mark_changed([questions[2]])
+    assert reader.get(questions[2]) is None
+    assert reader.get(questions[3]) is not None
@@ -0,0 +1,90 @@
+"""Question pools: topic normalisation, pool eviction and serving generate requests from them"""
+
+from collections import OrderedDict
+
+import pytest
+
+from question_pools import QuestionPools, normalize_topics, question_pools
+
+
+@pytest.fixture(params=['memory', 'redis'])
+def pools(request, app):
+    redis_client = None
+    if request.param == 'redis':
+        fakeredis = pytest.importorskip('fakeredis')
+        redis_client = fakeredis.FakeRedis(decode_responses=True)
+    pools = QuestionPools()
+    pools.init_app(app, redis_client)
+    return pools
+
+
+@pytest.fixture
+def shared_pools(monkeypatch):
+    monkeypatch.setattr(question_pools, '_local', OrderedDict())
+    monkeypatch.setattr(question_pools, 'stats', dict.fromkeys(question_pools.stats, 0))
+    return question_pools
+
+
+def test_normalize_topics():
+    assert normalize_topics([' Linear  Algebra', 'linear algebra', 'Calculus', 3, '']) == \
+        ['calculus', 'linear algebra']
+    assert normalize_topics('algebra') == []
+    assert len(normalize_topics([f'topic {i}' for i in range(50)])) == 10
+
+
+def test_topic_lists_share_pools(pools):
+    pools.add('math', 'easy', ['algebra', 'geometry'], ['q1', 'q2'])
+    pools.add('math', 'easy', ['algebra'], ['q3'])
+    pools.add('math', 'easy', [], ['q4'])
+
+    assert sorted(pools.candidates('math', 'easy', ['geometry'])) == ['q1', 'q2']
+    assert sorted(pools.candidates('math', 'easy', ['algebra', 'geometry'])) == ['q1', 'q2', 'q3']
+    assert pools.candidates('math', 'easy', []) == ['q4']
+    assert pools.candidates('math', 'hard', ['algebra']) == []
+    assert len(pools.sample('math', 'easy', ['algebra'], 2)) == 2
+    assert sorted(pools.sample('math', 'easy', ['algebra'], 10)) == ['q1', 'q2', 'q3']
+
+
+def test_pools_evict_old_and_excess_ids(pools):
+    pools.max_size = 3
+    pools.add('math', 'easy', [], [f'q{i}' for i in range(5)])
+    assert sorted(pools.candidates('math', 'easy', [])) == ['q2', 'q3', 'q4']
+
+    pools.ttl = -1
+    assert pools.candidates('math', 'easy', []) == []
+
+
+def test_hit_ratio(pools):
+    assert pools.hit_ratio() is None
+    pools.record(5, 5)
+    pools.record(5, 2)
+    pools.record(5, 0)
+    assert (pools.stats['hits'], pools.stats['partial'], pools.stats['misses']) == (1, 1, 1)
+    assert (pools.stats['served'], pools.stats['generated']) == (7, 8)
+    assert pools.hit_ratio() == pytest.approx(1 / 3)
+
+
+def _generate(client, user, **body):
+    return client.post('/api/v1/questions/generate', headers=user['headers'],
+                       json=dict({'subject': 'math', 'difficulty': 'easy'}, **body))
+
+
+def test_generate_is_served_from_the_pools(client, user, questions, shared_pools):
+    shared_pools.add('math', 'easy', ['algebra'], questions)
+
+    first = _generate(client, user, count=3, topics=[' Algebra'])
+    assert first.status_code == 200
+    body = first.get_json()
+    assert (body['metadata']['from_pool'], body['metadata']['generated']) == (3, 0)
+    served = {q['id'] for q in body['questions']}
+
+    # The same user is not served the questions they have just seen
+    again = _generate(client, user, count=3, topics=['algebra']).get_json()
+    assert served.isdisjoint(q['id'] for q in again['questions'])
+    assert served | {q['id'] for q in again['questions']} == set(questions)
+    assert shared_pools.stats['hits'] == 2
+
+
+@pytest.mark.parametrize('count', [0, 21, True, '5', 2.5])
+def test_generate_count_is_validated(client, user, count):
+    assert _generate(client, user, count=count).status_code == 400
@@ -0,0 +1,116 @@
+"""Server-graded quiz sessions: start, answer once per question, finish once"""
+
+import time
+
+from models import db, Question, Quiz, QuizAnswer, UserDailyStat
+from quiz_sessions import quiz_sessions
+
+
+def _start(client, user, question_ids, **extra):
+    return client.post('/api/v1/quizzes/start', headers=user['headers'], json=dict(
+        {'subject': 'math', 'difficulty': 'easy', 'question_ids': question_ids}, **extra))
+
+
+def _answer(client, user, quiz_id, question_id, selected):
+    return client.post(f'/api/v1/quizzes/{quiz_id}/answer', headers=user['headers'],
+                       json={'question_id': question_id, 'selected_answer_index': selected,
+                             'time_spent': 5})
+
+
+def _finish(client, user, quiz_id):
+    return client.post(f'/api/v1/quizzes/{quiz_id}/finish', headers=user['headers'])
+
+
+def test_start_answer_finish(client, user, questions):
+    started = _start(client, user, questions[:4])
+    assert started.status_code == 201
+    session = started.get_json()
+    assert [q['id'] for q in session['questions']] == questions[:4]
+    assert all('correct_answer_index' not in q for q in session['questions'])
+
+    # Question i's answer is i % 4: get the first three right and the last one wrong
+    for i, qid in enumerate(questions[:4]):
+        response = _answer(client, user, session['quiz_id'], qid, i if i < 3 else 0)
+        assert response.status_code == 200
+        assert response.get_json()['is_correct'] == (i < 3)
+        assert response.get_json()['correct_answer_index'] == i
+
+    finished = client.post(f"/api/v1/quizzes/{session['quiz_id']}/finish", headers=user['headers'])
+    assert finished.status_code == 200
+    result = finished.get_json()
+    assert (result['answered'], result['correct_answers'], result['percentage']) == (4, 3, 75.0)
+
+    quiz = db.session.get(Quiz, session['quiz_id'])
+    assert quiz.is_completed and quiz.correct_answers == 3
+    assert QuizAnswer.query.filter_by(quiz_id=quiz.id).count() == 4
+    assert [(b.quizzes, b.questions, b.correct) for b in UserDailyStat.query.all()] == [(1, 4, 3)]
+
+
+def test_each_question_is_answered_once(client, user, questions):
+    quiz_id = _start(client, user, questions[:2]).get_json()['quiz_id']
+    assert _answer(client, user, quiz_id, questions[0], 0).status_code == 200
+    assert _answer(client, user, quiz_id, questions[0], 1).status_code == 409
+    assert _answer(client, user, quiz_id, questions[5], 1).status_code == 400
+
+
+def test_selected_answer_must_be_an_option(client, user, questions):
+    quiz_id = _start(client, user, questions[:1]).get_json()['quiz_id']
+    assert _answer(client, user, quiz_id, questions[0], 4).status_code == 400
+    assert _answer(client, user, quiz_id, questions[0], -1).status_code == 400
+    # A rejected answer does not use up the question
+    assert _answer(client, user, quiz_id, questions[0], 0).get_json()['is_correct']
+
+
+def test_question_ids_are_deduplicated_and_match_the_quiz(client, user, questions):
+    physics = Question(subject='physics', difficulty='easy', question_text='Gravity?',
+                       options=['A', 'B'], correct_answer_index=0)
+    hard_math = Question(subject='math', difficulty='hard', question_text='Hard?',
+                         options=['A', 'B'], correct_answer_index=0)
+    db.session.add_all([physics, hard_math])
+    db.session.commit()
+
+    ids = [questions[0], questions[1], questions[0], physics.id, hard_math.id]
+    session = _start(client, user, ids).get_json()
+    assert [q['id'] for q in session['questions']] == questions[:2]
+    assert db.session.get(Quiz, session['quiz_id']).total_questions == 2
+    assert _start(client, user, [physics.id, hard_math.id]).status_code == 404
+
+
+def test_session_belongs_to_its_user(client, make_user, questions):
+    owner, other = make_user('owner'), make_user('other')
+    quiz_id = _start(client, owner, questions[:2]).get_json()['quiz_id']
+    assert _answer(client, other, quiz_id, questions[0], 0).status_code == 404
+    assert _finish(client, other, quiz_id).status_code == 404
+
+
+def test_finish_only_once(client, user, questions):
+    quiz_id = _start(client, user, questions[:2]).get_json()['quiz_id']
+    _answer(client, user, quiz_id, questions[0], 0)
+    assert _finish(client, user, quiz_id).status_code == 200
+    assert _finish(client, user, quiz_id).status_code == 404
+    assert [b.quizzes for b in UserDailyStat.query.all()] == [1]
+
+
+def test_answers_after_the_time_limit_are_refused(client, user, questions, monkeypatch):
+    quiz_id = _start(client, user, questions[:2], time_limit=60).get_json()['quiz_id']
+    assert _answer(client, user, quiz_id, questions[0], 0).status_code == 200
+
+    real_time = time.time
+    monkeypatch.setattr(time, 'time', lambda: real_time() + 120)
+    late = _answer(client, user, quiz_id, questions[1], 1)
+    assert late.status_code == 409
+    # The session is still there to finish with what was answered in time
+    finished = _finish(client, user, quiz_id)
+    assert finished.get_json()['answered'] == 1
+
+
+def test_start_without_shared_storage_is_unavailable(client, user, questions, monkeypatch):
+    monkeypatch.setattr(quiz_sessions, 'in_process', False)
+    assert quiz_sessions.redis is None
+    assert _start(client, user, questions[:2]).status_code == 503
+    assert Quiz.query.count() == 0
+
+
+def test_start_needs_known_questions(client, user):
+    assert _start(client, user, ['no-such-question']).status_code == 404
+    assert Quiz.query.count() == 0
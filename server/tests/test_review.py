@@ -0,0 +1,77 @@
+"""Spaced repetition: SM-2 scheduling, the review queue and its routes"""
+
+from datetime import datetime, timedelta
+
+import review
+from models import db, ReviewItem
+
+NEW = {'ease': 2.5, 'interval_days': 0.0, 'repetitions': 0, 'lapses': 0,
+       'due_at': None, 'last_reviewed_at': None}
+
+
+def test_answer_quality():
+    assert review.answer_quality(False) == 1
+    assert review.answer_quality(True, 1000) == 5
+    assert review.answer_quality(True, review.SLOW_ANSWER_MS + 1) == 4
+
+
+def test_schedule_grows_intervals_and_resets_on_a_lapse():
+    now = datetime(2024, 1, 1)
+    state = review.schedule(NEW, 5, now)
+    assert (state['repetitions'], state['interval_days']) == (1, 1.0)
+    state = review.schedule(state, 5, now)
+    assert state['interval_days'] == 6.0
+    state = review.schedule(state, 5, now)
+    assert state['interval_days'] == 6.0 * state['ease'] and state['ease'] > 2.5
+    assert state['due_at'] == now + timedelta(days=state['interval_days'])
+
+    lapsed = review.schedule(state, 1, now)
+    assert (lapsed['repetitions'], lapsed['lapses'], lapsed['interval_days']) == (0, 1, 0.0)
+    assert lapsed['due_at'] == now + review.RELEARN_DELAY
+    assert lapsed['ease'] < state['ease']
+
+    for _ in range(20):
+        lapsed = review.schedule(lapsed, 1, now)
+    assert lapsed['ease'] == review.MIN_EASE
+
+
+def _answer(question_id, is_correct, minutes_ago):
+    return {'question_id': question_id, 'is_correct': is_correct, 'time_spent': 1000,
+            'answered_at': datetime.utcnow() - timedelta(minutes=minutes_ago)}
+
+
+def test_missed_questions_enter_the_queue(user, questions):
+    assert review.apply_answers(user['id'], []) == 0
+    assert review.apply_answers(user['id'], [_answer(questions[0], True, 30)]) == 0
+
+    updated = review.apply_answers(user['id'], [
+        _answer(questions[1], True, 10),  # replayed after the miss below
+        _answer(questions[1], False, 20),
+        _answer(questions[2], False, 20)])
+    db.session.commit()
+    assert updated == 2
+
+    items = {item.question_id: item for item in ReviewItem.query.filter_by(user_id=user['id'])}
+    assert set(items) == {questions[1], questions[2]}
+    assert (items[questions[1]].repetitions, items[questions[1]].lapses) == (1, 1)
+    assert items[questions[1]].due_at > datetime.utcnow() + timedelta(hours=23)
+
+    due = review.due_reviews(user['id'], now=datetime.utcnow() + timedelta(minutes=30))
+    assert [entry['question']['id'] for entry in due] == [questions[2]]
+    assert review.due_count(user['id'], now=datetime.utcnow() + timedelta(days=2)) == 2
+
+
+def test_review_routes(client, user, questions):
+    past = (datetime.utcnow() - timedelta(hours=1)).isoformat()
+    submitted = client.post('/api/v1/reviews/submit', headers=user['headers'], json={'answers': [
+        {'question_id': questions[0], 'is_correct': False, 'answered_at': past}]})
+    assert submitted.get_json() == {'updated': 1}
+
+    due = client.get('/api/v1/reviews/due', headers=user['headers']).get_json()
+    assert due['due_total'] == 1
+    assert due['reviews'][0]['question']['id'] == questions[0]
+
+    for body in ({}, {'answers': []}, {'answers': [{'is_correct': True}]},
+                 {'answers': [{'question_id': questions[0], 'time_spent': 'slow'}]}):
+        response = client.post('/api/v1/reviews/submit', headers=user['headers'], json=body)
+        assert response.status_code == 400
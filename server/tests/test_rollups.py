@@ -0,0 +1,82 @@
+"""Daily statistics rollups: incremental upserts, stats payload and backfill"""
+
+from datetime import datetime, timedelta
+
+import rollups
+from models import db, Quiz, UserDailyStat
+
+
+def _quiz(user_id, quiz_id, subject='math', completed_at=None, started_at=None, **fields):
+    return Quiz(**dict({
+        'id': quiz_id, 'user_id': user_id, 'subject': subject, 'difficulty': 'easy',
+        'total_questions': 10, 'correct_answers': 7, 'time_spent': 100, 'is_completed': True,
+        'completed_at': completed_at, 'started_at': started_at}, **fields))
+
+
+def _buckets():
+    return sorted((b.day.isoformat(), b.subject, b.quizzes, b.questions, b.correct, b.time_spent)
+                  for b in UserDailyStat.query.all())
+
+
+def test_quizzes_fold_into_daily_buckets(user):
+    today = datetime.utcnow().replace(hour=12)
+    yesterday = today - timedelta(days=1)
+    quizzes = [_quiz(user['id'], 'q1', completed_at=today),
+               _quiz(user['id'], 'q2', completed_at=today, correct_answers=3),
+               _quiz(user['id'], 'q3', subject='physics', completed_at=yesterday),
+               _quiz(user['id'], 'q4', completed_at=today, is_completed=False)]
+
+    deltas = rollups.apply_quizzes(quizzes)
+    assert len(deltas) == 2
+    rollups.apply_quizzes([_quiz(user['id'], 'q5', completed_at=today)])
+    db.session.commit()
+
+    assert _buckets() == [
+        (yesterday.date().isoformat(), 'physics', 1, 10, 7, 100),
+        (today.date().isoformat(), 'math', 3, 30, 17, 300),
+    ]
+
+
+def test_user_stats_payload(client, user):
+    today = datetime.utcnow()
+    rollups.apply_quizzes([_quiz(user['id'], 'q1', completed_at=today),
+                           _quiz(user['id'], 'q2', subject='physics', completed_at=today,
+                                 total_questions=30, correct_answers=15),
+                           _quiz(user['id'], 'old', completed_at=today - timedelta(days=40))])
+    db.session.commit()
+
+    response = client.get('/api/v1/analytics/user-stats?timeframe=week', headers=user['headers'])
+    stats = response.get_json()['stats']
+    assert (stats['total_quizzes'], stats['total_questions'], stats['total_correct']) == (2, 40, 22)
+    assert stats['average_accuracy'] == 55.0
+    assert stats['favorite_subject'] == 'physics'
+    assert stats['subject_stats']['math']['average_accuracy'] == 70.0
+    assert len(stats['weekly_progress']) == 7
+    assert stats['weekly_progress'][-1]['quizzes'] == 2
+
+    year = client.get('/api/v1/analytics/user-stats?timeframe=year', headers=user['headers'])
+    assert year.get_json()['stats']['total_quizzes'] == 3
+    assert client.get('/api/v1/analytics/user-stats?timeframe=decade',
+                      headers=user['headers']).status_code == 400
+
+
+def test_backfill_buckets_like_live_updates(make_user):
+    owner, other = make_user('owner'), make_user('other')
+    started = datetime.utcnow().replace(hour=12) - timedelta(days=3)
+    quizzes = [_quiz(owner['id'], 'completed', completed_at=started + timedelta(days=1),
+                     started_at=started),
+               _quiz(owner['id'], 'only-started', started_at=started),
+               _quiz(other['id'], 'others', completed_at=started)]
+    rollups.apply_quizzes(quizzes)
+    db.session.add_all(quizzes)
+    db.session.commit()
+    live = _buckets()
+
+    assert rollups.backfill() == 3
+    assert _buckets() == live
+
+    # Rebuilding one user leaves the others' buckets alone
+    UserDailyStat.query.filter_by(user_id=owner['id']).update({'quizzes': 99})
+    db.session.commit()
+    assert rollups.backfill(owner['id']) == 2
+    assert _buckets() == live
@@ -0,0 +1,42 @@
+"""JSON serialization: the orjson provider and splicing pre-serialized payloads"""
+
+import json
+from datetime import datetime
+
+import serialization
+
+
+def test_dumps_bytes_is_compact_utf8():
+    raw = serialization.dumps_bytes({'text': 'café', 'n': [1, 2], 3: True})
+    assert raw == '{"text":"café","n":[1,2],"3":true}'.encode('utf-8')
+    assert serialization.loads(raw) == {'text': 'café', 'n': [1, 2], '3': True}
+    assert b'2024' in serialization.dumps_bytes({'when': datetime(2024, 1, 2, 3, 4, 5)})
+
+
+def test_splice_json_copies_raw_members_unparsed():
+    raw = b'[{"id": "a",  "spacing": "kept"}]'
+    body = serialization.splice_json({'questions': raw}, {'cached': True, 'count': 1})
+    assert raw in body
+    assert json.loads(body) == {'questions': [{'id': 'a', 'spacing': 'kept'}],
+                                'cached': True, 'count': 1}
+    assert json.loads(serialization.splice_json({'questions': b'[]'}, {})) == {'questions': []}
+
+
+def test_app_uses_the_orjson_provider(app, monkeypatch):
+    if serialization.orjson is not None:
+        assert isinstance(app.json, serialization.OrjsonProvider)
+    with app.test_request_context():
+        assert json.loads(app.json.response({'b': 1}).get_data()) == {'b': 1}  # pretty in debug
+        monkeypatch.setattr(app.json, 'compact', True)
+        rv = app.json.response({'b': 1, 'a': [1, 2]})
+        assert rv.mimetype == 'application/json'
+        assert rv.get_data() == b'{"b":1,"a":[1,2]}\n'
+    assert json.loads(app.json.dumps({'a': 1}, indent=2)) == {'a': 1}
+
+
+def test_raw_json_response(app):
+    with app.test_request_context(headers={'Accept': 'application/json'}):
+        rv = serialization.raw_json_response(app, {'questions': b'[1,2]'}, {'cached': True}, 201)
+        assert rv.status_code == 201 and rv.mimetype == 'application/json'
+        assert json.loads(rv.get_data()) == {'questions': [1, 2], 'cached': True}
+        assert 'Accept' in rv.headers['Vary']
@@ -0,0 +1,161 @@
+"""Offline sync: replays are idempotent, answers are graded on the server, pulls are paged"""
+
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import sync
+from models import db, Question, Quiz, QuizAnswer, UserDailyStat
+
+
+def _quiz(quiz_id, question_ids, subject='math', difficulty='easy'):
+    """A quiz with the first two answers right and the rest wrong"""
+    keys = {q.id: q.correct_answer_index
+            for q in Question.query.filter(Question.id.in_(question_ids))}
+    return {
+        'id': quiz_id, 'subject': subject, 'difficulty': difficulty,
+        'total_questions': len(question_ids), 'correct_answers': 2, 'time_spent': 60,
+        'completed_at': int(time.time() * 1000),
+        'answers': [{'question_id': qid, 'selected_answer_index': (keys[qid] + (i >= 2)) % 4,
+                     'is_correct': i < 2, 'time_spent': 10}
+                    for i, qid in enumerate(question_ids)]
+    }
+
+
+def _sync(client, user, quizzes, **extra):
+    return client.post('/api/v1/quizzes/sync', headers=user['headers'],
+                       json=dict({'quizzes': quizzes}, **extra))
+
+
+def _bucket_totals():
+    return [(b.quizzes, b.questions, b.correct) for b in UserDailyStat.query.all()]
+
+
+def test_replayed_batch_is_not_counted_twice(client, user, questions):
+    body = {'quizzes': [_quiz('offline-1', questions[:3]), _quiz('offline-2', questions[3:])]}
+
+    first = client.post('/api/v1/quizzes/sync', headers=user['headers'], json=body)
+    assert first.status_code == 200
+    assert first.get_json()['synced_count'] == 2
+    assert _bucket_totals() == [(2, 6, 4)]
+
+    replay = client.post('/api/v1/quizzes/sync', headers=user['headers'], json=body)
+    assert replay.status_code == 200
+    assert replay.get_json()['synced_count'] == 0
+    assert sorted(replay.get_json()['duplicates']) == ['offline-1', 'offline-2']
+    assert Quiz.query.count() == 2
+    assert QuizAnswer.query.count() == 6
+    assert _bucket_totals() == [(2, 6, 4)]
+
+
+def test_id_of_another_user_is_a_conflict(client, make_user, questions):
+    owner, other = make_user('owner'), make_user('other')
+    client.post('/api/v1/quizzes/sync', headers=owner['headers'],
+                json={'quizzes': [_quiz('shared-id', questions[:3])]})
+
+    response = client.post('/api/v1/quizzes/sync', headers=other['headers'],
+                           json={'quizzes': [_quiz('shared-id', questions[:3])]})
+    body = response.get_json()
+    assert body['synced_count'] == 0
+    assert body['conflicts'] == [{'quiz_id': 'shared-id', 'reason': 'id_taken'}]
+    assert db.session.get(Quiz, 'shared-id').user_id == owner['id']
+
+
+def test_unknown_subject_or_difficulty_does_not_block_the_batch(client, user, questions):
+    body = {'quizzes': [_quiz('good', questions[:3]),
+                        _quiz('long', questions[:3], subject='x' * 80),
+                        _quiz('hard-mode', questions[:3], difficulty='insane')]}
+
+    response = client.post('/api/v1/quizzes/sync', headers=user['headers'], json=body)
+    assert response.status_code == 200
+    assert response.get_json()['synced_count'] == 1
+    assert response.get_json()['conflicts'] == [
+        {'quiz_id': 'long', 'reason': 'invalid_subject'},
+        {'quiz_id': 'hard-mode', 'reason': 'invalid_difficulty'},
+    ]
+    assert [q.id for q in Quiz.query.all()] == ['good']
+
+
+def test_answers_are_graded_on_the_server(client, user, questions):
+    quiz = _quiz('claims-all-right', questions[:4])
+    for answer in quiz['answers']:
+        answer['is_correct'] = True
+    quiz['correct_answers'] = 4
+
+    assert _sync(client, user, [quiz]).get_json()['synced_count'] == 1
+    assert db.session.get(Quiz, 'claims-all-right').correct_answers == 2
+    assert QuizAnswer.query.filter_by(is_correct=True).count() == 2
+    assert _bucket_totals() == [(1, 4, 2)]
+
+
+def test_unknown_questions_and_options_are_conflicts(client, user, questions):
+    unknown = _quiz('unknown', questions[:2])
+    unknown['answers'][1]['question_id'] = 'not-in-the-bank'
+    out_of_range = _quiz('out-of-range', questions[:2])
+    out_of_range['answers'][0]['selected_answer_index'] = 4
+
+    body = _sync(client, user, [unknown, out_of_range, _quiz('good', questions[:2])]).get_json()
+    assert body['synced_count'] == 1
+    assert body['conflicts'] == [{'quiz_id': 'unknown', 'reason': 'unknown_question'},
+                                 {'quiz_id': 'out-of-range', 'reason': 'invalid_answer'}]
+
+
+@pytest.mark.parametrize('mutate', [
+    lambda quiz: {'id': 'no-counts', 'subject': 'math', 'difficulty': 'easy'},
+    lambda quiz: 'oops',
+    lambda quiz: dict(quiz, answers='oops'),
+    lambda quiz: dict(quiz, answers=['oops']),
+    lambda quiz: dict(quiz, answers=[dict(quiz['answers'][0], selected_answer_index='1')]),
+    lambda quiz: dict(quiz, answers=[dict(quiz['answers'][0], selected_answer_index=True)]),
+    lambda quiz: dict(quiz, answers=[dict(quiz['answers'][0], question_id='x' * 37)]),
+    lambda quiz: dict(quiz, answers=quiz['answers'][:1] * 2),
+    lambda quiz: dict(quiz, total_questions=1),
+])
+def test_malformed_batch_is_rejected(client, user, questions, mutate):
+    quizzes = [_quiz('good', questions[:2]), mutate(_quiz('bad', questions[:2]))]
+    response = _sync(client, user, quizzes)
+    assert response.status_code == 400
+    assert Quiz.query.count() == 0
+
+
+def _synced_quizzes(user_id, synced_at):
+    db.session.add_all(
+        Quiz(id=f'server-{i}', user_id=user_id, subject='math', difficulty='easy',
+             total_questions=1, correct_answers=1, is_completed=True, completed_at=at, synced_at=at)
+        for i, at in enumerate(synced_at))
+    db.session.commit()
+
+
+def _pull_all(client, user):
+    pulled, since, pages = [], None, 0
+    while True:
+        body = _sync(client, user, [], last_sync_timestamp=since).get_json()
+        pulled += [q['id'] for q in body['server_quizzes']]
+        since, pages = body['last_sync_timestamp'], pages + 1
+        if not body['has_more']:
+            return pulled, pages
+
+
+def test_pull_is_paged_without_gaps_or_repeats(client, user, monkeypatch):
+    monkeypatch.setattr(sync, 'SYNC_PULL_LIMIT', 2)
+    start = datetime.utcnow() - timedelta(minutes=1)
+    _synced_quizzes(user['id'], [start + timedelta(milliseconds=i * 10) for i in range(5)])
+
+    pulled, pages = _pull_all(client, user)
+    assert pulled == [f'server-{i}' for i in range(5)]
+    assert pages == 3
+    assert _sync(client, user, [], last_sync_timestamp=sync.to_millis(start) - 1).get_json()[
+        'server_quizzes'][0]['id'] == 'server-0'
+
+
+def test_quizzes_synced_in_the_same_millisecond_share_a_page(client, user, monkeypatch):
+    monkeypatch.setattr(sync, 'SYNC_PULL_LIMIT', 2)
+    at = datetime.utcnow().replace(microsecond=0) - timedelta(minutes=1)
+    same_millisecond = [at + timedelta(microseconds=i * 10) for i in range(3)]
+    _synced_quizzes(user['id'], same_millisecond + [at + timedelta(seconds=1)])
+
+    first = _sync(client, user, []).get_json()
+    assert [q['id'] for q in first['server_quizzes']] == ['server-0', 'server-1', 'server-2']
+    assert first['has_more']
+    assert _pull_all(client, user)[0] == [f'server-{i}' for i in range(4)]
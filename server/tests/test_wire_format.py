@@ -0,0 +1,67 @@
+"""MessagePack negotiation for responses and MessagePack or gzip request bodies"""
+
+import gzip
+import json
+
+import pytest
+
+import serialization
+
+msgpack = pytest.importorskip('msgpack')
+
+MSGPACK = 'application/msgpack'
+PASSWORD = 'Password-12345'  # what the make_user fixture registers with
+
+
+@pytest.mark.parametrize('accept, binary', [
+    ('application/msgpack', True),
+    ('application/x-msgpack', True),
+    ('application/json', False),
+    ('application/json, application/msgpack', False),  # JSON wins ties
+    ('*/*', False),
+    ('application/json;q=0.5, application/msgpack', True),
+])
+def test_accept_negotiation(app, accept, binary):
+    with app.test_request_context(headers={'Accept': accept}):
+        assert serialization.wants_msgpack() is binary
+
+
+def test_stats_as_msgpack(client, user):
+    response = client.get('/api/v1/analytics/user-stats',
+                          headers=dict(user['headers'], Accept=MSGPACK))
+    assert response.mimetype == MSGPACK
+    assert 'Accept' in response.headers['Vary']
+    body = msgpack.unpackb(response.data)
+    assert body['timeframe'] == 'month' and body['stats']['total_quizzes'] == 0
+
+    # Errors stay JSON whatever the client asked for
+    bad = client.get('/api/v1/analytics/user-stats?timeframe=decade',
+                     headers=dict(user['headers'], Accept=MSGPACK))
+    assert bad.status_code == 400 and bad.is_json
+
+
+def test_msgpack_and_gzip_request_bodies(client, user):
+    login = {'username': 'tester', 'password': PASSWORD}
+    packed = client.post('/api/v1/users/login', data=msgpack.packb(login), content_type=MSGPACK)
+    assert packed.status_code == 200
+
+    gzipped = client.post('/api/v1/users/login', data=gzip.compress(json.dumps(login).encode()),
+                          content_type='application/json', headers={'Content-Encoding': 'gzip'})
+    assert gzipped.status_code == 200
+
+    headers = dict(user['headers'], Accept=MSGPACK, **{'Content-Encoding': 'gzip'})
+    both = client.post('/api/v1/quizzes/sync', data=gzip.compress(msgpack.packb({'quizzes': []})),
+                       content_type=MSGPACK, headers=headers)
+    assert both.status_code == 200
+    assert msgpack.unpackb(both.data)['synced_count'] == 0
+
+
+def test_undecodable_bodies_are_rejected(client, user):
+    garbage = client.post('/api/v1/quizzes/sync', data=b'\xc1\xc1', content_type=MSGPACK,
+                          headers=user['headers'])
+    assert garbage.status_code == 400
+    bad_gzip = client.post('/api/v1/quizzes/sync', data=b'not gzip', content_type=MSGPACK,
+                           headers=dict(user['headers'], **{'Content-Encoding': 'gzip'}))
+    assert bad_gzip.status_code == 400
+    with pytest.raises(ValueError):
+        serialization.unpack(b'\xc1')
@@ -0,0 +1,29 @@
+"""
+Smart Quiz App - WSGI Entry Point
+Builds the app served by gunicorn; makes the C database and gRPC drivers cooperative under gevent
+"""
+
+try:
+    from gevent import monkey
+    GEVENT = monkey.is_module_patched('socket')
+except ImportError:
+    GEVENT = False
+
+if GEVENT:
+    try:
+        # psycopg2 talks to Postgres in C; without this every query blocks the whole worker
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+    except ImportError:
+        pass
+    try:
+        # google-generativeai calls go through gRPC
+        import grpc.experimental.gevent as grpc_gevent
+        grpc_gevent.init_gevent()
+    except ImportError:
+        pass
+
+from app import create_app  # noqa: E402
+
+# Default instance for `gunicorn wsgi:app`
+app = create_app()